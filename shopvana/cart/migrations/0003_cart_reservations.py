@@ -0,0 +1,27 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='reserved_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Units of the product held for this cart item'),
+        ),
+        migrations.AddField(
+            model_name='cartitem',
+            name='reserved_until',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the hold lapses and the units return to sale', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(fields=['reserved_until'], name='shopvana_ca_reserve_e441c7_idx'),
+        ),
+    ]
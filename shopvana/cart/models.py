@@ -8,6 +8,17 @@ class CartItem(models.Model):
     user = models.ForeignKey('users.User', on_delete=models.CASCADE)
     product = models.ForeignKey('products.Product', on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    reserved_quantity = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Units of the product held for this cart item"
+    )
+    reserved_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="When the hold lapses and the units return to sale"
+    )
     added_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -19,6 +30,7 @@ class CartItem(models.Model):
         indexes = [
             models.Index(fields=['user', 'product']),
             models.Index(fields=['-added_at']),
+            models.Index(fields=['reserved_until']),
         ]
         constraints = [
             models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_item')
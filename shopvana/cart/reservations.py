@@ -0,0 +1,88 @@
+"""
+Time-boxed stock reservations for cart items.
+
+Adding a product to the cart holds the units on ``Product.reserved_quantity``
+for ``CART_RESERVATION_MINUTES``; every change to the item moves the hold
+and restarts the clock. Checkout turns the hold into a sale, and a beat
+task returns lapsed holds to sale in batches. Deleting an item any other
+way releases its hold from the CartItem ``pre_delete`` receiver.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from products.inventory import release_reservations, reserve_stock
+
+from .models import CartItem
+
+logger = logging.getLogger(__name__)
+
+
+def reservation_expiry():
+    """When a hold taken now lapses."""
+    return timezone.now() + timedelta(minutes=settings.CART_RESERVATION_MINUTES)
+
+
+def hold_stock(item: CartItem, quantity: int) -> CartItem:
+    """
+    Set ``item`` to ``quantity`` units, all of them held. Raises
+    InsufficientStock, without changing anything, when the extra units
+    are not available. Call inside a transaction holding the item's row.
+    """
+    change = quantity - item.reserved_quantity
+    if change > 0:
+        if not reserve_stock(item.product_id, change):
+            # Flash-sale stock is not held; checkout is first come, first served
+            release_hold(item)
+            item.quantity = quantity
+            item.save()
+            return item
+    elif change < 0:
+        release_reservations({item.product_id: -change})
+    item.quantity = quantity
+    item.reserved_quantity = quantity
+    item.reserved_until = reservation_expiry()
+    item.save()
+    return item
+
+
+def release_hold(item: CartItem) -> None:
+    """Return the units held by ``item`` to sale."""
+    release_reservations({item.product_id: item.reserved_quantity})
+    item.reserved_quantity = 0
+    item.reserved_until = None
+
+
+def release_expired_holds(batch_size=500) -> int:
+    """
+    Release every lapsed hold, one batch per transaction. Items stay in
+    the cart; checkout re-checks their stock. Returns the units released.
+    """
+    released_units = 0
+    while True:
+        with transaction.atomic():
+            expired = CartItem.objects.filter(
+                reserved_until__lte=timezone.now(), reserved_quantity__gt=0
+            ).order_by('reserved_until')
+            if connection.features.has_select_for_update_skip_locked:
+                # Items being changed or checked out right now are left to their request
+                expired = expired.select_for_update(skip_locked=True)
+            batch = list(expired.values_list('cart_id', 'product_id', 'reserved_quantity')[:batch_size])
+            if not batch:
+                break
+            quantities = defaultdict(int)
+            for _, product_id, quantity in batch:
+                quantities[product_id] += quantity
+            release_reservations(quantities)
+            CartItem.objects.filter(pk__in=[row[0] for row in batch]).update(
+                reserved_quantity=0, reserved_until=None)
+            released_units += sum(quantities.values())
+        if len(batch) < batch_size:
+            break
+    if released_units:
+        logger.info(f"Released {released_units} units held by expired cart reservations.")
+    return released_units
@@ -1,9 +1,14 @@
 from rest_framework import serializers
 from products.models import Product
+from products.serializers import ProductSerializer
+from utils.serializers import DynamicFieldsMixin
 from .models import CartItem
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'product': ProductSerializer}
+    field_dependencies = {'total_price': ['quantity', 'product__price']}
+
     product = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(),
         help_text="Product ID to add to cart."
@@ -27,21 +32,26 @@ class CartItemSerializer(serializers.ModelSerializer):
             'added_at', 'updated_at'
         ]
         read_only_fields = ['cart_id', 'added_at', 'product_name', 'updated_at']
+        # Adding a product already in the cart tops up that item (see the view)
+        validators = []
 
     def validate(self, attrs):
-        product = attrs.get('product')
-        quantity = attrs.get('quantity')
+        product = attrs.get('product', getattr(self.instance, 'product', None))
+        quantity = attrs.get('quantity', getattr(self.instance, 'quantity', 1))
         user = self.context['request'].user
 
-        # Get existing quantity if this item is already in cart
-        existing_item = CartItem.objects.filter(user=user, product=product).first()
+        # Units this user already holds count towards what they may take
+        existing_item = self.instance or CartItem.objects.filter(user=user, product=product).first()
         existing_quantity = existing_item.quantity if existing_item else 0
+        held_quantity = existing_item.reserved_quantity if existing_item else 0
 
-        total_quantity = existing_quantity + quantity
+        total_quantity = quantity if self.instance else existing_quantity + quantity
+        available = product.available_quantity + held_quantity
 
-        if total_quantity > product.stock_quantity:
+        if total_quantity > available:
+            left = available if self.instance else max(available - existing_quantity, 0)
             raise serializers.ValidationError(
-                f"Cannot add {quantity} items to cart. Only {product.stock_quantity - existing_quantity} left in stock."
+                f"Cannot add {quantity} items to cart. Only {left} left in stock."
             )
         return attrs
 
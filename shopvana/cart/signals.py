@@ -0,0 +1,11 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from products.inventory import release_reservations
+from .models import CartItem
+from typing import Type
+
+@receiver(pre_delete, sender=CartItem)
+def release_hold_on_cart_item_delete(sender: Type[CartItem], instance: CartItem, **kwargs) -> None:
+    """Return the units still held by a cart item however it is deleted."""
+    if instance.reserved_quantity:
+        release_reservations({instance.product_id: instance.reserved_quantity})
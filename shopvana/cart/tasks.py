@@ -0,0 +1,8 @@
+from celery import shared_task
+from .reservations import release_expired_holds
+
+
+@shared_task
+def release_expired_reservations() -> int:
+    """Return stock held by lapsed cart reservations to sale."""
+    return release_expired_holds()
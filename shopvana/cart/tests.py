@@ -1,3 +1,83 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from products.models import Category, Product
+from .models import CartItem
+from .reservations import release_expired_holds
+
+
+class CartItemListQueryCountTests(TestCase):
+    """Listing the cart costs the same number of queries for any page size."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='shopper', email='shopper@example.com', password='secret', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        category = Category.objects.create(name='Groceries')
+        for index in range(20):
+            product = Product.objects.create(
+                name=f"Product {index}", price=Decimal('3.00'), stock_quantity=10, category=category)
+            CartItem.objects.create(user=self.user, product=product, quantity=2)
+
+    def list_queries(self, page_size):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/cart-items/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(queries)
+
+    def test_query_count_is_independent_of_page_size(self):
+        self.assertEqual(self.list_queries(5), self.list_queries(20))
+
+
+class CartReservationTests(TestCase):
+    """Adding to the cart holds stock until the hold lapses."""
+
+    def setUp(self):
+        cache.clear()
+        users = get_user_model().objects
+        self.first = APIClient()
+        self.first.force_authenticate(users.create_user(
+            username='first', email='first@example.com', password='secret', is_active=True))
+        self.second = APIClient()
+        self.second.force_authenticate(users.create_user(
+            username='second', email='second@example.com', password='secret', is_active=True))
+        self.product = Product.objects.create(
+            name='Kettle', price=Decimal('20.00'), stock_quantity=5,
+            category=Category.objects.create(name='Kitchen'))
+
+    def add(self, client, quantity):
+        return client.post('/api/cart-items/', {'product': self.product.pk, 'quantity': quantity})
+
+    def test_held_units_cannot_be_added_by_others(self):
+        self.assertEqual(self.add(self.first, 3).status_code, 201)
+        self.assertEqual(self.add(self.second, 3).status_code, 400)
+        self.assertEqual(self.add(self.second, 2).status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_quantity, 5)
+
+    def test_expired_holds_are_released(self):
+        self.add(self.first, 3)
+        CartItem.objects.update(reserved_until=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(release_expired_holds(), 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_quantity, 0)
+        self.assertEqual(self.add(self.second, 5).status_code, 201)
 
-# Create your tests here.
+    def test_deleting_items_outside_the_api_releases_their_holds(self):
+        self.add(self.first, 2)
+        self.add(self.second, 3)
+        CartItem.objects.filter(product=self.product).delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_quantity, 0)
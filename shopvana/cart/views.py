@@ -1,31 +1,59 @@
+from django.db import transaction
 from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+from products.inventory import InsufficientStock
+from utils.mixins import QueryPlanMixin
 from utils.permissions import EcommercePermission
 from .models import CartItem
+from .reservations import hold_stock
 from .serializers import CartItemSerializer
 from drf_yasg.utils import swagger_auto_schema
 
 @swagger_auto_schema(tags=["Customer's Preference"])
-class CartItemViewSet(viewsets.ModelViewSet):
+class CartItemViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     """Viewset for managing Cart Items"""
     queryset = CartItem.objects.all()
     serializer_class = CartItemSerializer
     permission_classes = [EcommercePermission]
+    select_related_fields = ('product',)
 
     def get_queryset(self):
         # Return only cart items for the authenticated user
             if not self.request.user.is_authenticated:
                 return CartItem.objects.none()  # Empty queryset for anonymous users
-            return CartItem.objects.filter(user=self.request.user)
+            return super().get_queryset().filter(user=self.request.user)
 
     def perform_create(self, serializer):
-        """Auto-increment quantity if the item already exists in cart"""
+        """Auto-increment quantity if the item already exists in cart, holding the stock"""
         user = self.request.user
         product = serializer.validated_data['product']
         quantity = serializer.validated_data['quantity']
 
-        existing_item = CartItem.objects.filter(user=user, product=product).first()
-        if existing_item:
-            existing_item.quantity += quantity
-            existing_item.save()
-        else:
-            serializer.save(user=user)
+        try:
+            with transaction.atomic():
+                existing_item = CartItem.objects.select_for_update().filter(user=user, product=product).first()
+                if existing_item:
+                    serializer.instance = hold_stock(existing_item, existing_item.quantity + quantity)
+                else:
+                    serializer.instance = hold_stock(CartItem(user=user, product=product), quantity)
+        except InsufficientStock as exc:
+            raise ValidationError(
+                f"Cannot add {quantity} items to cart. Only {exc.available} left in stock.")
+
+    def perform_update(self, serializer):
+        """Move the item's hold to its new quantity"""
+        quantity = serializer.validated_data.get('quantity', serializer.instance.quantity)
+        try:
+            with transaction.atomic():
+                item = CartItem.objects.select_for_update().get(pk=serializer.instance.pk)
+                serializer.instance = hold_stock(item, quantity)
+        except InsufficientStock as exc:
+            raise ValidationError(
+                f"Cannot set quantity to {quantity}. Only {exc.available} more left in stock.")
+
+    def perform_destroy(self, instance):
+        """Remove the item; the pre_delete receiver returns its held stock"""
+        with transaction.atomic():
+            item = CartItem.objects.select_for_update().filter(pk=instance.pk).first()
+            if item is not None:
+                item.delete()
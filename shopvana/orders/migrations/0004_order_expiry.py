@@ -0,0 +1,22 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_checkout_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_released',
+            field=models.BooleanField(default=False, editable=False, help_text='The units were returned to stock when the order was cancelled'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'payment_window_expires_at'], name='shopvana_or_status_4fa88d_idx'),
+        ),
+    ]
@@ -22,6 +22,10 @@ class Order(models.Model):
     shipping_address = models.CharField(max_length=255)
     ready_for_payment = models.BooleanField(default=False)
     payment_window_expires_at = models.DateTimeField(null=True, blank=True)
+    stock_released = models.BooleanField(
+        default=False, editable=False,
+        help_text="The units were returned to stock when the order was cancelled"
+        )
     ordered_at = models.DateTimeField(auto_now_add=True)
 
     def mark_ready_for_payment(self, minutes_valid=60):
@@ -50,6 +54,7 @@ class Order(models.Model):
         indexes = [
             models.Index(fields=['ordered_at']),
             models.Index(fields=['status']),
+            models.Index(fields=['status', 'payment_window_expires_at']),
         ]
 
     def __str__(self) -> str:
@@ -81,3 +86,38 @@ class OrderItem(models.Model):
 
     def __str__(self) -> str:
         return f"{self.quantity} x {self.product.name} in Order {self.order.order_id}"
+
+
+class CheckoutJob(models.Model):
+    """
+    An asynchronous checkout (`POST /api/orders/checkout/?async=true`),
+    carried out by `orders.tasks.run_checkout_job` on the `checkout` queue.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+    job_id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='checkout_jobs')
+    shipping_address = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    order = models.OneToOneField(
+        Order, null=True, blank=True, on_delete=models.SET_NULL, related_name='checkout_job'
+        )
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Checkout Job'
+        verbose_name_plural = 'Checkout Jobs'
+        ordering = ['-created_at']
+        db_table = 'shopvana_checkout_job'
+        indexes = [
+            models.Index(fields=['user', 'status']),
+        ]
+
+    def __str__(self) -> str:
+        return f"Checkout job {self.job_id} ({self.status})"
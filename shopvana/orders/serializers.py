@@ -2,11 +2,15 @@ from .models import Order, OrderItem
 from rest_framework import serializers
 from products.serializers import ProductSerializer
 from products.models import Product
+from utils.serializers import DynamicFieldsMixin
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for OrderItem model."""
 
+    expandable_fields = {'product': ProductSerializer}
+    default_expand = ('product',)
+
     order = serializers.PrimaryKeyRelatedField(
         queryset=Order.objects.all(),
         help_text="Order to which the item belongs"
@@ -55,14 +59,8 @@ class OrderItemSerializer(serializers.ModelSerializer):
             )
         return value
 
-    def to_representation(self, instance):
-        """Customize the representation to include full product details."""
-        representation = super().to_representation(instance)
-        representation['product'] = ProductSerializer(instance.product).data
-        return representation
-
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Order model."""
 
     items = OrderItemSerializer(many=True, read_only=True)
@@ -139,10 +137,3 @@ class OrderSerializer(serializers.ModelSerializer):
                 f"Status must be one of {', '.join(valid_statuses)}."
             )
         return value
-
-    def to_representation(self, instance):
-        """Customize the representation of the Order instance."""
-        representation = super().to_representation(instance)
-        representation['items'] = OrderItemSerializer(
-            instance.items.all(), many=True).data
-        return representation
@@ -0,0 +1,226 @@
+"""
+Turning a cart into an order, shared by the synchronous checkout
+endpoint and the asynchronous checkout jobs (see `orders.tasks`), and
+cancelling orders, which returns their stock.
+
+Unpaid orders are cancelled by ``expire_unpaid_orders`` once their
+payment window closes. It works in chunks, each one transaction that
+returns the chunk's units with one aggregated stock update, and counts
+its work in cache counters (``get_expiry_stats``).
+"""
+import logging
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from cart.models import CartItem
+from products.inventory import InsufficientStock, return_stock, take_stock
+from products.trending import record_sales_on_commit, retract_sales_on_commit
+from utils.cache_utils import increment_counter
+from utils.outbox import enqueue
+
+from .models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+EXPIRY_STATS_KEY_PREFIX = 'stats:order-expiry:'
+EXPIRY_STATS = ('runs', 'orders_cancelled', 'units_reclaimed')
+
+
+class CheckoutError(Exception):
+    """Raised when a cart cannot be checked out; the message is meant for the customer."""
+
+
+def place_order(user, shipping_address: str):
+    """
+    Turn ``user``'s cart into a pending order, in one transaction, and
+    return ``(order, items)``. Checkouts of the same user run one at a
+    time. Raises CheckoutError, changing nothing, when the cart is empty
+    or a product is oversold.
+    """
+    with transaction.atomic():
+        # One checkout per user at a time: the next one sees the emptied cart
+        list(get_user_model().objects.select_for_update().filter(pk=user.pk).values_list('pk'))
+
+        # Lock the cart rows (not their products) so their holds cannot
+        # lapse underneath us; checkout consumes them instead of taking
+        # fresh stock
+        cart_items = list(
+            CartItem.objects.select_for_update(of=('self',))
+            .select_related('product__category').filter(user=user)
+        )
+        if not cart_items:
+            raise CheckoutError("Your cart is empty.")
+
+        products = {item.product_id: item.product for item in cart_items}
+        quantities, held = {}, {}
+        for item in cart_items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+            held[item.product_id] = held.get(item.product_id, 0) + item.reserved_quantity
+        total_amount = sum(item.quantity * item.product.price for item in cart_items)
+
+        # Create the order ready for payment (as mark_ready_for_payment
+        # would) and all its items, one INSERT each
+        order = Order.objects.create(
+            user=user,
+            total_amount=total_amount,
+            shipping_address=shipping_address,
+            status='pending',
+            ready_for_payment=True,
+            payment_window_expires_at=timezone.now() + timedelta(minutes=60),
+        )
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=item.product, quantity=item.quantity)
+            for item in cart_items
+        ])
+
+        # Feed the trending and best-seller leaderboards
+        record_sales_on_commit(
+            (item.product_id, item.product.category_id, item.quantity) for item in cart_items
+        )
+
+        # Clear cart with one DELETE and no signals: its holds are consumed
+        # by take_stock below, not released by the CartItem pre_delete receiver
+        checked_out = CartItem.objects.filter(pk__in=[item.pk for item in cart_items])
+        checked_out._raw_delete(checked_out.db)
+
+        # The confirmation email and the Chapa call are carried out by
+        # the outbox relay once this transaction has committed
+        enqueue('email.send', {
+            'to_email': user.email,
+            'subject': 'Order Confirmation',
+            'template_name': 'emails/order_confirmation.html',
+            'context': {
+                'customer_name': user.get_full_name(),
+                'order_id': order.id,
+                'order_total': order.total_amount,
+                'shipping_address': order.shipping_address,
+                'status': order.status,
+                'ordered_at': order.ordered_at,
+                'items': [{
+                    'name': item.product.name,
+                    'price': item.product.price,
+                    'quantity': item.quantity,
+                    'subtotal': item.quantity * item.product.price
+                } for item in cart_items],
+            },
+        }, reference=f"order:{order.order_id}")
+        enqueue('payments.initiate', {'order_id': order.order_id}, reference=f"order:{order.order_id}")
+
+        # Take the stock last: the product row locks are only held
+        # from this statement until the commit right after it
+        try:
+            take_stock(quantities, released=held)
+        except InsufficientStock as exc:
+            raise CheckoutError(
+                f"Product {products[exc.product_id].name} is oversold. Available stock: {exc.available}."
+            ) from exc
+
+    # Serialize the items just written rather than reading them back
+    order._prefetched_objects_cache = {'items': items}
+    return order, items
+
+
+def cancel_orders(order_ids) -> tuple:
+    """
+    Cancel the pending orders among ``order_ids``, put their units back
+    into stock with one aggregated update and take them out of the
+    trending counters. Returns ``(orders cancelled, units returned)``.
+    """
+    with transaction.atomic():
+        pending = Order.objects.filter(pk__in=list(order_ids), status='pending', stock_released=False)
+        ids = list(pending.values_list('pk', flat=True))
+        if not ids:
+            return 0, 0
+        quantities = dict(
+            OrderItem.objects.filter(order_id__in=ids).order_by().values('product_id')
+            .annotate(total=Sum('quantity')).values_list('product_id', 'total')
+        )
+        Order.objects.filter(pk__in=ids).update(status='cancelled', stock_released=True)
+        OrderItem.objects.filter(order_id__in=ids).update(item_status='cancelled')
+        return_stock(quantities)
+        retract_sales_on_commit(_sold_lines(ids))
+    return len(ids), sum(quantities.values())
+
+
+def _sold_lines(order_ids) -> list:
+    """Return ``[(ordered_at, product_id, category_id, quantity), ...]`` of the orders."""
+    return list(OrderItem.objects.filter(order_id__in=order_ids).values_list(
+        'order__ordered_at', 'product_id', 'product__category_id', 'quantity'))
+
+
+def settle_paid_order(order_id) -> bool:
+    """
+    Mark an order paid once its payment succeeded. An order cancelled
+    meanwhile (e.g. by the expiry job) whose units went back to stock
+    takes them out again; if they have been sold since, it stays
+    cancelled and False is returned so the payment can be refunded.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().filter(pk=order_id).first()
+        if order is None:
+            return False
+        if order.status not in ('pending', 'cancelled'):
+            # Already paid, or further along
+            return True
+        if order.stock_released:
+            quantities = dict(
+                order.items.order_by().values('product_id')
+                .annotate(total=Sum('quantity')).values_list('product_id', 'total')
+            )
+            try:
+                take_stock(quantities)
+            except InsufficientStock as exc:
+                logger.warning(f"Order {order.order_id} was paid after its stock was resold: {exc}")
+                return False
+            order.stock_released = False
+            # Count the sale again where the cancellation took it out
+            record_sales_on_commit(
+                [line[1:] for line in _sold_lines([order.pk])], when=order.ordered_at)
+        order.status = 'paid'
+        order.save()
+    return True
+
+
+def expire_unpaid_orders(batch_size=200, now=None) -> dict:
+    """
+    Cancel pending orders whose payment window has closed, ``batch_size``
+    at a time. Returns ``{'orders_cancelled': ..., 'units_reclaimed': ...}``.
+    """
+    now = now or timezone.now()
+    totals = {'orders_cancelled': 0, 'units_reclaimed': 0}
+    while True:
+        with transaction.atomic():
+            # Served by the (status, payment_window_expires_at) index
+            expired = Order.objects.filter(
+                status='pending', stock_released=False, payment_window_expires_at__lte=now
+            ).order_by('payment_window_expires_at')
+            if connection.features.has_select_for_update_skip_locked:
+                # Orders being paid or edited right now are left for the next run
+                expired = expired.select_for_update(skip_locked=True)
+            ids = list(expired.values_list('pk', flat=True)[:batch_size])
+            orders, units = cancel_orders(ids)
+        totals['orders_cancelled'] += orders
+        totals['units_reclaimed'] += units
+        if not orders or len(ids) < batch_size:
+            break
+
+    increment_counter(f"{EXPIRY_STATS_KEY_PREFIX}runs")
+    for name, amount in totals.items():
+        if amount:
+            increment_counter(f"{EXPIRY_STATS_KEY_PREFIX}{name}", amount)
+    if totals['orders_cancelled']:
+        logger.info(
+            f"Expired {totals['orders_cancelled']} unpaid orders, "
+            f"reclaiming {totals['units_reclaimed']} units of stock.")
+    return totals
+
+
+def get_expiry_stats() -> dict:
+    """Runs, orders cancelled and units reclaimed by the expiry job so far."""
+    raw = cache.get_many([f"{EXPIRY_STATS_KEY_PREFIX}{name}" for name in EXPIRY_STATS])
+    return {name: raw.get(f"{EXPIRY_STATS_KEY_PREFIX}{name}", 0) for name in EXPIRY_STATS}
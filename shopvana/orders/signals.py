@@ -1,13 +1,17 @@
+from django.db.models import Sum
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
+from products.inventory import return_stock
 from .models import Order
 from typing import Type
 
 @receiver(pre_delete, sender=Order)
 def restore_stock_on_order_delete(sender: Type[Order], instance: Order, **kwargs) -> None:
-    """Lock the stock restoration"""
-    for item in instance.items.all():
-        product = item.product
-        product.stock_quantity += item.quantity
-        product.is_active = product.stock_quantity > 0
-        product.save()
+    """Put the order's units back into stock with one set-based update."""
+    if instance.stock_released:
+        # Already returned when the order was cancelled
+        return
+    quantities = dict(
+        instance.items.order_by().values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+    return_stock(quantities)
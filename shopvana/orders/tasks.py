@@ -0,0 +1,44 @@
+from celery import shared_task
+from django.db import transaction
+from .models import CheckoutJob
+from .services import CheckoutError, expire_unpaid_orders, place_order
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(acks_late=True)
+def run_checkout_job(job_id: str) -> str:
+    """
+    Carry out an asynchronous checkout. The order and the job's outcome
+    commit together, so a redelivered job never places a second order.
+    Unexpected errors mark the job failed with a generic message.
+    """
+    CheckoutJob.objects.filter(pk=job_id, status='queued').update(status='running')
+    with transaction.atomic():
+        job = CheckoutJob.objects.select_for_update().select_related('user').filter(pk=job_id).first()
+        if job is None or job.status not in ('queued', 'running'):
+            return job.status if job else 'missing'
+        try:
+            # Savepoint so an unexpected error undoes the partial checkout
+            # but still lets the job record its failure
+            with transaction.atomic():
+                order, _ = place_order(job.user, job.shipping_address)
+        except CheckoutError as exc:
+            job.status, job.error = 'failed', str(exc)
+        except Exception:
+            # Never leave the job running: the client would poll it forever
+            logger.exception(f"Checkout job {job_id} crashed.")
+            job.status, job.error = 'failed', "Checkout could not be completed. Please try again."
+        else:
+            job.status, job.order = 'succeeded', order
+        job.save(update_fields=['status', 'error', 'order', 'updated_at'])
+    logger.info(f"Checkout job {job_id}: {job.status}.")
+    return job.status
+
+
+@shared_task
+def cancel_expired_orders() -> dict:
+    """Cancel unpaid orders past their payment window and return their stock."""
+    return expire_unpaid_orders()
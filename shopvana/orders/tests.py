@@ -1,3 +1,323 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from products.models import Category, Product
+from cart.models import CartItem
+from payments.models import Payment
+from payments.utils import verify_chapa_payment
+from utils.models import OutboxEvent
+from .models import CheckoutJob, Order, OrderItem
+from .services import expire_unpaid_orders, get_expiry_stats
+from .tasks import run_checkout_job
+
+
+class OrderListQueryCountTests(TestCase):
+    """Order listings cost the same number of queries for any page size."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='buyer', email='buyer@example.com', password='secret', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        categories = [Category.objects.create(name=f"Category {index}") for index in range(3)]
+        products = [
+            Product.objects.create(
+                name=f"Product {index}", price=Decimal('5.00'), stock_quantity=100,
+                category=categories[index % len(categories)])
+            for index in range(6)
+        ]
+        for index in range(20):
+            order = Order.objects.create(
+                user=self.user, total_amount=Decimal('10.00'), shipping_address='Addis Ababa')
+            for product in products[index % 3:index % 3 + 3]:
+                OrderItem.objects.create(order=order, product=product, quantity=1)
+
+    def list_queries(self, url, page_size):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(queries)
+
+    def test_order_list_query_count_is_independent_of_page_size(self):
+        self.assertEqual(self.list_queries('/api/orders/', 5), self.list_queries('/api/orders/', 20))
+
+    def test_order_item_list_query_count_is_independent_of_page_size(self):
+        self.assertEqual(
+            self.list_queries('/api/order-items/', 5), self.list_queries('/api/order-items/', 20))
+
+
+class CheckoutQueryCountTests(TestCase):
+    """Checkout costs the same number of queries for any cart size."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='bulk', email='bulk@example.com', password='secret', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        categories = [Category.objects.create(name=f"Aisle {index}") for index in range(4)]
+        self.products = [
+            Product.objects.create(
+                name=f"Item {index}", price=Decimal('2.50'), stock_quantity=10,
+                category=categories[index % len(categories)])
+            for index in range(200)
+        ]
+
+    def checkout_queries(self, lines):
+        CartItem.objects.bulk_create([
+            CartItem(user=self.user, product=product, quantity=2) for product in self.products[:lines]
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/orders/checkout/', {'shipping_address': 'Bole Road'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['order']['items']), lines)
+        return len(queries)
+
+    def test_query_count_is_independent_of_cart_size(self):
+        self.assertEqual(self.checkout_queries(2), self.checkout_queries(200))
+        self.assertEqual(
+            OrderItem.objects.filter(order__user=self.user).count(), 202)
+        self.assertEqual(
+            sorted(set(Product.objects.filter(pk__in=[p.pk for p in self.products]).values_list(
+                'stock_quantity', flat=True))), [6, 8])
+
+
+class CheckoutOutboxTests(TestCase):
+    """Checkout leaves the payment and emails to the outbox relay."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='payer', email='payer@example.com', password='secret', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        product = Product.objects.create(
+            name='Lamp', price=Decimal('12.00'), stock_quantity=4,
+            category=Category.objects.create(name='Lighting'))
+        CartItem.objects.create(user=self.user, product=product, quantity=2)
+
+    @mock.patch('payments.utils.requests.post')
+    def test_checkout_writes_outbox_events_without_calling_chapa(self, post):
+        response = self.client.post('/api/orders/checkout/', {'shipping_address': 'Main St 1'})
+        self.assertEqual(response.status_code, 201)
+        post.assert_not_called()
+
+        order_id = response.data['order']['order_id']
+        self.assertEqual(
+            sorted(OutboxEvent.objects.filter(reference=f"order:{order_id}").values_list('topic', flat=True)),
+            ['email.send', 'payments.initiate'])
+        poll = self.client.get(f'/api/orders/{order_id}/payment/')
+        self.assertEqual(poll.status_code, 202)
+
+
+class CheckoutIdempotencyTests(TestCase):
+    """Retries carrying the same Idempotency-Key get the first response back."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='retry', email='retry@example.com', password='secret', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(
+            name='Umbrella', price=Decimal('8.00'), stock_quantity=5,
+            category=Category.objects.create(name='Rain'))
+        CartItem.objects.create(user=self.user, product=self.product, quantity=1)
+
+    def checkout(self, address='Piassa', key='retry-1'):
+        return self.client.post(
+            '/api/orders/checkout/', {'shipping_address': address}, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_is_replayed_without_a_second_order(self):
+        first = self.checkout()
+        retry = self.checkout()
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['order']['order_id'], str(first.data['order']['order_id']))
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 4)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.checkout()
+        self.assertEqual(self.checkout(address='Bole').status_code, 422)
+
+
+class AsyncCheckoutTests(TestCase):
+    """`?async=true` queues the checkout and reports it at the job's status URL."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='queued', email='queued@example.com', password='secret', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        product = Product.objects.create(
+            name='Kettlebell', price=Decimal('30.00'), stock_quantity=3,
+            category=Category.objects.create(name='Fitness'))
+        CartItem.objects.create(user=self.user, product=product, quantity=1)
+
+    def test_job_places_the_order_once(self):
+        response = self.client.post('/api/orders/checkout/?async=true', {'shipping_address': 'Kazanchis'})
+        self.assertEqual(response.status_code, 202)
+        job_id = str(response.data['job_id'])
+        self.assertEqual(self.client.get(f'/api/orders/checkout/{job_id}/').data['status'], 'queued')
+
+        self.assertEqual(run_checkout_job(job_id), 'succeeded')
+        # A redelivered job finds its outcome already recorded
+        self.assertEqual(run_checkout_job(job_id), 'succeeded')
+        status = self.client.get(f'/api/orders/checkout/{job_id}/').data
+        self.assertEqual(status['order']['order_id'], str(CheckoutJob.objects.get(pk=job_id).order_id))
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+
+    def test_unexpected_error_fails_the_job(self):
+        response = self.client.post('/api/orders/checkout/?async=true', {'shipping_address': 'Kazanchis'})
+        job_id = str(response.data['job_id'])
+
+        with mock.patch('orders.tasks.place_order', side_effect=RuntimeError('database went away')), \
+                self.assertLogs('orders.tasks', level='ERROR'):
+            self.assertEqual(run_checkout_job(job_id), 'failed')
+
+        status = self.client.get(f'/api/orders/checkout/{job_id}/').data
+        self.assertEqual(status['status'], 'failed')
+        self.assertNotIn('database went away', status['error'])
+        self.assertFalse(Order.objects.filter(user=self.user).exists())
+        # A redelivery does not retry a failed job
+        self.assertEqual(run_checkout_job(job_id), 'failed')
+
+
+class OrderExpiryTests(TestCase):
+    """Unpaid orders past their payment window are cancelled and their stock returned once."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='late', email='late@example.com', password='secret', is_active=True)
+        self.product = Product.objects.create(
+            name='Jebena', price=Decimal('12.00'), stock_quantity=5,
+            category=Category.objects.create(name='Kitchen'))
+        window = timezone.now() - timezone.timedelta(minutes=1)
+        self.orders = []
+        for quantity in (2, 1, 1):
+            order = Order.objects.create(
+                user=self.user, total_amount=Decimal('12.00') * quantity, shipping_address='Piassa',
+                status='pending', ready_for_payment=True, payment_window_expires_at=window)
+            OrderItem.objects.create(order=order, product=self.product, quantity=quantity)
+            self.orders.append(order)
+        # Still inside its window
+        self.open_order = Order.objects.create(
+            user=self.user, total_amount=Decimal('12.00'), shipping_address='Piassa', status='pending',
+            payment_window_expires_at=timezone.now() + timezone.timedelta(minutes=30))
+        OrderItem.objects.create(order=self.open_order, product=self.product, quantity=1)
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=0, is_active=False)
+
+    def test_expired_orders_are_cancelled_in_batches(self):
+        totals = expire_unpaid_orders(batch_size=2)
+        self.assertEqual(totals, {'orders_cancelled': 3, 'units_reclaimed': 4})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 4)
+        self.assertTrue(self.product.is_active)
+        self.assertEqual(Order.objects.filter(status='cancelled', stock_released=True).count(), 3)
+        self.assertEqual(Order.objects.get(pk=self.open_order.pk).status, 'pending')
+        self.assertEqual(get_expiry_stats(), {'runs': 1, 'orders_cancelled': 3, 'units_reclaimed': 4})
+
+        # A second run finds nothing, and deleting a cancelled order does not return its units again
+        self.assertEqual(expire_unpaid_orders()['orders_cancelled'], 0)
+        Order.objects.get(pk=self.orders[0].pk).delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 4)
+
+    def test_stuck_orders_do_not_loop(self):
+        # Set back to pending by hand after their stock was returned
+        Order.objects.filter(pk__in=[order.pk for order in self.orders]).update(stock_released=True)
+        self.assertEqual(expire_unpaid_orders(batch_size=2), {'orders_cancelled': 0, 'units_reclaimed': 0})
+
+    def pay_late(self, order):
+        payment = Payment.objects.create(
+            order=order, user=self.user, amount=order.total_amount, currency='ETB',
+            payment_method='chapa_card', status='pending', chapa_tx_ref=f"late-{order.pk}")
+        chapa_resp = mock.Mock(status_code=200)
+        chapa_resp.json.return_value = {'data': {'status': 'success', 'receipt_url': ''}}
+        with mock.patch('payments.utils.requests.get', return_value=chapa_resp), \
+                mock.patch('utils.email.send_notification_email'):
+            verify_chapa_payment(payment)
+        payment.refresh_from_db()
+        return payment
+
+    def test_late_payment_takes_the_stock_back(self):
+        expire_unpaid_orders()
+        payment = self.pay_late(Order.objects.get(pk=self.orders[0].pk))
+        order = Order.objects.get(pk=self.orders[0].pk)
+        self.assertEqual((order.status, order.stock_released), ('paid', False))
+        self.assertFalse(payment.refund_due)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 2)
+
+    def test_late_payment_for_resold_stock_is_refunded(self):
+        expire_unpaid_orders()
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=1)
+        payment = self.pay_late(Order.objects.get(pk=self.orders[0].pk))
+        self.assertEqual(Order.objects.get(pk=self.orders[0].pk).status, 'cancelled')
+        self.assertEqual((payment.status, payment.refund_due), ('completed', True))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 1)
+
+
+class OrderItemUpdateTests(TestCase):
+    """Editing an order item moves stock and the order total together."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='editor', email='editor@example.com', password='secret', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Coffee')
+        self.beans = Product.objects.create(
+            name='Beans', price=Decimal('10.00'), stock_quantity=10, category=category)
+        self.cups = Product.objects.create(
+            name='Cups', price=Decimal('4.00'), stock_quantity=10, category=category)
+        self.order = Order.objects.create(
+            user=self.user, total_amount=Decimal('24.00'), shipping_address='Bole', status='pending')
+        self.item = OrderItem.objects.create(order=self.order, product=self.beans, quantity=2)
+        OrderItem.objects.create(order=self.order, product=self.cups, quantity=1)
+
+    def update(self, **data):
+        return self.client.patch(f'/api/order-items/{self.item.pk}/', data, format='json')
+
+    def test_quantity_change_updates_the_total(self):
+        response = self.update(quantity=5)
+
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.beans.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('54.00'))
+        self.assertEqual(self.beans.stock_quantity, 7)
+
+    def test_product_change_reprices_the_line(self):
+        other = Product.objects.create(
+            name='Grinder', price=Decimal('30.00'), stock_quantity=3, category=self.beans.category)
+
+        response = self.update(product=str(other.pk), quantity=1)
+
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('34.00'))
+        self.assertEqual(Product.objects.get(pk=self.beans.pk).stock_quantity, 12)
+
+    def test_oversold_update_leaves_the_total_alone(self):
+        response = self.update(quantity=50)
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 400)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('24.00'))
+        self.assertEqual(OrderItem.objects.get(pk=self.item.pk).quantity, 2)
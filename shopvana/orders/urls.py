@@ -15,6 +15,16 @@ urlpatterns = [
             }),
         name='order-checkout'
     ),
+    path(
+        'orders/checkout/<uuid:job_id>/',
+        OrderViewSet.as_view({'get': 'checkout_status'}),
+        name='order-checkout-status'
+    ),
+    path(
+        'orders/<uuid:pk>/payment/',
+        OrderViewSet.as_view({'get': 'payment'}),
+        name='order-payment'
+    ),
     path(
         'order-items/',
         OrderItemViewSet.as_view({'get': 'list', 'post': 'create'}),
@@ -1,185 +1,141 @@
-from .models import Order, OrderItem
+from .models import CheckoutJob, Order, OrderItem
+from django.db.models import DecimalField, F, Prefetch, Value
+from django.db.models.functions import Greatest
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django.db import transaction
 from django.conf import settings
-from uuid import uuid4
-import requests
+from django.urls import reverse
 from utils.permissions import EcommercePermission
 from rest_framework import status
 from cart.models import CartItem
-from products.models import Product
+from products.inventory import InsufficientStock, apply_stock_deltas, return_stock, take_stock
 from payments.models import Payment
-from utils.email import send_notification_email
+from utils.mixins import QueryPlanMixin
+from utils.idempotency import idempotent
+from utils.models import OutboxEvent
 from .serializers import OrderSerializer, OrderItemSerializer
-import logging
+from .services import CheckoutError, place_order
+from .tasks import run_checkout_job
+import time
 from drf_yasg.utils import swagger_auto_schema
 
-# Chapa Credentials
-CHAPA_API_URL = f"{settings.CHAPA_BASE_URL.rstrip('/')}/transaction/initialize"
-CHAPA_VERIFY_URL = f"{settings.CHAPA_BASE_URL}/transaction/verify/"
-CHAPA_SECRET_KEY = settings.CHAPA_SECRET_KEY
-
 @swagger_auto_schema(tags=["Customer's Preference"])
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     """ViewSet for managing orders."""
 
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [EcommercePermission]
+    keyset_ordering = ('-ordered_at', 'order_id')
+    prefetch_related_fields = (
+        Prefetch('items', queryset=OrderItem.objects.select_related('product__category')),
+    )
 
     @action(detail=False, methods=['post'], url_path='checkout')
-    @transaction.atomic
+    @idempotent
     def checkout(self, request):
+        """
+        Place an order from the cart. With `?async=true` the checkout is
+        queued instead: 202 with a job whose status URL reports the outcome.
+        """
         user = request.user
-        cart_items = CartItem.objects.select_related('product').filter(user=user)
-
-        if not cart_items.exists():
-            return Response({'detail': 'Your cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Lock the products in the cart to prevent race conditions
-        product_ids = [item.product.product_id for item in cart_items]
-        products = Product.objects.select_for_update().filter(product_id__in=product_ids)
-        product_map = {product.product_id: product for product in products}
-
-        total_amount = 0
-        stock_updates = []  # Track products to update
-
-        # Validate stock availability
-        for item in cart_items:
-            product = product_map.get(item.product.product_id)
-            if not product:
-                return Response(
-                    {"detail": f"Product {item.product.name} not found."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            new_stock = product.stock_quantity - item.quantity
-            if new_stock < 0:
-                return Response(
-                    {"detail": f"Product {item.product.name} is oversold. Available stock: {product.stock_quantity}."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            total_amount += item.quantity * product.price
-            stock_updates.append((product, new_stock))
 
         # Get shipping address
         shipping_address = request.data.get('shipping_address')
         if not shipping_address:
             return Response({"detail": "Shipping address is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create order
-        order = Order.objects.create(
-            user=user,
-            total_amount=total_amount,
-            shipping_address=shipping_address,
-            status='pending'
-        )
-
-        order.mark_ready_for_payment(minutes_valid=60)  # Mark order ready for payment
-
-        # Create order items and update stock
-        for item in cart_items:
-            product, new_stock = next((p, ns) for p, ns in stock_updates if p.product_id == item.product.product_id)
-
-            # Create order item
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=item.quantity
-            )
-
-            # Update stock and is_active
-            product.stock_quantity = new_stock
-            product.is_active = new_stock > 0
-            product.save()
-
-        # Clear cart
-        cart_items.delete()
-
-        # Send order confirmation email
-        order_items_list = []
-        for item in order.items.select_related('product'):
-            order_items_list.append({
-                'name': item.product.name,
-                'price': item.product.price,
-                'quantity': item.quantity,
-                'subtotal': item.quantity * item.product.price
-            })
-
-        context = {
-            'customer_name': user.get_full_name(),
-            'order_id': order.id,
-            'order_total': order.total_amount,
-            'shipping_address': order.shipping_address,
-            'status': order.status,
-            'ordered_at': order.ordered_at,
-            'items': order_items_list
-        }
-        send_notification_email(
-            subject='Order Confirmation',
-            template_name='emails/order_confirmation.html',
-            context=context,
-            to_email=user.email,
-        )
-
-        # === Initiate payment with Chapa ===
-        order_id_short = str(order.order_id)[:8]
-        user_id_short = str(user.id)[:4]
-        random_part = uuid4().hex[:8]
-        tx_ref = f"o{order_id_short}u{user_id_short}{random_part}"
-
-        callback_url = f"{settings.SITE_URL}/api/payments/verify/"
-        logging.info(f"Call back URL: {callback_url}")
-        payload = {
-            "amount": str(total_amount),
-            "currency": "ETB",  # or your preferred currency
-            "email": user.email,
-            "tx_ref": tx_ref,
-            "callback_url": callback_url,
-            "payment_method": "chapa",
-        }
-        headers = {"Authorization": f"Bearer {CHAPA_SECRET_KEY}"}
-        chapa_resp = requests.post(CHAPA_API_URL, json=payload, headers=headers)
-        logging.info(f"Chapa response: {chapa_resp.status_code} - {chapa_resp.text}")
-
-        checkout_url = None
-        if chapa_resp.status_code == 200:
-            resp_data = chapa_resp.json()
-            checkout_url = resp_data['data']['checkout_url']
-            logging.info(f"Chapa checkout URL: {checkout_url}")
-
-            # Save Payment record
-            Payment.objects.create(
-                order=order,
-                user=user,
-                chapa_tx_ref=tx_ref,
-                amount=total_amount,
-                currency="ETB",
-                status="pending",
-                payment_method="chapa",
-            )
-
-            # Send payment link email
-            send_notification_email(
-                to_email=user.email,
-                subject="Complete Your Payment",
-                template_name="emails/checkout_email.html",
-                context={
-                    "user_name": user.get_full_name() or user.username,
-                    "checkout_url": checkout_url,
-                    "payment_window": order.payment_window_expires_at,
-                }
-            )
-
+        if request.query_params.get('async') in ('1', 'true'):
+            return self.queue_checkout(request, shipping_address)
 
+        try:
+            order, _ = place_order(user, shipping_address)
+        except CheckoutError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = self.get_serializer(order)
         return Response({
             "order": serializer.data,
-            "checkout_url": checkout_url
+            "checkout_url": None,
+            "payment_status_url": request.build_absolute_uri(
+                reverse('order-payment', kwargs={'pk': order.order_id})),
         }, status=status.HTTP_201_CREATED)
 
+    def queue_checkout(self, request, shipping_address):
+        """Validate, then leave the checkout to a worker of the `checkout` queue."""
+        if not CartItem.objects.filter(user=request.user).exists():
+            return Response({'detail': 'Your cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = CheckoutJob.objects.create(user=request.user, shipping_address=shipping_address)
+        transaction.on_commit(lambda: run_checkout_job.delay(str(job.job_id)))
+        status_url = request.build_absolute_uri(reverse('order-checkout-status', kwargs={'job_id': job.job_id}))
+        response = Response({
+            'job_id': job.job_id,
+            'status': job.status,
+            'status_url': status_url,
+        }, status=status.HTTP_202_ACCEPTED)
+        response['Location'] = status_url
+        return response
+
+    @action(detail=False, methods=['get'], url_path=r'checkout/(?P<job_id>[^/.]+)')
+    def checkout_status(self, request, job_id=None):
+        """Progress of an asynchronous checkout, then its order and checkout URL."""
+        jobs = CheckoutJob.objects.filter(pk=job_id)
+        if not request.user.is_staff:
+            jobs = jobs.filter(user=request.user)
+        job = jobs.first()
+        if job is None:
+            return Response({'detail': 'Checkout job not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        data = {'job_id': job.job_id, 'status': job.status, 'error': job.error or None}
+        if job.order_id:
+            order = Order.objects.prefetch_related(*self.prefetch_related_fields).get(pk=job.order_id)
+            payment = Payment.objects.filter(order_id=job.order_id).exclude(
+                checkout_url='').order_by('-created_at').first()
+            data.update({
+                'order': self.get_serializer(order).data,
+                'checkout_url': payment.checkout_url if payment else None,
+                'payment_status_url': request.build_absolute_uri(
+                    reverse('order-payment', kwargs={'pk': job.order_id})),
+            })
+        return Response(data)
+
+    @action(detail=True, methods=['get'], url_path='payment')
+    def payment(self, request, pk=None):
+        """
+        Checkout URL of an order, once the outbox relay has initiated its
+        payment. `?wait=<seconds>` (at most PAYMENT_POLL_MAX_WAIT) holds
+        the request until it is ready; 202 means not yet.
+        """
+        orders = Order.objects.filter(pk=pk)
+        if not request.user.is_staff:
+            orders = orders.filter(user=request.user)
+        if not orders.exists():
+            return Response({'detail': 'Order not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            wait = min(max(float(request.query_params.get('wait', 0)), 0), settings.PAYMENT_POLL_MAX_WAIT)
+        except ValueError:
+            return Response({'detail': 'wait must be a number of seconds.'}, status=status.HTTP_400_BAD_REQUEST)
+        deadline = time.monotonic() + wait
+        while True:
+            payment = Payment.objects.filter(order_id=pk).exclude(checkout_url='').order_by('-created_at').first()
+            if payment is not None:
+                return Response({
+                    'status': 'ready',
+                    'checkout_url': payment.checkout_url,
+                    'tx_ref': payment.chapa_tx_ref,
+                })
+            if OutboxEvent.objects.filter(
+                    reference=f"order:{pk}", topic='payments.initiate', status='failed').exists():
+                return Response({'status': 'failed', 'checkout_url': None}, status=status.HTTP_502_BAD_GATEWAY)
+            if time.monotonic() >= deadline:
+                return Response({'status': 'pending', 'checkout_url': None}, status=status.HTTP_202_ACCEPTED)
+            time.sleep(0.5)
+
     def perform_update(self, serializer):
         """Override to handle updates."""
         serializer.save()
@@ -190,70 +146,71 @@ class OrderViewSet(viewsets.ModelViewSet):
 
 
 @swagger_auto_schema(tags=["Customer's Preference"])
-class OrderItemViewSet(viewsets.ModelViewSet):
+class OrderItemViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     """ViewSet for managing order items."""
 
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
     lookup_field = 'id'
     permission_classes = [EcommercePermission]
+    keyset_ordering = ('order_id', 'id')
+    select_related_fields = ('product__category',)
 
-    @transaction.atomic
     def perform_create(self, serializer):
         validated_data = serializer.validated_data
         order = validated_data['order']
         product = validated_data['product']
         quantity = validated_data['quantity']
 
-        # Lock the product to prevent race conditions
-        product = Product.objects.select_for_update().get(product_id=product.product_id)
-
-        # Validate stock
-        new_stock = product.stock_quantity - quantity
-        if new_stock < 0:
-            return Response(
-                {"detail": f"Product {product.name} is oversold. Available stock: {product.stock_quantity}."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        # Mirror order status to the order item
-        order_item = serializer.save(item_status=order.status)
-
-        # Update stock
-        product.stock_quantity = new_stock
-        product.is_active = new_stock > 0
-        product.save()
+        with transaction.atomic():
+            # Mirror order status to the order item
+            serializer.save(item_status=order.status)
+            try:
+                take_stock({product.product_id: quantity})
+            except InsufficientStock as exc:
+                raise ValidationError(
+                    {"detail": f"Product {product.name} is oversold. Available stock: {exc.available}."})
 
-        # Update order total_amount
-        order.total_amount += quantity * product.price
-        order.save()
-
-        return Response(self.get_serializer(order_item).data, status=status.HTTP_201_CREATED)
+            # Update order total_amount
+            Order.objects.filter(pk=order.pk).update(
+                total_amount=F('total_amount') + quantity * product.price)
 
     def perform_update(self, serializer):
-        """Override to handle updates."""
-        serializer.save()
+        """Move stock and order totals by the change in order, product or quantity."""
+        instance = serializer.instance
+        before = (instance.order_id, instance.product_id, instance.quantity, instance.product.price)
+        with transaction.atomic():
+            order_item = serializer.save()
+            deltas = {before[1]: -before[2]}
+            deltas[order_item.product_id] = deltas.get(order_item.product_id, 0) + order_item.quantity
+            try:
+                apply_stock_deltas(deltas)
+            except InsufficientStock as exc:
+                raise ValidationError(
+                    {"detail": f"Product {order_item.product.name} is oversold. Available stock: {exc.available}."})
+
+            # Take the old line off its order and add the new one, never below zero
+            totals = {before[0]: -before[2] * before[3]}
+            line_total = order_item.quantity * order_item.product.price
+            totals[order_item.order_id] = totals.get(order_item.order_id, 0) + line_total
+            for order_id, change in totals.items():
+                if change:
+                    Order.objects.filter(pk=order_id).update(total_amount=Greatest(
+                        F('total_amount') + change, Value(0),
+                        output_field=DecimalField(max_digits=10, decimal_places=2)))
 
     @transaction.atomic
     def perform_destroy(self, instance):
         """Override to handle order item deletion with stock restoration."""
-        product = instance.product
-        quantity = instance.quantity
         order = instance.order
 
-        # Lock the product to prevent race conditions
-        product = Product.objects.select_for_update().get(product_id=product.product_id)
-
         # Restore stock
-        product.stock_quantity += quantity
-        product.is_active = product.stock_quantity > 0
-        product.save()
+        return_stock({instance.product_id: instance.quantity})
 
-        # Update order total_amount
-        order.total_amount -= quantity * product.price
-        if order.total_amount < 0:
-            order.total_amount = 0  # Prevent negative total_amount
-        order.save()
+        # Update order total_amount, never below zero
+        Order.objects.filter(pk=order.pk).update(total_amount=Greatest(
+            F('total_amount') - instance.quantity * instance.product.price, Value(0),
+            output_field=DecimalField(max_digits=10, decimal_places=2)))
 
         # Delete the order item
         instance.delete()
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='checkout_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_payment_checkout_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='refund_due',
+            field=models.BooleanField(default=False, help_text='Paid for an order that was cancelled and could not be restored'),
+        ),
+    ]
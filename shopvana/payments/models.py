@@ -33,6 +33,11 @@ class Payment(models.Model):
         ('refunded', 'Refunded')
     ])
     chapa_tx_ref = models.CharField(max_length=50, unique=True, blank=True, null=True)
+    checkout_url = models.URLField(max_length=500, blank=True)
+    refund_due = models.BooleanField(
+        default=False,
+        help_text="Paid for an order that was cancelled and could not be restored"
+        )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -15,9 +15,9 @@ class PaymentSerializer(serializers.ModelSerializer):
             'transaction_id', 'amount', 'currency',
             'payment_method', 'order', 'user', 'status',
             'phone_number', 'created_at', 'updated_at',
-            'chapa_tx_ref'
+            'chapa_tx_ref', 'checkout_url'
         )
-        read_only_fields = ('transaction_id', 'user', 'chapa_tx_ref', 'created_at', 'updated_at')
+        read_only_fields = ('transaction_id', 'user', 'chapa_tx_ref', 'checkout_url', 'created_at', 'updated_at')
         extra_kwargs = {
             'status': {'default': 'pending'},
             'currency': {'default': 'ETB'},
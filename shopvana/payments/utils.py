@@ -1,11 +1,86 @@
 import requests
 from django.conf import settings
+from uuid import uuid4
+from orders.models import Order
+from .models import Payment
 import logging
 
 logger = logging.getLogger(__name__)
 
+CHAPA_API_URL = f"{settings.CHAPA_BASE_URL.rstrip('/')}/transaction/initialize"
 CHAPA_VERIFY_URL = f"{settings.CHAPA_BASE_URL.rstrip('/')}/transaction/verify/"
 CHAPA_SECRET_KEY = settings.CHAPA_SECRET_KEY
+CHAPA_TIMEOUT = 15  # seconds
+
+
+class ChapaError(Exception):
+    """Raised when Chapa does not hand out a checkout URL."""
+
+
+def initiate_chapa_payment(order, user, amount, currency="ETB", payment_method="chapa"):
+    """
+    Initialize a Chapa transaction for ``order`` and record the pending
+    Payment with its checkout URL. Raises ChapaError on any failure.
+    """
+    order_id_short = str(order.order_id)[:8]
+    user_id_short = str(user.id)[:4]
+    random_part = uuid4().hex[:8]
+    tx_ref = f"o{order_id_short}u{user_id_short}{random_part}"
+
+    callback_url = f"{settings.SITE_URL}/api/payments/verify/"
+    payload = {
+        "amount": str(amount),
+        "currency": currency,
+        "email": user.email,
+        "tx_ref": tx_ref,
+        "callback_url": callback_url,
+        "payment_method": payment_method,
+    }
+    headers = {"Authorization": f"Bearer {CHAPA_SECRET_KEY}"}
+    try:
+        chapa_resp = requests.post(CHAPA_API_URL, json=payload, headers=headers, timeout=CHAPA_TIMEOUT)
+    except requests.RequestException as exc:
+        raise ChapaError(f"Chapa request failed for order {order.order_id}: {exc}") from exc
+    logger.info(f"Chapa response: {chapa_resp.status_code} - {chapa_resp.text}")
+    if chapa_resp.status_code != 200:
+        raise ChapaError(f"Chapa initiation failed for order {order.order_id}: {chapa_resp.text}")
+
+    return Payment.objects.create(
+        order=order,
+        user=user,
+        chapa_tx_ref=tx_ref,
+        checkout_url=chapa_resp.json()['data']['checkout_url'],
+        amount=amount,
+        currency=currency,
+        status="pending",
+        payment_method=payment_method,
+    )
+
+
+def initiate_order_payment(payload):
+    """
+    Outbox handler of `payments.initiate` events, written by checkout:
+    start the payment of an order and email its checkout link.
+    """
+    from utils.email import send_notification_email
+    order = Order.objects.select_related('user').filter(pk=payload['order_id']).first()
+    if order is None or order.status != 'pending':
+        return
+    if order.payments.filter(status='pending').exclude(checkout_url='').exists():
+        # Already initiated by an earlier delivery of the event
+        return
+
+    payment = initiate_chapa_payment(order, order.user, order.total_amount)
+    send_notification_email(
+        to_email=order.user.email,
+        subject="Complete Your Payment",
+        template_name="emails/checkout_email.html",
+        context={
+            "user_name": order.user.get_full_name() or order.user.username,
+            "checkout_url": payment.checkout_url,
+            "payment_window": order.payment_window_expires_at,
+        }
+    )
 
 
 def verify_chapa_payment(payment):
@@ -14,7 +89,12 @@ def verify_chapa_payment(payment):
     Returns (status, receipt_url) tuple.
     """
     headers = {"Authorization": f"Bearer {CHAPA_SECRET_KEY}"}
-    chapa_resp = requests.get(f"{CHAPA_VERIFY_URL}{payment.chapa_tx_ref}", headers=headers)
+    try:
+        chapa_resp = requests.get(
+            f"{CHAPA_VERIFY_URL}{payment.chapa_tx_ref}", headers=headers, timeout=CHAPA_TIMEOUT)
+    except requests.RequestException as exc:
+        logger.error(f"Chapa verification failed for {payment.chapa_tx_ref}: {exc}")
+        return "error", None
 
     if chapa_resp.status_code != 200:
         return "error", None
@@ -24,9 +104,14 @@ def verify_chapa_payment(payment):
     receipt_url = resp_data.get('data', {}).get('receipt_url')
 
     if status_str == "success":
+        from orders.services import settle_paid_order  # Import here to avoid circular import
         payment.status = "completed"
-        payment.order.status = "paid"
-        payment.order.save()
+        if not settle_paid_order(payment.order_id):
+            # The order expired and its units were sold to someone else
+            payment.refund_due = True
+            payment.save()
+            logger.warning(f"Payment {payment.chapa_tx_ref} needs a refund: its order was cancelled.")
+            return status_str, receipt_url
         payment.save()
 
         # Send receipt email
@@ -49,8 +134,9 @@ def verify_chapa_payment(payment):
 
     elif status_str == "failed":
         payment.status = "failed"
-        payment.order.status = "cancelled"
-        payment.order.save()
         payment.save()
+        # Cancelling the order returns its units to stock
+        from orders.services import cancel_orders  # Import here to avoid circular import
+        cancel_orders([payment.order_id])
 
     return status_str, receipt_url
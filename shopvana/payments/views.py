@@ -2,29 +2,24 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from .models import Payment
 from .serializer import PaymentSerializer
-import requests
-from django.conf import settings
 import logging
-from uuid import uuid4
+from utils.idempotency import idempotent
 from utils.permissions import EcommercePermission
 from utils.email import send_notification_email
 from django.shortcuts import redirect
 from rest_framework.decorators import action
-from payments.utils import verify_chapa_payment
+from payments.utils import ChapaError, initiate_chapa_payment, verify_chapa_payment
 
 logger = logging.getLogger(__name__)
 
-# Chapa Credentials
-CHAPA_API_URL = f"{settings.CHAPA_BASE_URL.rstrip('/')}/transaction/initialize"
-CHAPA_VERIFY_URL = f"{settings.CHAPA_BASE_URL}/transaction/verify/"
-CHAPA_SECRET_KEY = settings.CHAPA_SECRET_KEY
-
 
 class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [EcommercePermission]
+    keyset_ordering = ('-created_at', 'transaction_id')
 
+    @idempotent
     def create(self, request, *args, **kwargs):
           # Only admins can create payments manually
         if not request.user.is_staff:
@@ -55,57 +50,28 @@ class PaymentViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_400_BAD_REQUEST
                         )
 
-        # Fix tx_ref length
-        order_id_short = str(order.order_id)[:8]
-        user_id_short = str(request.user.id)[:4]
-        random_part = uuid4().hex[:8]
-        tx_ref = f"o{order_id_short}u{user_id_short}{random_part}"
-
-        # Fix callback_url (ensure SITE_URL is a valid URL in your settings)
-        callback_url = f"{settings.SITE_URL}/api/payments/verify/"
-
-        payload = {
-            "amount": str(amount),
-            "currency": currency,
-            "email": request.user.email,
-            "tx_ref": tx_ref,
-            "callback_url": callback_url,
-            "payment_method": payment_method,
-        }
-
-        headers = {"Authorization": f"Bearer {CHAPA_SECRET_KEY}"}
-        chapa_resp = requests.post(CHAPA_API_URL, json=payload, headers=headers)
-
-        if chapa_resp.status_code == 200:
-            resp_data = chapa_resp.json()
-            Payment.objects.create(
-                order=order,
-                user=request.user,
-                chapa_tx_ref=tx_ref,
-                amount=amount,
-                currency=currency,
-                status="pending",
-                payment_method=payment_method,
-            )
-
-            # Send checkout URL to user's email
-            send_notification_email(
-                to_email=request.user.email,
-                subject="Complete Your Payment",
-                template_name="emails/checkout_email.html",
-                context={
-                    "user_name": request.user.get_full_name() or request.user.username,
-                    "checkout_url": resp_data['data']['checkout_url'],
-                }
-            )
-            return Response({
-                "checkout_url": resp_data['data']['checkout_url'],
-                "tx_ref": tx_ref
-            }, status=status.HTTP_201_CREATED)
-        else:
-            logger.error(f"Chapa initiation failed: {chapa_resp.text}")
+        try:
+            payment = initiate_chapa_payment(
+                order, request.user, amount, currency=currency, payment_method=payment_method)
+        except ChapaError as exc:
+            logger.error(str(exc))
             return Response({'error': 'Payment initiation failed.'}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Send checkout URL to user's email
+        send_notification_email(
+            to_email=request.user.email,
+            subject="Complete Your Payment",
+            template_name="emails/checkout_email.html",
+            context={
+                "user_name": request.user.get_full_name() or request.user.username,
+                "checkout_url": payment.checkout_url,
+            }
+        )
+        return Response({
+            "checkout_url": payment.checkout_url,
+            "tx_ref": payment.chapa_tx_ref
+        }, status=status.HTTP_201_CREATED)
+
     @action(detail=False, methods=['get'], url_path='verify')
     def verify_payment(self, request):
         tx_ref = request.query_params.get('tx_ref')
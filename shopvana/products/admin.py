@@ -1,6 +1,30 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
+from .bulk import bulk_update_products
 from .models import Product, Category
 from django.utils import timezone
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class BulkPriceStockForm(forms.Form):
+    """Intermediate form of the bulk price/stock admin action."""
+    price = forms.DecimalField(
+        required=False, min_value=0, max_digits=10, decimal_places=2,
+        help_text="Leave empty to keep each product's price.")
+    stock_quantity = forms.IntegerField(
+        required=False, min_value=0,
+        help_text="Leave empty to keep each product's stock. Products without stock are deactivated.")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('price') is None and cleaned_data.get('stock_quantity') is None:
+            raise forms.ValidationError("Provide a price and/or a stock quantity.")
+        return cleaned_data
 
 
 @admin.register(Product)
@@ -14,6 +38,7 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description')
     list_filter = ('is_active', 'category')
     ordering = ('-created_at',)
+    actions = ['bulk_update_price_and_stock']
 
     def get_queryset(self, request):
         """Override to use custom manager for active products."""
@@ -21,22 +46,52 @@ class ProductAdmin(admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         """Custom save method to handle stock updates."""
-        if change:
-            # If the product is being updated, check stock changes
-            original = Product.objects.get(pk=obj.pk)
-            if original.stock_quantity != obj.stock_quantity:
-                # Handle stock changes if necessary
-                obj.updated_at = timezone.now()
-                print(
-                    f"Stock updated for {obj.name}: {original.stock_quantity} -> {obj.stock_quantity}"
-                )
+        if change and obj.has_changed('stock_quantity'):
+            # Compared against the values loaded with the form, no re-fetch
+            obj.updated_at = timezone.now()
+            logger.info(
+                f"Stock updated for {obj.name}: "
+                f"{obj._loaded_values.get('stock_quantity')} -> {obj.stock_quantity}"
+            )
         super().save_model(request, obj, form, change)
 
+    @admin.action(description="Set price / stock of selected products")
+    def bulk_update_price_and_stock(self, request, queryset):
+        """Apply one price and/or stock level to the selection in set-based UPDATEs."""
+        form = BulkPriceStockForm(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            names = dict(queryset.values_list('pk', 'name'))
+            changes = [
+                {
+                    'product_id': pk,
+                    'price': form.cleaned_data['price'],
+                    'stock_quantity': form.cleaned_data['stock_quantity'],
+                }
+                for pk in names
+            ]
+            result = bulk_update_products(changes)
+            self.message_user(
+                request, f"Updated {result['updated']} products.", messages.SUCCESS)
+            for error in result['errors']:
+                name = names[changes[error['index']]['product_id']]
+                reasons = ' '.join(str(message) for message in error['errors'].values())
+                self.message_user(request, f"{name} was not updated: {reasons}", messages.WARNING)
+            return None
+        return TemplateResponse(request, 'admin/products/product/bulk_update.html', {
+            **self.admin_site.each_context(request),
+            'title': "Set price / stock",
+            'opts': self.model._meta,
+            'queryset': queryset,
+            'form': form,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     """Admin interface for managing product categories."""
-    list_display = ('name', 'category_id', 'created_at')
+    list_display = ('name', 'category_id', 'parent_category', 'depth', 'created_at')
+    list_select_related = ('parent_category',)
     search_fields = ('name',)
     ordering = ('-created_at',)
 
@@ -0,0 +1,169 @@
+"""
+Set-based bulk price and stock updates.
+
+Each chunk of changes is applied with one statement: on PostgreSQL an
+``UPDATE ... FROM (VALUES ...)`` join, elsewhere an ``UPDATE`` with
+``CASE`` expressions. ``is_active`` follows the new stock level in the
+same statement. Signals do not fire; the catalog is refreshed once for
+the whole batch (see ``products.catalog.refresh_catalog``).
+"""
+from decimal import Decimal, InvalidOperation
+from uuid import UUID
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, DecimalField, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .catalog import refresh_catalog
+from .models import Product
+
+_PRICE_LIMIT = Decimal('100000000')  # max_digits=10, decimal_places=2
+_CENT = Decimal('0.01')
+
+
+def clean_change(change) -> tuple:
+    """Return ``((product_id, price, stock_quantity), errors)`` for one entry."""
+    if not isinstance(change, dict):
+        return None, {'non_field_errors': "Expected an object."}
+    errors = {}
+
+    try:
+        product_id = UUID(str(change.get('product_id')))
+    except ValueError:
+        product_id = None
+        errors['product_id'] = "A valid UUID is required."
+
+    price = change.get('price')
+    if price is not None:
+        try:
+            price = Decimal(str(price)).quantize(_CENT)
+            if price < 0:
+                errors['price'] = "Price must be a positive number."
+            elif price >= _PRICE_LIMIT:
+                errors['price'] = "Price is too large."
+        except (InvalidOperation, ValueError):
+            errors['price'] = "A valid number is required."
+
+    stock_quantity = change.get('stock_quantity')
+    if stock_quantity is not None:
+        if isinstance(stock_quantity, bool) or not str(stock_quantity).strip().isdigit():
+            errors['stock_quantity'] = "Stock quantity must be a non-negative integer."
+        else:
+            stock_quantity = int(stock_quantity)
+
+    if price is None and stock_quantity is None and not errors:
+        errors['non_field_errors'] = "Provide price and/or stock_quantity."
+    if errors:
+        return None, errors
+    return (product_id, price, stock_quantity), None
+
+
+def _update_postgres(rows, now) -> list:
+    """Apply one chunk with UPDATE ... FROM (VALUES ...); return touched rows."""
+    table = connection.ops.quote_name(Product._meta.db_table)
+    values = ', '.join(['(%s::uuid, %s::numeric, %s::integer)'] * len(rows))
+    params = [value for row in rows for value in (str(row[0]), row[1], row[2])]
+    sql = f"""
+        UPDATE {table} AS p SET
+            price = COALESCE(v.price, p.price),
+            stock_quantity = COALESCE(v.stock_quantity, p.stock_quantity),
+            is_active = CASE WHEN v.stock_quantity IS NULL THEN p.is_active
+                             ELSE v.stock_quantity > 0 END,
+            updated_at = %s
+        FROM (VALUES {values}) AS v (product_id, price, stock_quantity)
+        WHERE p.product_id = v.product_id
+        RETURNING p.product_id, p.category_id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [now] + params)
+        return cursor.fetchall()
+
+
+def _update_generic(rows, now) -> list:
+    """Apply one chunk with a single CASE-based UPDATE; return touched rows."""
+    ids = [row[0] for row in rows]
+    found = list(Product.objects.filter(pk__in=ids).values_list('product_id', 'category_id'))
+    if not found:
+        return []
+
+    prices = [When(pk=pk, then=Value(price)) for pk, price, _ in rows if price is not None]
+    stocks = [(pk, stock) for pk, _, stock in rows if stock is not None]
+    updates = {'updated_at': now}
+    if prices:
+        updates['price'] = Case(*prices, default=F('price'), output_field=DecimalField())
+    if stocks:
+        updates['stock_quantity'] = Case(
+            *[When(pk=pk, then=Value(stock)) for pk, stock in stocks],
+            default=F('stock_quantity'), output_field=IntegerField())
+        updates['is_active'] = Case(
+            *[When(pk=pk, then=Value(stock > 0)) for pk, stock in stocks],
+            default=F('is_active'), output_field=BooleanField())
+    Product.objects.filter(pk__in=ids).update(**updates)
+    return found
+
+
+def stock_conflicts(rows) -> dict:
+    """
+    Lock the products of ``(product_id, stock_quantity)`` pairs and return
+    ``{product_id: message}`` for those whose stock must not be set: in
+    flash-sale mode (their stock lives in the shards), or below the units
+    held in carts.
+    """
+    rows = [(product_id, stock) for product_id, stock in rows if stock is not None]
+    if not rows:
+        return {}
+    current = {
+        pk: (shards, reserved) for pk, shards, reserved in Product.objects.select_for_update().filter(
+            pk__in=[pk for pk, _ in rows]).values_list('product_id', 'stock_shards', 'reserved_quantity')
+    }
+    conflicts = {}
+    for product_id, stock in rows:
+        shards, reserved = current.get(product_id, (0, 0))
+        if shards:
+            conflicts[product_id] = "The product is in a flash sale; end it before changing its stock."
+        elif stock < reserved:
+            conflicts[product_id] = f"Stock quantity cannot be below the {reserved} units held in carts."
+    return conflicts
+
+
+def bulk_update_products(changes, chunk_size=1000) -> dict:
+    """
+    Apply ``[{product_id, price?, stock_quantity?}, ...]`` in set-based
+    chunks. Invalid entries, unknown products and stock changes that
+    ``stock_conflicts`` refuses are reported by their index in
+    ``changes`` and skipped.
+    """
+    errors = []
+    rows = {}
+    positions = {}
+    for index, change in enumerate(changes):
+        row, row_errors = clean_change(change)
+        if row_errors:
+            errors.append({'index': index, 'errors': row_errors})
+            continue
+        # Later entries for the same product win
+        rows[row[0]] = row
+        positions[row[0]] = index
+
+    update = _update_postgres if connection.vendor == 'postgresql' else _update_generic
+    now = timezone.now()
+    touched = {}
+    pending = list(rows.values())
+    with transaction.atomic():
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            conflicts = stock_conflicts((row[0], row[2]) for row in chunk)
+            for product_id, message in conflicts.items():
+                errors.append({'index': positions[product_id], 'errors': {'stock_quantity': message}})
+                del rows[product_id]
+            chunk = [row for row in chunk if row[0] not in conflicts]
+            if chunk:
+                touched.update(update(chunk, now))
+        if touched:
+            refresh_catalog(
+                products=list(touched), category_ids=touched.values(), text_changed=False)
+
+    for product_id in rows.keys() - touched.keys():
+        errors.append({'index': positions[product_id], 'errors': {'product_id': "Product not found."}})
+    errors.sort(key=lambda error: error['index'])
+    return {'updated': len(touched), 'failed': len(errors), 'errors': errors}
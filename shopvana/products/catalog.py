@@ -0,0 +1,42 @@
+"""
+Keeping denormalized catalog data in step with bulk writes.
+
+Saving a single product fires the signals in ``products.signals``, which
+maintain facet counts, category counters, search vectors, the
+autocomplete index and the cache version tokens row by row. Bulk operations (imports, bulk updates)
+write with ``bulk_create`` / ``update`` and skip those signals, then call
+``refresh_catalog`` once for the whole batch.
+"""
+from django.db import transaction
+
+from utils.cache_utils import bump_versions
+
+from .counters import refresh_category_counters
+from .facets import rebuild_facets
+from .search import update_search_vector
+from .suggest import suggest_index
+
+
+def refresh_catalog(products=None, category_ids=None, text_changed=True) -> None:
+    """
+    Re-derive catalog data after a bulk write.
+
+    ``products`` is a queryset (or ids) of the touched products and
+    ``category_ids`` the categories whose facets and counters may have moved;
+    ``None`` means the whole catalog. Pass ``text_changed=False`` when
+    names and descriptions were not written, to skip the search vectors.
+    """
+    if category_ids is not None:
+        category_ids = set(category_ids)
+    if category_ids is None or category_ids:
+        rebuild_facets(category_ids)
+        refresh_category_counters(category_ids)
+    if text_changed:
+        update_search_vector(products)
+    # The next lookup in this process reloads the index in the background;
+    # other workers pick the changes up within SUGGEST_INDEX_MAX_AGE
+    suggest_index.invalidate()
+    # Rather than one tag per touched product, `product:*` drops every
+    # cached product detail (see CachedResponseMixin.get_cache_tags)
+    transaction.on_commit(lambda: bump_versions(
+        'product', 'product:*', 'category', 'category:*', 'catalog'))
@@ -0,0 +1,90 @@
+"""
+Denormalized per-category counters: ``active_product_count``,
+``min_price`` and ``max_price`` on ``Category``.
+
+The Product signals call ``apply_product_change`` inside the product's
+own transaction, so the counters commit or roll back with the row.
+Bulk writes and ``manage.py repair_category_counters`` recompute them
+with ``refresh_category_counters``.
+"""
+from django.db.models import Count, DecimalField, F, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import Category, Product
+
+
+def _active_price(aggregate):
+    """Subquery of the MIN/MAX active price of the outer category."""
+    return Subquery(
+        Product.objects.filter(category=OuterRef('pk'), is_active=True)
+        .order_by().values('category').annotate(value=aggregate('price')).values('value')[:1],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def apply_product_change(before, after) -> set:
+    """
+    Update the counters for a product going from ``before`` to ``after``,
+    each a ``(category_id, is_active, price)`` tuple or None (not
+    existing). Returns the ids of the categories whose counters changed.
+    """
+    leaving = before if before and before[1] else None
+    joining = after if after and after[1] else None
+    if leaving == joining:
+        return set()
+
+    changed = set()
+    if leaving:
+        category_id = leaving[0]
+        moves_within = joining is not None and joining[0] == category_id
+        updates = {
+            # Removing or repricing the extreme value needs a rescan of
+            # the category's active prices (served by the category index)
+            'min_price': _active_price(Min),
+            'max_price': _active_price(Max),
+        }
+        if not moves_within:
+            updates['active_product_count'] = F('active_product_count') - 1
+        Category.objects.filter(pk=category_id).update(**updates)
+        changed.add(category_id)
+        if moves_within:
+            return changed
+
+    if joining:
+        category_id, _, price = joining
+        Category.objects.filter(pk=category_id).update(
+            active_product_count=F('active_product_count') + 1,
+            min_price=Least(Coalesce(F('min_price'), Value(price)), Value(price)),
+            max_price=Greatest(Coalesce(F('max_price'), Value(price)), Value(price)),
+        )
+        changed.add(category_id)
+    return changed
+
+
+def refresh_category_counters(category_ids=None) -> int:
+    """
+    Recompute the counters of the given categories (or all of them)
+    from one GROUP BY over the active products.
+    """
+    products = Product.objects.filter(is_active=True)
+    categories = Category.objects.all()
+    if category_ids is not None:
+        category_ids = list(category_ids)
+        products = products.filter(category_id__in=category_ids)
+        categories = categories.filter(pk__in=category_ids)
+
+    stats = {
+        row['category_id']: row
+        for row in products.order_by().values('category_id').annotate(
+            total=Count('pk'), lowest=Min('price'), highest=Max('price'))
+    }
+    updated = []
+    for category in categories.only('category_id', 'active_product_count', 'min_price', 'max_price'):
+        row = stats.get(category.pk, {})
+        values = (row.get('total', 0), row.get('lowest'), row.get('highest'))
+        if values != (category.active_product_count, category.min_price, category.max_price):
+            category.active_product_count, category.min_price, category.max_price = values
+            updated.append(category)
+    Category.objects.bulk_update(
+        updated, ['active_product_count', 'min_price', 'max_price'], batch_size=1000)
+    return len(updated)
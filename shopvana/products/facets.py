@@ -0,0 +1,186 @@
+"""
+Facet counts for catalog browsing.
+
+Counts live in `ProductFacetCount`, one row per (category, price bucket,
+in-stock) cell, and cover the active products the listing shows. The
+signals in `products.signals` apply +1/-1 deltas as
+products change, so serving facets is a handful of sums over that small
+table. When the listing is narrowed by something the table does not
+model (e.g. a text search), counts fall back to a GROUP BY over the
+filtered queryset.
+"""
+import bisect
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Case, Count, F, Q, Sum, Value, When
+from django.db.models import PositiveSmallIntegerField
+
+from .models import Product, ProductFacetCount
+
+FACET_NAMES = ('category', 'price', 'in_stock')
+
+
+def price_edges() -> list:
+    """Return the lower edge of every price bucket, ascending."""
+    return [Decimal(str(edge)) for edge in settings.PRODUCT_PRICE_BUCKETS]
+
+
+def price_bucket(price) -> int:
+    """Return the index of the bucket ``price`` falls into."""
+    return max(bisect.bisect_right(price_edges(), Decimal(str(price))) - 1, 0)
+
+
+def bucket_label(index: int) -> str:
+    """Human readable range of a price bucket, e.g. ``'25-50'`` or ``'1000+'``."""
+    edges = price_edges()
+    if index + 1 < len(edges):
+        return f"{edges[index]}-{edges[index + 1]}"
+    return f"{edges[index]}+"
+
+
+def bucket_range(index: int) -> Q:
+    """Filter matching products whose price falls into bucket ``index``."""
+    edges = price_edges()
+    condition = Q(price__gte=edges[index]) if index > 0 else Q()
+    if index + 1 < len(edges):
+        condition &= Q(price__lt=edges[index + 1])
+    return condition
+
+
+def bucket_expression() -> Case:
+    """SQL expression computing the price bucket of each product row."""
+    edges = price_edges()
+    return Case(
+        *[When(price__lt=edge, then=Value(index - 1)) for index, edge in enumerate(edges) if index],
+        default=Value(len(edges) - 1),
+        output_field=PositiveSmallIntegerField(),
+    )
+
+
+def in_stock_expression() -> Case:
+    """SQL expression telling whether a product row has stock."""
+    return Case(
+        When(stock_quantity__gt=0, then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def facet_key(category_id, price, stock_quantity, is_active=True):
+    """Return the facet cell a product with these values is counted in, or None if inactive."""
+    if not is_active:
+        return None
+    return (category_id, price_bucket(price), stock_quantity > 0)
+
+
+def apply_delta(key, delta: int) -> None:
+    """Add ``delta`` to one facet cell (none for a None key), creating the row if needed."""
+    if key is None:
+        return
+    category_id, bucket, in_stock = key
+    cell = ProductFacetCount.objects.filter(
+        category_id=category_id, price_bucket=bucket, in_stock=in_stock)
+    if cell.update(product_count=F('product_count') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            ProductFacetCount.objects.create(
+                category_id=category_id, price_bucket=bucket,
+                in_stock=in_stock, product_count=delta)
+    except IntegrityError:
+        # Another transaction created the cell first
+        cell.update(product_count=F('product_count') + delta)
+
+
+def rebuild_facets(category_ids=None) -> int:
+    """
+    Recompute facet cells from the product table in one GROUP BY,
+    for the given categories or the whole catalog.
+    """
+    products = Product.objects.filter(is_active=True)
+    cells = ProductFacetCount.objects.all()
+    if category_ids is not None:
+        category_ids = list(category_ids)
+        products = products.filter(category_id__in=category_ids)
+        cells = cells.filter(category_id__in=category_ids)
+
+    rows = products.order_by().annotate(
+        bucket=bucket_expression(), has_stock=in_stock_expression()
+    ).values('category_id', 'bucket', 'has_stock').annotate(total=Count('pk'))
+
+    with transaction.atomic():
+        cells.delete()
+        ProductFacetCount.objects.bulk_create([
+            ProductFacetCount(
+                category_id=row['category_id'], price_bucket=row['bucket'],
+                in_stock=row['has_stock'], product_count=row['total'])
+            for row in rows
+        ])
+    return len(rows)
+
+
+def _group(queryset, dimension: str, count_expression) -> dict:
+    return {
+        row[dimension]: row['total']
+        for row in queryset.order_by().values(dimension).annotate(total=count_expression)
+    }
+
+
+def _format(facet: str, counts: dict) -> list:
+    if facet == 'price':
+        return [
+            {'value': index, 'label': bucket_label(index), 'count': counts[index]}
+            for index in sorted(counts) if counts[index]
+        ]
+    if facet == 'in_stock':
+        return [
+            {'value': value, 'count': counts[value]}
+            for value in (True, False) if counts.get(value)
+        ]
+    return [
+        {'value': name, 'count': count}
+        for name, count in sorted(counts.items()) if count
+    ]
+
+
+def facet_counts(facets, category_names=None, price_buckets=None, in_stock=None) -> dict:
+    """
+    Serve facet counts from the precomputed table.
+
+    Each facet is counted with every active filter except its own, so the
+    client can show the alternatives to the current selection.
+    """
+    filters = {
+        'category': Q(category__name__in=category_names) if category_names else Q(),
+        'price': Q(price_bucket__in=price_buckets) if price_buckets else Q(),
+        'in_stock': Q(in_stock=in_stock) if in_stock is not None else Q(),
+    }
+    dimensions = {'category': 'category__name', 'price': 'price_bucket', 'in_stock': 'in_stock'}
+
+    result = {}
+    for facet in facets:
+        condition = Q()
+        for name, clause in filters.items():
+            if name != facet:
+                condition &= clause
+        cells = ProductFacetCount.objects.filter(condition)
+        result[facet] = _format(facet, _group(cells, dimensions[facet], Sum('product_count')))
+    return result
+
+
+def facet_counts_for_queryset(queryset, facets) -> dict:
+    """
+    Count facets with a GROUP BY over an arbitrarily filtered queryset,
+    limited to active products like the precomputed table.
+    """
+    queryset = queryset.filter(is_active=True).order_by().annotate(
+        facet_price=bucket_expression(), facet_in_stock=in_stock_expression())
+    dimensions = {'category': 'category__name', 'price': 'facet_price', 'in_stock': 'facet_in_stock'}
+
+    result = {}
+    for facet in facets:
+        counts = _group(queryset, dimensions[facet], Count('pk'))
+        result[facet] = _format(facet, counts)
+    return result
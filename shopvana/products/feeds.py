@@ -0,0 +1,156 @@
+"""
+Streaming catalog feeds for marketplaces and ad platforms.
+
+Rows come from a flat ``values()`` projection (category name joined in)
+read through ``.iterator(chunk_size=...)``, which uses a server-side
+cursor on PostgreSQL, and are encoded on the fly. Memory use stays
+constant whatever the catalog size.
+
+A full feed lists the active catalog. An incremental feed (``since``)
+lists every product updated after the watermark, inactive ones included
+so consumers can delist them. Each export is bounded by the latest
+``updated_at`` at the time it started, which is handed back as the
+watermark for the next run.
+
+``updated_at`` is set before a transaction commits, so a row can become
+visible after an export whose watermark is already past it. Incremental
+feeds therefore re-read ``CATALOG_FEED_OVERLAP_SECONDS`` before the
+watermark; rows stay keyed by ``product_id``, one per product, so the
+overlap only repeats rows consumers upsert anyway.
+"""
+import csv
+import json
+import zlib
+from datetime import timedelta
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F, Max
+
+from .models import Product
+
+FEED_FORMATS = ('csv', 'ndjson', 'xml')
+FEED_FIELDS = (
+    'product_id', 'name', 'description', 'price', 'stock_quantity',
+    'is_active', 'category', 'image', 'updated_at',
+)
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'xml': 'application/gzip',
+}
+FILE_EXTENSIONS = {'csv': 'csv', 'ndjson': 'ndjson', 'xml': 'xml.gz'}
+
+# Encoded rows are flushed in blocks of roughly this many bytes
+FLUSH_SIZE = 64 * 1024
+
+
+def feed_queryset(since=None):
+    """
+    Return ``(values queryset, watermark)`` for a full or incremental feed.
+    ``watermark`` is None when there is nothing to export.
+    """
+    products = Product.objects.all()
+    if since is None:
+        products = products.filter(is_active=True)
+    else:
+        overlap = timedelta(seconds=getattr(settings, 'CATALOG_FEED_OVERLAP_SECONDS', 300))
+        products = products.filter(updated_at__gt=since - overlap)
+
+    watermark = products.aggregate(latest=Max('updated_at'))['latest']
+    if watermark is not None:
+        products = products.filter(updated_at__lte=watermark)
+        if since is not None and watermark < since:
+            # Only the overlap was re-read; never move the watermark back
+            watermark = since
+    rows = products.order_by('updated_at', 'product_id').values(
+        'product_id', 'name', 'description', 'price', 'stock_quantity',
+        'is_active', 'image', 'updated_at', category_name=F('category__name'),
+    )
+    return rows, watermark
+
+
+def feed_records(rows, base_url='', chunk_size=2000):
+    """Yield flat dicts in FEED_FIELDS order with display-ready values."""
+    for row in rows.iterator(chunk_size=chunk_size):
+        image = row['image']
+        yield {
+            'product_id': str(row['product_id']),
+            'name': row['name'],
+            'description': row['description'],
+            'price': str(row['price']),
+            'stock_quantity': row['stock_quantity'],
+            'is_active': row['is_active'],
+            'category': row['category_name'],
+            'image': f"{base_url}{default_storage.url(image)}" if image else '',
+            'updated_at': row['updated_at'].isoformat(),
+        }
+
+
+class _Line:
+    """File-like sink that hands back what csv.writer writes."""
+
+    def write(self, value):
+        return value
+
+
+def _buffered(pieces):
+    """Join small encoded pieces into blocks of about FLUSH_SIZE bytes."""
+    block, size = [], 0
+    for piece in pieces:
+        block.append(piece)
+        size += len(piece)
+        if size >= FLUSH_SIZE:
+            yield b''.join(block)
+            block, size = [], 0
+    if block:
+        yield b''.join(block)
+
+
+def _csv_pieces(records):
+    writer = csv.writer(_Line())
+    yield writer.writerow(FEED_FIELDS).encode()
+    for record in records:
+        yield writer.writerow([record[field] for field in FEED_FIELDS]).encode()
+
+
+def _ndjson_pieces(records):
+    for record in records:
+        yield (json.dumps(record, ensure_ascii=False) + '\n').encode()
+
+
+def _xml_text(value) -> str:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return escape(str(value))
+
+
+def _xml_pieces(records):
+    yield b'<?xml version="1.0" encoding="UTF-8"?>\n<products>\n'
+    for record in records:
+        fields = ''.join(
+            f"<{field}>{_xml_text(record[field])}</{field}>" for field in FEED_FIELDS)
+        yield f"  <product>{fields}</product>\n".encode()
+    yield b'</products>\n'
+
+
+def _gzip(blocks):
+    """Compress a stream of byte blocks into one gzip member on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def render_feed(records, feed_format: str):
+    """Yield the encoded feed as byte blocks."""
+    if feed_format == 'csv':
+        return _buffered(_csv_pieces(records))
+    if feed_format == 'ndjson':
+        return _buffered(_ndjson_pieces(records))
+    if feed_format == 'xml':
+        return _gzip(_buffered(_xml_pieces(records)))
+    raise ValueError(f"Unsupported feed format '{feed_format}'. Use one of: {', '.join(FEED_FORMATS)}.")
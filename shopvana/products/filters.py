@@ -0,0 +1,90 @@
+from django.db.models import Q
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from .facets import bucket_range, price_edges
+from .search import search_products
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Full-text product search driven by the `?q=` query parameter.
+
+    Supports websearch syntax: `"exact phrase"`, `-excluded` and `or`.
+    The legacy `?search=` parameter is accepted as an alias.
+    Results are ordered by relevance unless `?ordering=` is given.
+    """
+    search_param = 'q'
+    legacy_search_param = 'search'
+
+    def get_search_query(self, request) -> str:
+        """Return the raw search string from the request, if any."""
+        return (
+            request.query_params.get(self.search_param)
+            or request.query_params.get(self.legacy_search_param, '')
+        )
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if not query:
+            return queryset
+        return search_products(queryset, query)
+
+
+class ProductFacetFilter(BaseFilterBackend):
+    """
+    Narrow the product list by the facet dimensions:
+    `?category=<name>[,<name>]`, `?price_bucket=<index>[,<index>]`
+    and `?in_stock=true|false`.
+    """
+
+    def get_selection(self, request) -> dict:
+        """Return the facet filters present on the request."""
+        params = request.query_params
+        category_names = [name for name in params.get('category', '').split(',') if name]
+        price_buckets = []
+        for value in params.get('price_bucket', '').split(','):
+            if value.isdigit() and int(value) < len(price_edges()):
+                price_buckets.append(int(value))
+        in_stock = params.get('in_stock', '').lower()
+        return {
+            'category_names': category_names,
+            'price_buckets': price_buckets,
+            'in_stock': {'true': True, 'false': False}.get(in_stock),
+        }
+
+    def filter_queryset(self, request, queryset, view):
+        selection = self.get_selection(request)
+        if selection['category_names']:
+            queryset = queryset.filter(category__name__in=selection['category_names'])
+        if selection['price_buckets']:
+            condition = Q()
+            for index in selection['price_buckets']:
+                condition |= bucket_range(index)
+            queryset = queryset.filter(condition)
+        if selection['in_stock'] is True:
+            queryset = queryset.filter(stock_quantity__gt=0)
+        elif selection['in_stock'] is False:
+            queryset = queryset.filter(stock_quantity=0)
+        return queryset
+
+
+class ProductOrderingFilter(OrderingFilter):
+    """
+    `?ordering=` with aliases for denormalized columns: `rating` sorts by
+    the stored average rating, ties broken by the number of reviews
+    (`-rating` for best rated first).
+    """
+    ordering_aliases = {'rating': ('rating_average', 'rating_count')}
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if params:
+            fields = []
+            for term in params.split(','):
+                term = term.strip()
+                prefix = '-' if term.startswith('-') else ''
+                name = term.lstrip('-')
+                fields += [prefix + field for field in self.ordering_aliases.get(name, (name,))]
+            ordering = self.remove_invalid_fields(queryset, fields, view, request)
+            if ordering:
+                return ordering
+        return self.get_default_ordering(view)
@@ -0,0 +1,72 @@
+"""
+Resized WebP derivatives of product images.
+
+Variants are named after the SHA-256 of the source bytes, e.g.
+``products/variants/ab/ab12...-small.webp``, so a URL never changes
+meaning and can be cached forever. Identical uploads (a re-upload, or
+the same picture on several products) share the same files and are not
+processed again.
+"""
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+VARIANT_DIR = 'products/variants'
+WEBP_QUALITY = 80
+
+
+def variant_sizes() -> dict:
+    """Return ``{name: bounding box in px}`` for every derivative."""
+    return getattr(settings, 'PRODUCT_IMAGE_VARIANTS', {'small': 160, 'medium': 480, 'large': 1200})
+
+
+def file_digest(field_file) -> str:
+    """Hash an image file in chunks without reading it into memory at once."""
+    digest = hashlib.sha256()
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()
+
+
+def variant_path(digest: str, name: str) -> str:
+    return f"{VARIANT_DIR}/{digest[:2]}/{digest}-{name}.webp"
+
+
+def render_variant(source: Image.Image, size: int) -> bytes:
+    """Downscale ``source`` to fit in a ``size`` square and encode it as WebP."""
+    image = source.copy()
+    image.thumbnail((size, size), Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def generate_variants(field_file, digest: str) -> dict:
+    """
+    Write the missing derivatives of ``field_file`` and return
+    ``{name: storage path}`` for all of them.
+    """
+    paths = {name: variant_path(digest, name) for name in variant_sizes()}
+    missing = {name: path for name, path in paths.items() if not default_storage.exists(path)}
+    if not missing:
+        return paths
+
+    field_file.open('rb')
+    try:
+        with Image.open(field_file) as original:
+            source = ImageOps.exif_transpose(original)
+            source = source.convert('RGBA' if source.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    finally:
+        field_file.close()
+
+    for name, path in missing.items():
+        default_storage.save(path, ContentFile(render_variant(source, variant_sizes()[name])))
+    return paths
@@ -0,0 +1,232 @@
+"""
+Streaming bulk import of products from CSV or NDJSON.
+
+Rows are read one at a time, validated in memory against a category
+name -> id map loaded once up front, and written in chunks with a single
+``INSERT ... ON CONFLICT (name, category) DO UPDATE`` per chunk. A bad
+row is reported with its line number and skipped; it never aborts the
+rest of the file. So is a row that would set the stock of an existing
+product in flash-sale mode, or below the units held in carts. Denormalized catalog data is refreshed once at the end
+(see ``products.catalog.refresh_catalog``).
+"""
+import codecs
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .bulk import stock_conflicts
+from .catalog import refresh_catalog
+from .models import Category, Product
+
+FILE_FORMATS = ('csv', 'ndjson')
+
+# Columns overwritten when a (name, category) row already exists
+UPDATE_FIELDS = ['description', 'price', 'stock_quantity', 'is_active', 'updated_at']
+
+_TRUE_VALUES = {'1', 'true', 'yes', 'y', 't', ''}
+_FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+_PRICE_LIMIT = Decimal('100000000')  # max_digits=10, decimal_places=2
+_CENT = Decimal('0.01')
+
+
+class ImportResult:
+    """Counters and per-row errors of one import run."""
+
+    def __init__(self, max_errors=1000):
+        self.max_errors = max_errors
+        self.processed = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+def detect_format(filename: str, default='csv') -> str:
+    """Guess the file format from its extension."""
+    lowered = (filename or '').lower()
+    if lowered.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    if lowered.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, file_format: str):
+    """
+    Yield ``(line_number, row_dict)`` from a text or binary stream
+    without loading the file into memory. Unparseable NDJSON lines are
+    yielded as ``(line_number, None)``.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = codecs.getreader('utf-8-sig')(stream)
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+class ProductImporter:
+    """Validate product rows in memory and upsert them in chunks."""
+
+    chunk_size = 2000
+
+    def __init__(self, chunk_size=None, max_errors=1000):
+        if chunk_size:
+            self.chunk_size = chunk_size
+        self.result = ImportResult(max_errors=max_errors)
+        # One query instead of a lookup per row
+        self.category_ids = dict(Category.objects.values_list('name', 'category_id'))
+        self.touched_categories = set()
+
+    def clean(self, row: dict):
+        """Return ``(product, errors)`` for one raw row; exactly one is set."""
+        errors = {}
+
+        name = str(row.get('name') or '').strip()
+        if not name:
+            errors['name'] = "This field is required."
+        elif len(name) > 255:
+            errors['name'] = "Name is too long. Maximum length is 255 characters."
+
+        description = str(row.get('description') or '')
+        if len(description) > 1000:
+            errors['description'] = "Description is too long. Max length is 1000 characters."
+
+        category_name = str(row.get('category') or '').strip()
+        category_id = self.category_ids.get(category_name)
+        if category_id is None:
+            errors['category'] = f"Unknown category '{category_name}'."
+
+        try:
+            price = Decimal(str(row.get('price'))).quantize(_CENT)
+            if price < 0:
+                errors['price'] = "Price must be a positive number."
+            elif price >= _PRICE_LIMIT:
+                errors['price'] = "Price is too large."
+        except (InvalidOperation, ValueError):
+            errors['price'] = "A valid number is required."
+
+        try:
+            stock_quantity = int(str(row.get('stock_quantity') or 0).strip())
+            if stock_quantity < 0:
+                errors['stock_quantity'] = "Stock quantity must be a non-negative integer."
+        except ValueError:
+            errors['stock_quantity'] = "A valid integer is required."
+
+        is_active = row.get('is_active', True)
+        if not isinstance(is_active, bool):
+            flag = str(is_active).strip().lower()
+            if flag in _TRUE_VALUES:
+                is_active = True
+            elif flag in _FALSE_VALUES:
+                is_active = False
+            else:
+                errors['is_active'] = "Must be a boolean."
+
+        if errors:
+            return None, errors
+        return Product(
+            name=name,
+            category_id=category_id,
+            description=description,
+            price=price,
+            stock_quantity=stock_quantity,
+            is_active=is_active,
+        ), None
+
+    def run(self, rows) -> ImportResult:
+        """Import ``(line_number, row)`` pairs and refresh the catalog once."""
+        started = timezone.now()
+        chunk = {}
+        for line, row in rows:
+            self.result.processed += 1
+            if row is None:
+                self.result.add_error(line, {'row': "Not a valid JSON object."})
+                continue
+            product, errors = self.clean(row)
+            if errors:
+                self.result.add_error(line, errors)
+                continue
+            # A repeated (name, category) within one statement cannot be
+            # upserted twice; the last occurrence wins
+            chunk[(product.name, product.category_id)] = (line, product)
+            if len(chunk) >= self.chunk_size:
+                self.write(chunk)
+                chunk = {}
+        if chunk:
+            self.write(chunk)
+
+        if self.result.imported:
+            refresh_catalog(
+                products=Product.objects.filter(
+                    updated_at__gte=started, category_id__in=self.touched_categories),
+                category_ids=self.touched_categories,
+            )
+        return self.result
+
+    def write(self, chunk: dict) -> None:
+        """Upsert one chunk, reporting every row of it if the statement fails."""
+        try:
+            with transaction.atomic():
+                # Existing products keep their flash-sale shards and cart holds
+                existing = {
+                    (name, category_id): pk for pk, name, category_id in Product.objects.filter(
+                        name__in=[key[0] for key in chunk],
+                        category_id__in={key[1] for key in chunk},
+                    ).values_list('product_id', 'name', 'category_id')
+                    if (name, category_id) in chunk
+                }
+                conflicts = stock_conflicts(
+                    (pk, chunk[key][1].stock_quantity) for key, pk in existing.items())
+                for key, (line, _) in list(chunk.items()):
+                    if existing.get(key) in conflicts:
+                        del chunk[key]
+                        self.result.add_error(line, {'stock_quantity': conflicts[existing[key]]})
+                products = [product for _, product in chunk.values()]
+                if not products:
+                    return
+                Product.objects.bulk_create(
+                    products,
+                    update_conflicts=True,
+                    unique_fields=['name', 'category'],
+                    update_fields=UPDATE_FIELDS,
+                )
+        except DatabaseError as exc:
+            for line, _ in chunk.values():
+                self.result.add_error(line, {'row': f"Database error: {exc}"})
+            return
+        self.result.imported += len(products)
+        self.touched_categories.update(product.category_id for product in products)
+
+
+def import_products(stream, file_format='csv', chunk_size=None, max_errors=1000) -> ImportResult:
+    """Import products from ``stream`` (CSV with a header row, or NDJSON)."""
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"Unsupported format '{file_format}'. Use one of: {', '.join(FILE_FORMATS)}.")
+    importer = ProductImporter(chunk_size=chunk_size, max_errors=max_errors)
+    return importer.run(read_rows(stream, file_format))
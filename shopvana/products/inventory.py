@@ -0,0 +1,267 @@
+"""
+Stock changes for orders.
+
+Every change goes through ``apply_stock_deltas``: a single conditional
+UPDATE, ``stock_quantity = stock_quantity - delta WHERE stock_quantity >=
+delta``, with ``is_active`` following the new level in the same
+statement. Nothing is read and re-saved, so row locks are taken at the
+UPDATE and there is no read-modify-write window. On PostgreSQL the rows
+are first locked in product id order, so orders touching the same
+products cannot deadlock.
+
+Cart reservations (``reserve_stock`` / ``release_reservations``) move
+``reserved_quantity`` the same way, and checkout consumes them in the
+stock UPDATE itself (``released``). What is left to sell is
+``stock_quantity - reserved_quantity``, read from the product row.
+
+Products in flash-sale mode keep their stock in ``StockShard`` rows
+instead; their deltas are routed to ``products.shards``.
+
+Signals do not fire; products whose stock crosses zero have their facet
+cells, category counters and autocomplete entries moved here, and their
+cached representations invalidated on commit.
+"""
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from utils.cache_utils import bump_versions
+
+from .counters import apply_product_change
+from .facets import apply_delta, facet_key
+from .models import Product
+from .shards import return_to_shards, schedule_reconcile, sharded_products, take_from_shards
+from .suggest import suggest_index
+
+
+class InsufficientStock(Exception):
+    """Raised when a product does not have the requested quantity in stock."""
+
+    def __init__(self, product_id, requested, available):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f"Product {product_id} is oversold. Requested: {requested}, available stock: {available}.")
+
+
+def _apply_postgres(deltas, now) -> list:
+    """Lock the rows in id order, then update them in one statement."""
+    table = connection.ops.quote_name(Product._meta.db_table)
+    values = ', '.join(['(%s::uuid, %s::integer, %s::integer)'] * len(deltas))
+    params = [value for row in deltas for value in (str(row[0]), row[1], row[2])]
+    sql = f"""
+        WITH locked AS MATERIALIZED (
+            SELECT product_id, stock_quantity, is_active FROM {table}
+            WHERE product_id = ANY(%s::uuid[])
+            ORDER BY product_id
+            FOR UPDATE
+        )
+        UPDATE {table} AS p SET
+            stock_quantity = p.stock_quantity - v.delta,
+            reserved_quantity = p.reserved_quantity - v.released,
+            is_active = CASE
+                WHEN p.stock_quantity - v.delta = 0 THEN FALSE
+                WHEN p.stock_quantity = 0 THEN TRUE
+                ELSE p.is_active END,
+            updated_at = %s
+        FROM (VALUES {values}) AS v (product_id, delta, released), locked
+        WHERE p.product_id = v.product_id
+          AND locked.product_id = p.product_id
+          AND p.reserved_quantity >= v.released
+          AND (v.delta <= 0 OR (p.stock_shards = 0
+               AND p.stock_quantity - p.reserved_quantity + v.released >= v.delta))
+        RETURNING p.product_id, p.category_id, p.price,
+                  locked.stock_quantity, locked.is_active, p.stock_quantity, p.is_active
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [[str(row[0]) for row in deltas], now] + params)
+        return cursor.fetchall()
+
+
+def _apply_generic(deltas, now) -> list:
+    """Read the current rows, then update them with one CASE-based UPDATE."""
+    ids = [row[0] for row in deltas]
+    before = {
+        row[0]: row for row in Product.objects.filter(pk__in=ids).values_list(
+            'product_id', 'category_id', 'price', 'stock_quantity', 'is_active',
+            'reserved_quantity', 'stock_shards')
+    }
+    change = Case(
+        *[When(pk=product_id, then=Value(delta)) for product_id, delta, _ in deltas],
+        output_field=IntegerField(),
+    )
+    enough = Q()
+    for product_id, delta, released in deltas:
+        condition = Q(pk=product_id, reserved_quantity__gte=released)
+        if delta > 0:
+            # A flash sale started meanwhile owns the stock now
+            condition &= Q(stock_shards=0, stock_quantity__gte=F('reserved_quantity') + (delta - released))
+        enough |= condition
+    updates = {
+        'stock_quantity': F('stock_quantity') - change,
+        'is_active': Case(
+            When(stock_quantity=change, then=Value(False)),
+            When(stock_quantity=0, then=Value(True)),
+            default=F('is_active'),
+            output_field=BooleanField(),
+        ),
+        'updated_at': now,
+    }
+    if any(released for _, _, released in deltas):
+        updates['reserved_quantity'] = F('reserved_quantity') - Case(
+            *[When(pk=product_id, then=Value(released)) for product_id, _, released in deltas],
+            output_field=IntegerField(),
+        )
+    Product.objects.filter(enough).update(**updates)
+
+    rows = []
+    for product_id, delta, released in deltas:
+        row = before.get(product_id)
+        if row is None:
+            continue
+        _, category_id, price, stock, active, reserved, shards = row
+        if reserved < released or (delta > 0 and (shards or stock - reserved + released < delta)):
+            continue
+        new_stock = stock - delta
+        new_active = False if new_stock == 0 else (True if stock == 0 else active)
+        rows.append((product_id, category_id, price, stock, active, new_stock, new_active))
+    return rows
+
+
+def apply_stock_deltas(deltas: dict, released=None) -> list:
+    """
+    Take ``{product_id: delta}`` units out of stock (a negative delta puts
+    units back), all or nothing. ``released`` gives, per product, units
+    of the caller's own reservations consumed by the change. Raises
+    InsufficientStock, leaving every product untouched, if any product
+    has less than its delta available.
+
+    Returns ``[(product_id, category_id, price, old_stock, old_active,
+    new_stock, new_active), ...]``.
+    """
+    released = released or {}
+    deltas = sorted(
+        (product_id, delta, released.get(product_id, 0))
+        for product_id, delta in deltas.items() if delta or released.get(product_id)
+    )
+    if not deltas:
+        return []
+    apply = _apply_postgres if connection.vendor == 'postgresql' else _apply_generic
+    with transaction.atomic():
+        deltas = _apply_sharded(deltas)
+        rows = apply(deltas, timezone.now()) if deltas else []
+        if len(rows) < len(deltas):
+            updated = {row[0] for row in rows}
+            product_id, delta, _ = next(row for row in deltas if row[0] not in updated)
+            raise InsufficientStock(product_id, delta, available_quantity(product_id))
+        sync_catalog(rows)
+    return rows
+
+
+def _apply_sharded(deltas) -> list:
+    """Apply the deltas of flash-sale products to their shards; return the others."""
+    shards = sharded_products(row[0] for row in deltas)
+    if not shards:
+        return deltas
+    rest = []
+    for product_id, delta, released in deltas:
+        if product_id not in shards:
+            rest.append((product_id, delta, released))
+        elif delta > 0:
+            taken = take_from_shards(product_id, delta)
+            if taken < delta:
+                raise InsufficientStock(product_id, delta, taken)
+        elif delta < 0 and not return_to_shards(product_id, -delta, shards[product_id]):
+            # The sale ended meanwhile; the units go back to the product row
+            rest.append((product_id, delta, 0))
+    schedule_reconcile(shards)
+    return rest
+
+
+def take_stock(quantities: dict, released=None) -> list:
+    """
+    Remove ``{product_id: quantity}`` from stock, consuming ``released``
+    reserved units; see ``apply_stock_deltas``.
+    """
+    return apply_stock_deltas(quantities, released)
+
+
+def return_stock(quantities: dict) -> list:
+    """Put ``{product_id: quantity}`` back into stock."""
+    return apply_stock_deltas({product_id: -quantity for product_id, quantity in quantities.items()})
+
+
+def available_quantity(product_id) -> int:
+    """Units of a product that are neither sold nor reserved."""
+    row = Product.objects.filter(pk=product_id).values_list(
+        'stock_quantity', 'reserved_quantity').first()
+    return max(row[0] - row[1], 0) if row else 0
+
+
+def reserve_stock(product_id, quantity: int) -> bool:
+    """
+    Hold ``quantity`` units of a product for a cart, if that many are
+    available. Raises InsufficientStock otherwise. Returns False, holding
+    nothing, for products in flash-sale mode.
+    """
+    if quantity <= 0:
+        return True
+    held = Product.objects.filter(
+        pk=product_id, stock_shards=0, stock_quantity__gte=F('reserved_quantity') + quantity
+    ).update(reserved_quantity=F('reserved_quantity') + quantity)
+    if held:
+        return True
+    if Product.objects.filter(pk=product_id, stock_shards__gt=0).exists():
+        return False
+    raise InsufficientStock(product_id, quantity, available_quantity(product_id))
+
+
+def release_reservations(quantities: dict) -> None:
+    """Drop ``{product_id: quantity}`` of held units with one UPDATE."""
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+    if not quantities:
+        return
+    Product.objects.filter(pk__in=quantities).update(reserved_quantity=Greatest(
+        F('reserved_quantity') - Case(
+            *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    ))
+
+
+def sync_catalog(rows) -> None:
+    """Move the denormalized catalog data of products whose stock crossed zero."""
+    changed_categories, reactivated, deactivated = set(), [], []
+    for product_id, category_id, price, old_stock, old_active, new_stock, new_active in rows:
+        old_key = facet_key(category_id, price, old_stock, old_active)
+        new_key = facet_key(category_id, price, new_stock, new_active)
+        if old_key != new_key:
+            apply_delta(old_key, -1)
+            apply_delta(new_key, 1)
+        if old_active != new_active:
+            changed_categories |= apply_product_change(
+                (category_id, old_active, price), (category_id, new_active, price))
+            (reactivated if new_active else deactivated).append(product_id)
+    if suggest_index.is_built and (reactivated or deactivated):
+        # Names are not part of the rows
+        names = list(Product.objects.filter(pk__in=reactivated).values_list('product_id', 'name'))
+        transaction.on_commit(lambda: _sync_suggestions(names, deactivated))
+
+    tags = ['product', 'catalog', *[f"product:{row[0]}" for row in rows]]
+    if changed_categories:
+        tags += ['category', *[f"category:{pk}" for pk in changed_categories]]
+    transaction.on_commit(lambda: bump_versions(*tags))
+
+
+def _sync_suggestions(added, removed) -> None:
+    """Apply committed stock-out / restock changes to the autocomplete index."""
+    if not suggest_index.is_built:
+        return
+    for product_id, name in added:
+        suggest_index.add('product', product_id, name)
+    for product_id in removed:
+        suggest_index.remove('product', product_id)
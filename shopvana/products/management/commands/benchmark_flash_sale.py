@@ -0,0 +1,87 @@
+import threading
+import time
+from decimal import Decimal
+from uuid import uuid4
+
+from django.db import DatabaseError, connection, transaction
+from django.core.management.base import BaseCommand
+from products.inventory import InsufficientStock, take_stock
+from products.models import Category, Product
+from products.shards import disable_flash_sale, enable_flash_sale
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure checkouts/sec on a single hot product, with and without stock shards. "
+        "Each checkout is a transaction taking one unit through the inventory service; "
+        "run it against the production database engine (SQLite serializes all writers)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000, help="Checkouts per run.")
+        parser.add_argument('--threads', type=int, default=16, help="Concurrent checkouts.")
+        parser.add_argument('--shards', type=int, default=16, help="Stock shards in the sharded run.")
+        parser.add_argument('--hold-ms', type=float, default=0,
+                            help="Work done after taking the stock, before the commit.")
+
+    def handle(self, *args, **options):
+        for shards in (0, options['shards']):
+            checkouts, failures, elapsed = self.run(shards, options)
+            label = f"{shards} shards" if shards else "no sharding"
+            self.stdout.write(self.style.SUCCESS(
+                f"{label}: {checkouts} checkouts in {elapsed:.2f}s = {checkouts / elapsed:.0f}/s"
+                f" ({failures} failed)."))
+
+    def run(self, shards, options):
+        """Sell ``orders`` units of a fresh product from ``threads`` threads."""
+        category = Category.objects.create(name=f"Flash sale benchmark {uuid4().hex[:8]}")
+        product = Product.objects.create(
+            name="Flash sale benchmark", price=Decimal('1.00'),
+            stock_quantity=options['orders'], category=category)
+        if shards:
+            enable_flash_sale(product.pk, shards)
+
+        remaining = [options['orders']]
+        counts = {'checkouts': 0, 'failures': 0}
+        errors = {}
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not remaining[0]:
+                            return
+                        remaining[0] -= 1
+                    try:
+                        with transaction.atomic():
+                            take_stock({product.pk: 1})
+                            if options['hold_ms']:
+                                time.sleep(options['hold_ms'] / 1000)
+                        outcome = 'checkouts'
+                    except (InsufficientStock, DatabaseError) as exc:
+                        outcome = 'failures'
+                        errors.setdefault(type(exc).__name__, str(exc))
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        if shards:
+            disable_flash_sale(product.pk)
+        product.refresh_from_db()
+        if product.stock_quantity != options['orders'] - counts['checkouts']:
+            self.stderr.write(f"Stock mismatch: {product.stock_quantity} left.")
+        product.delete()
+        category.delete()
+        for name, message in errors.items():
+            self.stderr.write(f"First {name}: {message}")
+        return counts['checkouts'], counts['failures'], elapsed
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from products.recommendations import build_related_products
+
+
+class Command(BaseCommand):
+    help = "Rebuild the \"frequently bought together\" table from order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, help="Neighbours kept per product.")
+        parser.add_argument('--chunk-size', type=int, help="Order lines processed per batch.")
+
+    def handle(self, *args, **options):
+        written = build_related_products(top_k=options['top_k'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} related product rows."))
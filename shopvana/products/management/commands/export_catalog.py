@@ -0,0 +1,45 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from products.feeds import FEED_FORMATS, feed_queryset, feed_records, render_feed
+
+
+class Command(BaseCommand):
+    help = "Stream the catalog feed (CSV, NDJSON or gzipped XML) to a file or standard output."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', choices=FEED_FORMATS, default='csv', help="Feed format.")
+        parser.add_argument(
+            '--since', help="Only export products updated after this ISO 8601 datetime.")
+        parser.add_argument(
+            '--file', help="Write the feed here instead of standard output.")
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000, help="Rows fetched per database round trip.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError("--since must be an ISO 8601 datetime.")
+
+        rows, watermark = feed_queryset(since=since)
+        records = feed_records(
+            rows, base_url=settings.SITE_URL.rstrip('/'), chunk_size=options['chunk_size'])
+        blocks = render_feed(records, options['output'])
+
+        if options['file']:
+            with open(options['file'], 'wb') as target:
+                for block in blocks:
+                    target.write(block)
+        else:
+            for block in blocks:
+                sys.stdout.buffer.write(block)
+            sys.stdout.buffer.flush()
+
+        next_watermark = watermark or since
+        self.stderr.write(
+            f"Watermark: {next_watermark.isoformat() if next_watermark else 'none (empty feed)'}")
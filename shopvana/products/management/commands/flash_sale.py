@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.models import Product
+from products.shards import disable_flash_sale, enable_flash_sale
+
+
+class Command(BaseCommand):
+    help = "Start or end flash-sale mode (stock split across counter shards) for a product."
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', help="Product to put on (or take off) flash sale.")
+        parser.add_argument('--shards', type=int, default=16, help="Number of stock shards.")
+        parser.add_argument('--off', action='store_true', help="End the flash sale.")
+
+    def handle(self, *args, **options):
+        product_id = options['product_id']
+        try:
+            if options['off']:
+                units = disable_flash_sale(product_id)
+                self.stdout.write(self.style.SUCCESS(f"Flash sale ended; {units} units back on the product."))
+                return
+            units = enable_flash_sale(product_id, options['shards'])
+        except (Product.DoesNotExist, ValueError) as exc:
+            raise CommandError(f"Could not start the flash sale: {exc}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Flash sale started: {units} units in {options['shards']} shards."))
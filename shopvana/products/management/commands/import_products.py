@@ -0,0 +1,45 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from products.importers import FILE_FORMATS, detect_format, import_products
+
+
+class Command(BaseCommand):
+    help = "Bulk import products from a CSV (with header row) or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' to read standard input.")
+        parser.add_argument(
+            '--format', dest='file_format', choices=FILE_FORMATS,
+            help="File format (guessed from the extension by default).")
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help="Rows written per INSERT statement.")
+        parser.add_argument(
+            '--max-errors', type=int, default=50,
+            help="Row errors to print (all of them are counted).")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or detect_format(path)
+        started = time.monotonic()
+        try:
+            if path == '-':
+                result = import_products(
+                    sys.stdin.buffer, file_format,
+                    chunk_size=options['chunk_size'], max_errors=options['max_errors'])
+            else:
+                with open(path, 'rb') as stream:
+                    result = import_products(
+                        stream, file_format,
+                        chunk_size=options['chunk_size'], max_errors=options['max_errors'])
+        except OSError as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+
+        for error in result.errors:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {result.processed} rows in {elapsed:.1f}s: "
+            f"{result.imported} imported, {result.failed} failed."))
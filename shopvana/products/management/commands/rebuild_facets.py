@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed product facet counts from the product table."
+
+    def handle(self, *args, **options):
+        cells = rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {cells} facet cells."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.trending import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the trending and best-seller counters from order history."
+
+    def handle(self, *args, **options):
+        written = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} sales counter buckets."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products.counters import refresh_category_counters
+from utils.cache_utils import bump_versions
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-category active product counts and price ranges in one pass."
+
+    def handle(self, *args, **options):
+        repaired = refresh_category_counters()
+        if repaired:
+            bump_versions('category', 'category:*', 'catalog')
+        self.stdout.write(self.style.SUCCESS(f"Repaired counters of {repaired} categories."))
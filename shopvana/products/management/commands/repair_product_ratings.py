@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products.ratings import refresh_product_ratings
+from utils.cache_utils import bump_versions
+
+
+class Command(BaseCommand):
+    help = "Recompute the product rating counts, averages and histograms from the reviews."
+
+    def handle(self, *args, **options):
+        repaired = refresh_product_ratings()
+        if repaired:
+            bump_versions('product', 'product:*', 'catalog')
+        self.stdout.write(self.style.SUCCESS(f"Repaired ratings of {repaired} products."))
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.21 on 2026-10-18 18:49
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """Create the GIN index and backfill vectors (PostgreSQL only)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS shopvana_pr_search_gin '
+        'ON shopvana_product USING gin (search_vector)'
+    )
+    Product = apps.get_model('products', 'Product')
+    Product.objects.update(
+        search_vector=SearchVector('name', weight='A', config='english')
+        + SearchVector('description', weight='B', config='english')
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS shopvana_pr_search_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Weighted full-text vector of name and description (PostgreSQL only)', null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.21 on 2026-10-18 18:53
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# settings.PRODUCT_PRICE_BUCKETS when this migration was written; later
+# changes are applied with `manage.py rebuild_facets`
+PRICE_BUCKETS = [0, 25, 50, 100, 250, 500, 1000]
+
+
+def populate_facet_counts(apps, schema_editor):
+    """Count the existing active catalog into the new facet table."""
+    Product = apps.get_model('products', 'Product')
+    ProductFacetCount = apps.get_model('products', 'ProductFacetCount')
+    edges = [Decimal(str(edge)) for edge in PRICE_BUCKETS]
+    bucket = models.Case(
+        *[models.When(price__lt=edge, then=models.Value(index - 1)) for index, edge in enumerate(edges) if index],
+        default=models.Value(len(edges) - 1),
+        output_field=models.PositiveSmallIntegerField(),
+    )
+    has_stock = models.Case(
+        models.When(stock_quantity__gt=0, then=models.Value(True)),
+        default=models.Value(False),
+        output_field=models.BooleanField(),
+    )
+    rows = Product.objects.filter(is_active=True).order_by().annotate(
+        bucket=bucket, has_stock=has_stock
+    ).values('category_id', 'bucket', 'has_stock').annotate(total=models.Count('pk'))
+    ProductFacetCount.objects.bulk_create([
+        ProductFacetCount(
+            category_id=row['category_id'], price_bucket=row['bucket'],
+            in_stock=row['has_stock'], product_count=row['total'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_bucket', models.PositiveSmallIntegerField(help_text='Index into settings.PRODUCT_PRICE_BUCKETS')),
+                ('in_stock', models.BooleanField(help_text='Whether the counted products have stock')),
+                ('product_count', models.IntegerField(default=0, help_text='Number of products in this bucket')),
+                ('category', models.ForeignKey(help_text='Category the counted products belong to', on_delete=django.db.models.deletion.CASCADE, related_name='facet_counts', to='products.category')),
+            ],
+            options={
+                'verbose_name_plural': 'Product facet counts',
+                'db_table': 'shopvana_product_facet_count',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productfacetcount',
+            constraint=models.UniqueConstraint(fields=('category', 'price_bucket', 'in_stock'), name='unique_product_facet_bucket'),
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
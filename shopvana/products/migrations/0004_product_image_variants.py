@@ -0,0 +1,23 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_facet_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the image bytes the variants were generated from', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Storage paths of the resized WebP variants, keyed by size name'),
+        ),
+    ]
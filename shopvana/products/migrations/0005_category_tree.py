@@ -0,0 +1,44 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_paths(apps, schema_editor):
+    """Existing categories are all top-level: their path is their own id."""
+    Category = apps.get_model('products', 'Category')
+    categories = list(Category.objects.only('category_id'))
+    for category in categories:
+        category.path = f"{category.category_id.hex}/"
+        category.depth = 0
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Number of ancestors (0 for top-level categories)'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent_category',
+            field=models.ForeignKey(blank=True, help_text='Parent category (empty for top-level categories)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='subcategories', to='products.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(default='', editable=False, help_text="Materialized path: the hex ids of all ancestors and itself, each followed by '/'", max_length=1024),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='shopvana_category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
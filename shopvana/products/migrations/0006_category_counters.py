@@ -0,0 +1,44 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    """Compute the counters of existing categories in one GROUP BY."""
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+    rows = Product.objects.filter(is_active=True).order_by().values('category_id').annotate(
+        total=models.Count('pk'), lowest=models.Min('price'), highest=models.Max('price'))
+    categories = []
+    for row in rows:
+        categories.append(Category(
+            category_id=row['category_id'], active_product_count=row['total'],
+            min_price=row['lowest'], max_price=row['highest']))
+    Category.objects.bulk_update(
+        categories, ['active_product_count', 'min_price', 'max_price'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_category_tree'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='active_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of active products directly in this category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='max_price',
+            field=models.DecimalField(decimal_places=2, editable=False, help_text='Highest price among the active products (empty if none)', max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='min_price',
+            field=models.DecimalField(decimal_places=2, editable=False, help_text='Lowest price among the active products (empty if none)', max_digits=10, null=True),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
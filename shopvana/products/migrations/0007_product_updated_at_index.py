@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_category_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at'], name='shopvana_pr_updated_64b317_idx'),
+        ),
+    ]
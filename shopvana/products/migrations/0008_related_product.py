@@ -0,0 +1,34 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(help_text="Position among the product's neighbours (0 is the best)")),
+                ('score', models.FloatField(help_text="Cosine similarity of the two products' purchase vectors")),
+                ('co_purchases', models.PositiveIntegerField(help_text='Number of orders containing both products')),
+                ('product', models.ForeignKey(help_text='Product the recommendation is shown for', on_delete=django.db.models.deletion.CASCADE, related_name='related_products', to='products.product')),
+                ('related', models.ForeignKey(help_text='Product frequently bought together with it', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Related products',
+                'db_table': 'shopvana_related_product',
+                'indexes': [models.Index(fields=['product', 'rank'], name='shopvana_re_product_13e618_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedproduct',
+            constraint=models.UniqueConstraint(fields=('product', 'related'), name='unique_related_product'),
+        ),
+    ]
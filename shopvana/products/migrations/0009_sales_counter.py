@@ -0,0 +1,34 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_related_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], help_text='Bucket granularity', max_length=4)),
+                ('bucket', models.DateTimeField(help_text='Start of the hour or day the sales are counted in')),
+                ('quantity', models.PositiveIntegerField(default=0, help_text='Units sold in the bucket')),
+                ('category', models.ForeignKey(help_text='Category of the product when it was sold', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.category')),
+                ('product', models.ForeignKey(help_text='Product sold', on_delete=django.db.models.deletion.CASCADE, related_name='sales_counters', to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Sales counters',
+                'db_table': 'shopvana_sales_counter',
+                'indexes': [models.Index(fields=['window', 'bucket'], name='shopvana_sa_window_24ac00_idx'), models.Index(fields=['category', 'window', 'bucket'], name='shopvana_sa_categor_903f08_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='salescounter',
+            constraint=models.UniqueConstraint(fields=('product', 'window', 'bucket'), name='unique_sales_counter_bucket'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:15
+
+from django.db import migrations, models
+
+
+def populate_ratings(apps, schema_editor):
+    """Compute the rating aggregates of reviewed products in one GROUP BY."""
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('reviews', 'Review')
+    stars = range(1, 6)
+    rows = Review.objects.order_by().values('order_id__product_id').annotate(
+        count=models.Count('pk'), total=models.Sum('rating'),
+        **{f"star_{star}": models.Count('pk', filter=models.Q(rating=star)) for star in stars})
+    products = []
+    for row in rows:
+        product = Product(
+            product_id=row['order_id__product_id'], rating_count=row['count'],
+            rating_sum=row['total'], rating_average=row['total'] / row['count'])
+        for star in stars:
+            setattr(product, f"rating_{star}", row[f"star_{star}"])
+        products.append(product)
+    Product.objects.bulk_update(
+        products,
+        ['rating_count', 'rating_sum', 'rating_average', *[f"rating_{star}" for star in stars]],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_sales_counter'),
+        ('reviews', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of 1-star reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of 2-star reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of 3-star reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of 4-star reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of 5-star reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_average',
+            field=models.FloatField(default=0, editable=False, help_text='Average review rating (0 when unrated)'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of reviews of this product'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Sum of the review ratings'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['rating_average'], name='shopvana_pr_rating__0ff2fb_idx'),
+        ),
+        migrations.RunPython(populate_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_reserved_quantity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_shards',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Flash-sale mode: number of StockShard rows holding the stock (0 = off)'),
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField(help_text='Position of the shard, from 0')),
+                ('quantity', models.PositiveIntegerField(default=0, help_text='Units in the shard')),
+                ('product', models.ForeignKey(help_text='Product whose stock is split', on_delete=django.db.models.deletion.CASCADE, related_name='stock_shard_rows', to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Stock shards',
+                'db_table': 'shopvana_stock_shard',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockshard',
+            constraint=models.UniqueConstraint(fields=('product', 'index'), name='unique_stock_shard'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+"""
+Denormalized review aggregates on ``Product``: ``rating_count``,
+``rating_sum``, ``rating_average`` and the ``rating_1`` .. ``rating_5``
+histogram.
+
+Reviews hang off order items, so the Review signals resolve the product
+and call ``apply_rating_change`` inside the review's own transaction.
+Every column moves with one ``F()`` UPDATE per product, so concurrent
+reviews never overwrite each other. ``manage.py repair_product_ratings``
+recomputes them with ``refresh_product_ratings``.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from utils.cache_utils import bump_versions
+
+from .models import Product
+
+STARS = range(1, 6)
+
+
+def apply_rating_change(before, after) -> set:
+    """
+    Move the aggregates for a review going from ``before`` to ``after``,
+    each a ``(product_id, rating)`` tuple or None (not existing).
+    Returns the ids of the products whose aggregates changed.
+    """
+    if before == after:
+        return set()
+    deltas = defaultdict(lambda: {'count': 0, 'sum': 0, 'stars': defaultdict(int)})
+    for state, sign in ((before, -1), (after, 1)):
+        if state is None or state[0] is None:
+            continue
+        product_id, rating = state
+        delta = deltas[product_id]
+        delta['count'] += sign
+        delta['sum'] += sign * rating
+        delta['stars'][rating] += sign
+
+    for product_id, delta in deltas.items():
+        count = F('rating_count') + delta['count']
+        total = F('rating_sum') + delta['sum']
+        updates = {
+            'rating_count': count,
+            'rating_sum': total,
+            # Evaluated against the old row, like the other assignments
+            'rating_average': Coalesce(
+                Cast(total, FloatField()) / NullIf(count, Value(0)), Value(0.0)),
+        }
+        for star, change in delta['stars'].items():
+            if change:
+                updates[f"rating_{star}"] = F(f"rating_{star}") + change
+        Product.objects.filter(pk=product_id).update(**updates)
+
+    changed = set(deltas)
+    if changed:
+        tags = ('product', 'catalog', *[f"product:{pk}" for pk in changed])
+        transaction.on_commit(lambda: bump_versions(*tags))
+    return changed
+
+
+def refresh_product_ratings(product_ids=None) -> int:
+    """
+    Recompute the aggregates of the given products (or all of them) from
+    one GROUP BY over the reviews. Returns the number of products fixed.
+    """
+    from reviews.models import Review  # Import here to avoid circular import
+    reviews = Review.objects.all()
+    products = Product.objects.all()
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        reviews = reviews.filter(order_id__product_id__in=product_ids)
+        products = products.filter(pk__in=product_ids)
+
+    stats = {
+        row['order_id__product_id']: row
+        for row in reviews.order_by().values('order_id__product_id').annotate(
+            count=Count('pk'), total=Sum('rating'),
+            **{f"star_{star}": Count('pk', filter=Q(rating=star)) for star in STARS})
+    }
+    fields = ['rating_count', 'rating_sum', 'rating_average', *[f"rating_{star}" for star in STARS]]
+    updated = []
+    for product in products.only('product_id', *fields).iterator(chunk_size=2000):
+        row = stats.get(product.pk)
+        values = [0, 0, 0.0, 0, 0, 0, 0, 0]
+        if row:
+            values = [row['count'], row['total'], row['total'] / row['count'],
+                      *[row[f"star_{star}"] for star in STARS]]
+        current = [getattr(product, field) for field in fields]
+        if values[:2] + values[3:] != current[:2] + current[3:] or abs(values[2] - current[2]) > 1e-9:
+            for field, value in zip(fields, values):
+                setattr(product, field, value)
+            updated.append(product)
+    Product.objects.bulk_update(updated, fields, batch_size=1000)
+    return len(updated)
@@ -0,0 +1,132 @@
+"""
+"Frequently bought together" recommendations from order history.
+
+Order lines are streamed in chunks that end on an order boundary. Each
+chunk becomes a sparse binary order x product matrix ``B``, and
+``B.T @ B`` adds that chunk's co-purchase counts to a running sparse
+product x product matrix. Only that matrix and one chunk are in memory,
+so the batch scales with the number of distinct product pairs rather
+than the number of order lines.
+
+Scores are the cosine similarity of the products' purchase vectors,
+``co(i, j) / sqrt(n(i) * n(j))``. The top-K neighbours of every product
+are written to ``RelatedProduct``.
+"""
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from orders.models import OrderItem
+
+from .models import Product, RelatedProduct
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = 5000
+
+
+def _order_chunks(chunk_size: int):
+    """
+    Yield ``(order_codes, product_ids)`` lists of at least ``chunk_size``
+    order lines (except the last), never splitting an order.
+    """
+    lines = OrderItem.objects.exclude(order__status='cancelled').order_by(
+        'order_id').values_list('order_id', 'product_id')
+    order_codes, product_ids = [], []
+    current_order, code = None, -1
+    for order_id, product_id in lines.iterator(chunk_size=min(chunk_size, 10000)):
+        if order_id != current_order:
+            if len(product_ids) >= chunk_size:
+                yield order_codes, product_ids
+                order_codes, product_ids, code = [], [], -1
+            current_order = order_id
+            code += 1
+        order_codes.append(code)
+        product_ids.append(product_id)
+    if product_ids:
+        yield order_codes, product_ids
+
+
+def co_purchase_matrix(chunk_size: int):
+    """
+    Return ``(product_ids, matrix)``: the ids indexing the rows/columns and
+    the sparse co-purchase counts, with per-product order counts on the
+    diagonal.
+    """
+    product_ids = list(Product.objects.values_list('product_id', flat=True).iterator(chunk_size=10000))
+    index = {pk: position for position, pk in enumerate(product_ids)}
+    size = len(product_ids)
+    matrix = sparse.csr_matrix((size, size), dtype=np.int64)
+
+    for chunk, (order_codes, line_products) in enumerate(_order_chunks(chunk_size), start=1):
+        columns = np.fromiter(
+            (index.get(pk, -1) for pk in line_products), dtype=np.int64, count=len(line_products))
+        rows = np.asarray(order_codes, dtype=np.int64)
+        # Skip products created after the id snapshot was taken
+        known = columns >= 0
+        rows, columns = rows[known], columns[known]
+        if not len(rows):
+            continue
+        # OrderItem is unique on (order, product), so every cell is 0 or 1
+        baskets = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int64), (rows, columns)),
+            shape=(int(rows[-1]) + 1, size),
+        )
+        matrix = matrix + (baskets.T @ baskets).tocsr()
+        logger.debug(f"Co-purchase chunk {chunk}: {len(rows)} lines, {matrix.nnz} pairs so far.")
+    return product_ids, matrix
+
+
+def top_neighbours(matrix, top_k: int):
+    """
+    Yield ``(row, columns, scores, counts)`` with the best ``top_k``
+    neighbours of every product that has any, best first.
+    """
+    norms = np.sqrt(matrix.diagonal().astype(np.float64))
+    matrix = matrix.copy()
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    # A product is not its own neighbour
+    matrix.data[rows == matrix.indices] = 0
+    matrix.eliminate_zeros()
+
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    scores = matrix.data / (norms[rows] * norms[matrix.indices])
+
+    for row in np.flatnonzero(np.diff(matrix.indptr)):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        row_scores = scores[start:end]
+        row_counts = matrix.data[start:end]
+        best = np.arange(end - start)
+        if len(best) > top_k:
+            best = np.argpartition(-row_scores, top_k)[:top_k]
+        # Best score first; more co-purchases break ties
+        best = best[np.lexsort((-row_counts[best], -row_scores[best]))]
+        yield row, matrix.indices[start:end][best], row_scores[best], row_counts[best]
+
+
+def build_related_products(top_k=None, chunk_size=None) -> int:
+    """Recompute the whole RelatedProduct table; return the rows written."""
+    top_k = top_k or settings.RELATED_PRODUCTS_TOP_K
+    chunk_size = chunk_size or settings.RELATED_PRODUCTS_CHUNK_SIZE
+    product_ids, matrix = co_purchase_matrix(chunk_size)
+
+    written = 0
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        batch = []
+        for row, columns, scores, counts in top_neighbours(matrix, top_k):
+            for rank, (column, score, count) in enumerate(zip(columns, scores, counts)):
+                batch.append(RelatedProduct(
+                    product_id=product_ids[row], related_id=product_ids[column],
+                    rank=rank, score=float(score), co_purchases=int(count)))
+            if len(batch) >= WRITE_BATCH_SIZE:
+                RelatedProduct.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        RelatedProduct.objects.bulk_create(batch)
+        written += len(batch)
+    logger.info(f"Built {written} related product rows for {len(product_ids)} products.")
+    return written
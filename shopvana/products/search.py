@@ -0,0 +1,121 @@
+"""
+Full-text search for the product catalog.
+
+On PostgreSQL every product carries a ``search_vector`` (name weighted
+above description) backed by a GIN index, queries use the websearch syntax
+(``"exact phrase"``, ``-exclude``, ``or``) and results are ranked with
+``ts_rank``. Other database backends fall back to ``icontains`` matching
+with the same query syntax so the test suite keeps working on SQLite.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, F, FloatField, IntegerField, Q, QuerySet, Value, When
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = 'english'
+
+# Matches `"quoted phrases"` and bare words, each optionally prefixed by `-`
+_TOKEN_RE = re.compile(r'(-?)"([^"]*)"|(-?)(\S+)')
+
+
+def is_postgres() -> bool:
+    """Return True when the default database supports full-text search."""
+    return connection.vendor == 'postgresql'
+
+
+def build_search_vector() -> SearchVector:
+    """Return the weighted vector expression stored on each product."""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(product_ids=None) -> int:
+    """
+    Recompute the stored search vector for the given products
+    (ids or a queryset, or the whole catalog) with a single UPDATE statement.
+    """
+    if not is_postgres():
+        return 0
+    from .models import Product  # Import here to avoid circular import
+    queryset = Product.objects.all()
+    if product_ids is not None:
+        if not isinstance(product_ids, QuerySet):
+            product_ids = list(product_ids)
+        queryset = queryset.filter(product_id__in=product_ids)
+    return queryset.update(search_vector=build_search_vector())
+
+
+def parse_query(query: str) -> list:
+    """
+    Parse a websearch-style query into OR-ed clauses.
+
+    Each clause is an ``(include, exclude)`` tuple of term lists, e.g.
+    ``'red "running shoe" -kids or sandal'`` becomes
+    ``[(['red', 'running shoe'], ['kids']), (['sandal'], [])]``.
+    """
+    clauses = []
+    include, exclude = [], []
+    for match in _TOKEN_RE.finditer(query):
+        negated = bool(match.group(1) or match.group(3))
+        term = (match.group(2) if match.group(2) is not None else match.group(4)).strip()
+        if not term:
+            continue
+        if not negated and term.lower() == 'or':
+            if include or exclude:
+                clauses.append((include, exclude))
+            include, exclude = [], []
+            continue
+        (exclude if negated else include).append(term)
+    if include or exclude:
+        clauses.append((include, exclude))
+    return clauses
+
+
+def _fallback_search(queryset: QuerySet, query: str) -> QuerySet:
+    """Match and rank with ``icontains`` on backends without full-text search."""
+    clauses = parse_query(query)
+    if not clauses:
+        return queryset
+
+    condition = Q()
+    terms = []
+    for include, exclude in clauses:
+        clause = Q()
+        for term in include:
+            clause &= Q(name__icontains=term) | Q(description__icontains=term)
+        for term in exclude:
+            clause &= ~Q(name__icontains=term) & ~Q(description__icontains=term)
+        condition |= clause
+        terms.extend(include)
+
+    # Name hits weigh twice as much as description hits, like the A/B weights
+    rank = Value(0)
+    for term in terms:
+        rank = rank + Case(
+            When(name__icontains=term, then=Value(2)),
+            When(description__icontains=term, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    return queryset.filter(condition).annotate(
+        search_rank=rank).order_by('-search_rank', 'name')
+
+
+def search_products(queryset: QuerySet, query: str) -> QuerySet:
+    """Filter ``queryset`` to products matching ``query``, best matches first."""
+    query = (query or '').strip()
+    if not query:
+        return queryset
+    if not is_postgres():
+        return _fallback_search(queryset, query)
+
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    # ts_rank returns a real; as a double it survives the JSON round-trip
+    # of a pagination cursor exactly, so ties on the rank compare equal
+    return queryset.filter(search_vector=search_query).annotate(
+        search_rank=Cast(SearchRank(F('search_vector'), search_query), FloatField())
+    ).order_by('-search_rank', 'name')
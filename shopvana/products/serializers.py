@@ -1,18 +1,26 @@
 from .models import Category, Product
+from django.core.files.storage import default_storage
 from rest_framework import serializers
+from utils.serializers import DynamicFieldsMixin
 
 
 class CategorySerializer(serializers.ModelSerializer):
     """Serializer for Category model."""
 
+    parent_category = serializers.PrimaryKeyRelatedField(
+        queryset=Category.objects.all(),
+        required=False,
+        allow_null=True,
+        help_text="Parent category ID (null for top-level categories)"
+    )
+
     class Meta:
         model = Category
-        fields = '__all__'
-        read_only_fields = ['category_id', 'created_at', 'updated_at']
-        extra_kwargs = {
-            'parent_category': {'required': False, 'allow_null': True}
-        }
-        depth = 1
+        exclude = ['path']
+        read_only_fields = [
+            'category_id', 'depth', 'active_product_count',
+            'min_price', 'max_price', 'created_at', 'updated_at'
+        ]
         validators = [
             serializers.UniqueTogetherValidator(
                 queryset=Category.objects.all(),
@@ -26,6 +34,9 @@ class CategorySerializer(serializers.ModelSerializer):
             if value and value == self.instance:
                 raise serializers.ValidationError(
                     "A category cannot be its own parent.")
+            if value and self.instance and value.is_descendant_of(self.instance):
+                raise serializers.ValidationError(
+                    "A category cannot be moved under one of its subcategories.")
             return value
 
     def validate_description(self, value: str) -> str:
@@ -44,24 +55,43 @@ class CategorySerializer(serializers.ModelSerializer):
 
     def validate(self, attrs: dict) -> dict:
             """Ensure that the name is unique."""
-            if Category.objects.filter(name=attrs['name']).exists():
+            others = Category.objects.filter(name=attrs.get('name'))
+            if self.instance is not None:
+                others = others.exclude(pk=self.instance.pk)
+            if 'name' in attrs and others.exists():
                 raise serializers.ValidationError(
                     "Category with this name already exists.")
             return attrs
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Product model."""
 
+    expandable_fields = {'category': CategorySerializer}
+    default_expand = ('category',)
+    field_dependencies = {
+        'image_variants': ['image_variants'],
+        'rating_histogram': [f"rating_{star}" for star in range(1, 6)],
+    }
+
     category = serializers.SlugRelatedField(
         slug_field='name',
         queryset=Category.objects.all(),
         help_text="Category to which the product belongs"
     )
+    image_variants = serializers.SerializerMethodField(
+        help_text="URLs of the resized WebP images (small/medium/large)"
+    )
+    rating_histogram = serializers.SerializerMethodField(
+        help_text="Number of reviews per star rating, from 1 to 5"
+    )
 
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = [
+            'search_vector', 'image_hash', 'reserved_quantity', 'stock_shards',
+            'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+        ]
         read_only_fields = ['product_id', 'created_at', 'updated_at']
         extra_kwargs = {
             'category': {'required': True}
@@ -110,8 +140,15 @@ class ProductSerializer(serializers.ModelSerializer):
                 "Product with this name already exists.")
         return attrs
 
-    def to_representation(self, instance: Product) -> dict:
-        """Customize the representation of the product."""
-        represent = super().to_representation(instance)
-        represent['category'] = CategorySerializer(instance.category).data
-        return represent
+    def get_image_variants(self, instance: Product) -> dict:
+        """Return absolute URLs of the generated image variants."""
+        request = self.context.get('request')
+        urls = {}
+        for name, path in (instance.image_variants or {}).items():
+            url = default_storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
+
+    def get_rating_histogram(self, instance: Product) -> dict:
+        """Return the review counts keyed by star rating."""
+        return {str(star): getattr(instance, f"rating_{star}") for star in range(1, 6)}
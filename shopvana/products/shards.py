@@ -0,0 +1,165 @@
+"""
+Flash-sale mode: a hot product's stock split across ``StockShard`` rows.
+
+During a promotion every checkout of the same product queues on that
+product's row lock. With ``Product.stock_shards = N`` its units live in
+N shard rows instead, and a checkout takes them with a conditional
+UPDATE on a random shard that has enough, so up to N checkouts of the
+product proceed at once. Orders larger than any one shard drain several
+shards in index order, so two such orders cannot deadlock.
+
+``Product.stock_quantity`` then trails the shard total:
+``reconcile_product_stock`` writes it back, with ``is_active`` and the
+denormalized catalog data, a few seconds after a sale and every minute
+from beat. Cart holds are not taken on sharded products; the stock goes
+to whoever checks out first. Bulk updates and imports refuse to set
+the stock of a sharded product; end the sale (``manage.py flash_sale
+<id> --off``) first.
+"""
+import logging
+import random
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Product, StockShard
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_DELAY = 5  # seconds between a sale and the stock_quantity write-back
+
+
+def sharded_products(product_ids) -> dict:
+    """Return ``{product_id: shard count}`` for those in flash-sale mode."""
+    return dict(Product.objects.filter(
+        pk__in=list(product_ids), stock_shards__gt=0).values_list('pk', 'stock_shards'))
+
+
+def shard_total(product_id) -> int:
+    """Units left across a product's shards."""
+    return StockShard.objects.filter(product_id=product_id).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def take_from_shards(product_id, quantity: int) -> int:
+    """
+    Take ``quantity`` units from a product's shards; returns the units
+    taken. Fewer than asked means the shards ran dry, some of them
+    already decremented, so the caller must roll its transaction back.
+    """
+    shards = list(StockShard.objects.filter(
+        product_id=product_id, quantity__gt=0).order_by('index').values_list('pk', 'quantity'))
+    candidates = [pk for pk, units in shards if units >= quantity]
+    if candidates:
+        pk = random.choice(candidates)
+        if StockShard.objects.filter(pk=pk, quantity__gte=quantity).update(quantity=F('quantity') - quantity):
+            return quantity
+
+    taken = 0
+    for pk, _ in shards:
+        units = StockShard.objects.select_for_update().filter(pk=pk).values_list('quantity', flat=True).first()
+        take = min(units or 0, quantity - taken)
+        if take and StockShard.objects.filter(pk=pk, quantity__gte=take).update(quantity=F('quantity') - take):
+            taken += take
+        if taken == quantity:
+            break
+    return taken
+
+
+def return_to_shards(product_id, quantity: int, shards: int) -> bool:
+    """Put ``quantity`` units back into a random one of ``shards`` shards."""
+    return bool(StockShard.objects.filter(
+        product_id=product_id, index=random.randrange(shards)
+    ).update(quantity=F('quantity') + quantity))
+
+
+def schedule_reconcile(product_ids) -> None:
+    """
+    Write the shard totals back to ``stock_quantity`` shortly after the
+    current transaction commits, at most once per product and delay.
+    """
+    from .tasks import reconcile_stock_shards  # Import here to avoid circular import
+    product_ids = [str(product_id) for product_id in product_ids]
+
+    def enqueue():
+        for product_id in product_ids:
+            if cache.add(f"stock-shards:reconcile:{product_id}", 1, timeout=RECONCILE_DELAY):
+                reconcile_stock_shards.apply_async((product_id,), countdown=RECONCILE_DELAY)
+
+    transaction.on_commit(enqueue)
+
+
+def _set_stock(row, new_stock: int) -> bool:
+    """Write ``new_stock`` to a locked ``(id, category, price, stock, active)`` row."""
+    from .inventory import sync_catalog  # Import here to avoid circular import
+    product_id, category_id, price, old_stock, old_active = row
+    if new_stock == old_stock:
+        return False
+    new_active = False if new_stock == 0 else (True if old_stock == 0 else old_active)
+    Product.objects.filter(pk=product_id).update(
+        stock_quantity=new_stock, is_active=new_active, updated_at=timezone.now())
+    sync_catalog([(product_id, category_id, price, old_stock, old_active, new_stock, new_active)])
+    return True
+
+
+def _lock_product(product_id):
+    return Product.objects.select_for_update().filter(pk=product_id).values_list(
+        'product_id', 'category_id', 'price', 'stock_quantity', 'is_active', 'stock_shards').first()
+
+
+def reconcile_product_stock(product_id) -> bool:
+    """Copy a sharded product's shard total to ``stock_quantity``; True if it moved."""
+    with transaction.atomic():
+        row = _lock_product(product_id)
+        if row is None or not row[5]:
+            return False
+        return _set_stock(row[:5], shard_total(product_id))
+
+
+def enable_flash_sale(product_id, shards: int) -> int:
+    """
+    Split a product's stock evenly across ``shards`` shards (re-splitting
+    if it is already sharded) and release its cart holds. Returns the
+    units sharded.
+    """
+    from cart.models import CartItem  # Import here to avoid circular import
+    if shards < 1:
+        raise ValueError("A flash sale needs at least one shard.")
+    with transaction.atomic():
+        row = _lock_product(product_id)
+        if row is None:
+            raise Product.DoesNotExist(product_id)
+        if row[5]:
+            total = sum(StockShard.objects.select_for_update().filter(
+                product_id=product_id).values_list('quantity', flat=True))
+            StockShard.objects.filter(product_id=product_id).delete()
+        else:
+            total = row[3]
+            CartItem.objects.filter(product_id=product_id, reserved_quantity__gt=0).update(
+                reserved_quantity=0, reserved_until=None)
+        base, extra = divmod(total, shards)
+        StockShard.objects.bulk_create([
+            StockShard(product_id=product_id, index=index, quantity=base + (index < extra))
+            for index in range(shards)
+        ])
+        Product.objects.filter(pk=product_id).update(stock_shards=shards, reserved_quantity=0)
+        _set_stock(row[:5], total)
+    logger.info(f"Flash sale on product {product_id}: {total} units in {shards} shards.")
+    return total
+
+
+def disable_flash_sale(product_id) -> int:
+    """Fold a product's shards back into ``stock_quantity``; returns the units."""
+    with transaction.atomic():
+        row = _lock_product(product_id)
+        if row is None or not row[5]:
+            return row[3] if row else 0
+        # Locking the shards waits for in-flight checkouts and reads their result
+        total = sum(StockShard.objects.select_for_update().filter(
+            product_id=product_id).values_list('quantity', flat=True))
+        StockShard.objects.filter(product_id=product_id).delete()
+        Product.objects.filter(pk=product_id).update(stock_shards=0)
+        _set_stock(row[:5], total)
+    logger.info(f"Flash sale on product {product_id} ended with {total} units left.")
+    return total
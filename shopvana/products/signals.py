@@ -1,18 +1,179 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from orders.models import OrderItem
-from products.models import Product
+from products.counters import apply_product_change
+from products.facets import apply_delta, facet_key
+from products.models import Category, Product
+from products.ratings import apply_rating_change
+from products.search import update_search_vector
+from products.suggest import suggest_index
+from products.tasks import generate_product_images
+from products.tree import TREE_VERSION
+from reviews.models import Review
+from utils.cache_utils import bump_versions
 
 
-@receiver(post_save, sender=OrderItem)
-def update_product_stock(sender, instance, created, **kwargs):
-    """Signal to update product stock when an OrderItem is saved."""
-    if created:
-        # Decrease stock when an order item is created
-        instance.product.stock_quantity -= instance.quantity
-        instance.product.save()
+@receiver(post_save, sender=Product)
+def refresh_search_vector(sender, instance, created, **kwargs):
+    """Signal to keep the full-text search vector in sync with the product text."""
+    if created or instance.has_changed('name', 'description'):
+        update_search_vector([instance.pk])
+
+
+def on_commit_if_built(change, *args):
+    """Apply an autocomplete index change once committed, so a rollback never reaches it."""
+    def apply():
+        if suggest_index.is_built:
+            change(*args)
+    transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=Product)
+def update_product_suggestion(sender, instance, created, **kwargs):
+    """Signal to keep the autocomplete index in sync with product names."""
+    if not (created or instance.has_changed('name', 'is_active')):
+        return
+    if instance.is_active:
+        on_commit_if_built(suggest_index.add, 'product', instance.pk, instance.name)
     else:
-        # If the order item is updated, adjust stock accordingly
-        original_quantity = instance.__class__.objects.get(pk=instance.pk).quantity
-        instance.product.stock_quantity += original_quantity - instance.quantity
-        instance.product.save()
+        on_commit_if_built(suggest_index.remove, 'product', instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_suggestion(sender, instance, **kwargs):
+    """Signal to drop deleted products from the autocomplete index."""
+    on_commit_if_built(suggest_index.remove, 'product', instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestion(sender, instance, **kwargs):
+    """Signal to keep the autocomplete index in sync with category names."""
+    on_commit_if_built(suggest_index.add, 'category', instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestion(sender, instance, **kwargs):
+    """Signal to drop deleted categories from the autocomplete index."""
+    on_commit_if_built(suggest_index.remove, 'category', instance.pk)
+
+
+FACET_FIELDS = ('category_id', 'price', 'stock_quantity', 'is_active')
+COUNTER_FIELDS = ('category_id', 'is_active', 'price')
+
+
+def stored_values(instance, fields):
+    """Return the stored values of ``fields`` for a product about to be saved."""
+    if instance._state.adding:
+        return None
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if all(field in loaded for field in fields):
+        return tuple(loaded[field] for field in fields)
+    return Product.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(pre_save, sender=Product)
+def remember_facet_key(sender, instance, **kwargs):
+    """Signal to record which facet cell the product was counted in before saving."""
+    values = stored_values(instance, FACET_FIELDS)
+    instance._facet_key_before = facet_key(*values) if values is not None else None
+
+
+@receiver(pre_save, sender=Product)
+def remember_counter_state(sender, instance, **kwargs):
+    """Signal to record how the product counted towards its category before saving."""
+    instance._counter_state_before = stored_values(instance, COUNTER_FIELDS)
+
+
+@receiver(post_save, sender=Product)
+def update_category_counters(sender, instance, **kwargs):
+    """Signal to keep the category product count and price range current."""
+    after = tuple(getattr(instance, field) for field in COUNTER_FIELDS)
+    changed = apply_product_change(getattr(instance, '_counter_state_before', None), after)
+    bump_counter_versions(changed)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_category_counters(sender, instance, **kwargs):
+    """Signal to stop counting deleted products in their category."""
+    before = tuple(getattr(instance, field) for field in COUNTER_FIELDS)
+    bump_counter_versions(apply_product_change(before, None))
+
+
+def bump_counter_versions(category_ids):
+    """Invalidate category ETags and cached responses after counters moved."""
+    if not category_ids:
+        return
+    tags = ('category', 'catalog', *[f"category:{pk}" for pk in category_ids])
+    transaction.on_commit(lambda: bump_versions(*tags))
+
+
+@receiver(post_save, sender=Product)
+def update_facet_counts(sender, instance, created, **kwargs):
+    """Signal to move the product between facet cells when it changes."""
+    before = getattr(instance, '_facet_key_before', None)
+    after = facet_key(instance.category_id, instance.price, instance.stock_quantity, instance.is_active)
+    if before == after:
+        return
+    apply_delta(before, -1)
+    apply_delta(after, 1)
+
+
+@receiver(post_delete, sender=Product)
+def remove_facet_count(sender, instance, **kwargs):
+    """Signal to stop counting deleted products."""
+    apply_delta(facet_key(instance.category_id, instance.price, instance.stock_quantity, instance.is_active), -1)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_product_version(sender, instance, **kwargs):
+    """Signal to invalidate product ETags and cached responses once committed."""
+    tags = ('product', f"product:{instance.pk}", 'catalog')
+    transaction.on_commit(lambda: bump_versions(*tags))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category_version(sender, instance, **kwargs):
+    """Signal to invalidate category ETags and cached responses once committed."""
+    tags = ('category', TREE_VERSION, f"category:{instance.pk}", 'catalog')
+    transaction.on_commit(lambda: bump_versions(*tags))
+
+
+@receiver(post_save, sender=Product)
+def queue_product_images(sender, instance, created, **kwargs):
+    """Signal to generate image variants in the background once the upload is committed."""
+    if not (created or instance.has_changed('image')):
+        return
+    if not instance.image and not instance.image_variants:
+        return
+    product_id = str(instance.pk)
+    transaction.on_commit(lambda: generate_product_images.delay(product_id))
+
+
+def reviewed_product_id(review):
+    """Return the id of the product a review is about, or None."""
+    return OrderItem.objects.filter(pk=review.order_id_id).values_list('product_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Review)
+def remember_rating_state(sender, instance, **kwargs):
+    """Signal to record what the review counted towards before saving."""
+    instance._rating_state_before = None
+    if not instance._state.adding:
+        instance._rating_state_before = Review.objects.filter(pk=instance.pk).values_list(
+            'order_id__product_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def update_product_ratings(sender, instance, **kwargs):
+    """Signal to keep the product rating count, sum, average and histogram current."""
+    after = (reviewed_product_id(instance), instance.rating)
+    apply_rating_change(getattr(instance, '_rating_state_before', None), after)
+
+
+@receiver(post_delete, sender=Review)
+def remove_product_rating(sender, instance, **kwargs):
+    """Signal to stop counting deleted reviews."""
+    apply_rating_change((reviewed_product_id(instance), instance.rating), None)
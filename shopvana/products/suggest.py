@@ -0,0 +1,292 @@
+"""
+In-process autocomplete index over product and category names.
+
+Names are kept in one sorted list so prefix lookups are a binary search
+followed by a short scan. Typo tolerance comes from a trigram index over
+the (much smaller) word vocabulary: when a prefix yields too few hits,
+each query word is replaced by its most similar known word and the
+lookup is retried. The index is built on the first lookup of a process
+and kept up to date from the Product/Category signals and the inventory
+engine. Since every worker process holds its own copy, it is reloaded
+once it is older than ``SUGGEST_INDEX_MAX_AGE`` seconds (or after a bulk
+change) to pick up changes made elsewhere; the reload runs in a
+background thread and lookups keep using the old copy until it is done.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+# Separates the normalized name from the entry key inside the sorted list.
+# It sorts below every printable character, so "abc<SEP>..." < "abcd".
+_SEP = '\x1f'
+_WORD_RE = re.compile(r'\w+')
+
+logger = logging.getLogger(__name__)
+
+# Categories are listed ahead of products with equally good matches
+KIND_PRIORITY = {'category': 0, 'product': 1}
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse whitespace so lookups are case-insensitive."""
+    return ' '.join(_WORD_RE.findall((text or '').lower()))
+
+
+def trigrams(word: str) -> set:
+    """Return the pg_trgm style trigrams of a single word."""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: set, b: set) -> float:
+    """Trigram similarity (Jaccard index) between two trigram sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _IndexData:
+    """One generation of the index: the sorted names and the word vocabulary."""
+
+    def __init__(self, entries=()):
+        self.sorted = []                    # "<normalized><SEP><key>"
+        self.entries = {}                   # key -> (normalized, display, kind, id)
+        self.word_counts = defaultdict(int)
+        self.word_trigrams = defaultdict(set)  # trigram -> words
+        for kind, pk, name in entries:
+            key = f'{kind}:{pk}'
+            normalized = normalize(name)
+            if not normalized:
+                continue
+            self.entries[key] = (normalized, name, kind, str(pk))
+            self.sorted.append(f'{normalized}{_SEP}{key}')
+            self._add_words(normalized)
+        self.sorted.sort()
+
+    def add(self, kind: str, pk, name: str) -> None:
+        self.remove(kind, pk)
+        normalized = normalize(name)
+        if not normalized:
+            return
+        key = f'{kind}:{pk}'
+        self.entries[key] = (normalized, name, kind, str(pk))
+        bisect.insort(self.sorted, f'{normalized}{_SEP}{key}')
+        self._add_words(normalized)
+
+    def remove(self, kind: str, pk) -> None:
+        key = f'{kind}:{pk}'
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        row = f'{entry[0]}{_SEP}{key}'
+        position = bisect.bisect_left(self.sorted, row)
+        if position < len(self.sorted) and self.sorted[position] == row:
+            del self.sorted[position]
+        self._remove_words(entry[0])
+
+    def _add_words(self, normalized: str) -> None:
+        for word in normalized.split(' '):
+            self.word_counts[word] += 1
+            if self.word_counts[word] == 1:
+                for gram in trigrams(word):
+                    self.word_trigrams[gram].add(word)
+
+    def _remove_words(self, normalized: str) -> None:
+        for word in normalized.split(' '):
+            self.word_counts[word] -= 1
+            if self.word_counts[word] <= 0:
+                del self.word_counts[word]
+                for gram in trigrams(word):
+                    words = self.word_trigrams.get(gram)
+                    if words is not None:
+                        words.discard(word)
+                        if not words:
+                            del self.word_trigrams[gram]
+
+
+class SuggestIndex:
+    """
+    Sorted-array prefix index with a trigram vocabulary for typos.
+
+    ``rebuild_async`` loads a fresh generation in a background thread
+    while lookups keep reading the current one; single-entry changes
+    made meanwhile are replayed onto the new generation, which is then
+    swapped in with one assignment.
+    """
+
+    min_similarity = 0.3
+    scan_limit = 200
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data = _IndexData()
+        self._changes = None    # entry changes made while a rebuild runs
+        self.built_at = None
+        self.stale = False
+
+    def clear(self) -> None:
+        """Drop every entry; the next ``get_suggest_index`` builds it again."""
+        with self._lock:
+            self._data = _IndexData()
+            self.built_at = None
+
+    def invalidate(self) -> None:
+        """Keep serving the current entries, but reload them in the background soon."""
+        self.stale = True
+
+    @property
+    def is_built(self) -> bool:
+        return self.built_at is not None
+
+    def __len__(self) -> int:
+        return len(self._data.entries)
+
+    def build(self, entries) -> None:
+        """Replace the index contents with ``(kind, id, name)`` entries."""
+        data = _IndexData(entries)
+        with self._lock:
+            self._data = data
+            self.built_at = time.monotonic()
+            self.stale = False
+
+    def rebuild_async(self, load_entries) -> bool:
+        """
+        Rebuild from ``load_entries()`` in a background thread unless one
+        is already running. Returns whether a rebuild was started.
+        """
+        with self._lock:
+            if self._changes is not None:
+                return False
+            self._changes = []
+            self.stale = False
+        threading.Thread(target=self._rebuild, args=(load_entries,), daemon=True).start()
+        return True
+
+    def _rebuild(self, load_entries) -> None:
+        try:
+            data = _IndexData(load_entries())
+        except Exception:
+            logger.exception("Rebuilding the suggest index failed; keeping the current one.")
+            with self._lock:
+                self._changes = None
+                self.stale = True
+            return
+        finally:
+            connection.close()
+        with self._lock:
+            for method, args in self._changes:
+                getattr(data, method)(*args)
+            self._data = data
+            self._changes = None
+            self.built_at = time.monotonic()
+
+    def add(self, kind: str, pk, name: str) -> None:
+        """Insert or rename a single entry."""
+        with self._lock:
+            self._data.add(kind, pk, name)
+            if self._changes is not None:
+                self._changes.append(('add', (kind, pk, name)))
+
+    def remove(self, kind: str, pk) -> None:
+        """Drop a single entry if present."""
+        with self._lock:
+            self._data.remove(kind, pk)
+            if self._changes is not None:
+                self._changes.append(('remove', (kind, pk)))
+
+    def _prefix_matches(self, data, prefix: str) -> list:
+        """Return up to ``scan_limit`` entries whose name starts with ``prefix``."""
+        matches = []
+        position = bisect.bisect_left(data.sorted, prefix)
+        while position < len(data.sorted) and len(matches) < self.scan_limit:
+            row = data.sorted[position]
+            if not row.startswith(prefix):
+                break
+            matches.append(data.entries[row.split(_SEP, 1)[1]])
+            position += 1
+        return matches
+
+    def _correct_word(self, data, word: str, is_last: bool) -> str:
+        """Return the known word most similar to ``word`` (or ``word`` itself)."""
+        if word in data.word_counts:
+            return word
+        grams = trigrams(word)
+        # Count shared trigrams per known word straight from the postings,
+        # which avoids building a trigram set for every candidate
+        shared = Counter()
+        for gram in grams:
+            shared.update(data.word_trigrams.get(gram, ()))
+        if is_last and any(candidate.startswith(word) for candidate in shared):
+            # Still being typed and already a valid prefix
+            return word
+        best, best_score = word, self.min_similarity
+        for candidate, overlap in shared.items():
+            # A word of n characters has at most n + 1 distinct trigrams
+            score = overlap / (len(grams) + len(candidate) + 1 - overlap)
+            if score > best_score:
+                best, best_score = candidate, score
+        return best
+
+    def suggest(self, query: str, limit: int = 10) -> list:
+        """Return up to ``limit`` completions for ``query``."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        with self._lock:
+            data = self._data
+            matches = self._prefix_matches(data, prefix)
+            if len(matches) < limit:
+                words = prefix.split(' ')
+                corrected = ' '.join(
+                    self._correct_word(data, word, index == len(words) - 1)
+                    for index, word in enumerate(words)
+                )
+                if corrected != prefix:
+                    seen = {(entry[2], entry[3]) for entry in matches}
+                    matches += [
+                        entry for entry in self._prefix_matches(data, corrected)
+                        if (entry[2], entry[3]) not in seen
+                    ]
+
+        matches.sort(key=lambda entry: (KIND_PRIORITY.get(entry[2], 9), len(entry[0]), entry[0]))
+        return [
+            {'text': display, 'type': kind, 'id': pk}
+            for _, display, kind, pk in matches[:limit]
+        ]
+
+
+suggest_index = SuggestIndex()
+_build_lock = threading.Lock()
+
+
+def _catalog_entries():
+    """Stream ``(kind, id, name)`` tuples for every suggestible name."""
+    from .models import Category, Product  # Import here to avoid circular import
+    for pk, name in Category.objects.values_list('category_id', 'name').iterator(chunk_size=5000):
+        yield 'category', pk, name
+    products = Product.objects.filter(is_active=True).values_list('product_id', 'name')
+    for pk, name in products.iterator(chunk_size=5000):
+        yield 'product', pk, name
+
+
+def get_suggest_index() -> SuggestIndex:
+    """
+    Return the process-wide index. Only the first lookup of a process
+    waits for it to be built; once it is stale or older than
+    ``SUGGEST_INDEX_MAX_AGE`` it is rebuilt in the background.
+    """
+    if not suggest_index.is_built:
+        with _build_lock:
+            if not suggest_index.is_built:
+                suggest_index.build(_catalog_entries())
+        return suggest_index
+    max_age = getattr(settings, 'SUGGEST_INDEX_MAX_AGE', 300)
+    if suggest_index.stale or time.monotonic() - suggest_index.built_at > max_age:
+        suggest_index.rebuild_async(_catalog_entries)
+    return suggest_index
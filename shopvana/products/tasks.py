@@ -0,0 +1,73 @@
+from celery import shared_task
+from django.db import transaction
+from PIL import Image
+from .images import file_digest, generate_variants
+from .models import Product
+from utils.cache_utils import bump_versions
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_product_images(product_id: str) -> None:
+    """
+    Generate the WebP variants of a product's current image.
+    Skips the work when the image bytes are the ones already processed.
+    """
+    product = Product.objects.filter(pk=product_id).only(
+        'product_id', 'image', 'image_hash', 'image_variants').first()
+    if product is None:
+        return
+
+    image_name = product.image.name
+    if not image_name:
+        digest, variants = '', {}
+    else:
+        try:
+            digest = file_digest(product.image)
+            if digest == product.image_hash and product.image_variants:
+                logger.info(f"Image of product {product_id} is unchanged; skipping.")
+                return
+            variants = generate_variants(product.image, digest)
+        except (OSError, ValueError, Image.DecompressionBombError) as exc:
+            # A bad upload will not get better on retry
+            logger.error(f"Could not process image of product {product_id}: {exc}")
+            return
+
+    # Only record the result if the image was not replaced meanwhile;
+    # update() skips the Product signals, so invalidate caches here
+    with transaction.atomic():
+        updated = Product.objects.filter(pk=product_id, image=image_name).update(
+            image_hash=digest, image_variants=variants)
+        if updated:
+            tags = ('product', f"product:{product_id}", 'catalog')
+            transaction.on_commit(lambda: bump_versions(*tags))
+
+
+@shared_task
+def build_related_products() -> int:
+    """Nightly rebuild of the "frequently bought together" table."""
+    from .recommendations import build_related_products as build  # Keeps numpy/scipy out of web workers
+    return build()
+
+
+@shared_task
+def prune_sales_counters() -> int:
+    """Daily removal of sales counter buckets older than every window."""
+    from .trending import prune_counters
+    return prune_counters()
+
+
+@shared_task
+def reconcile_stock_shards(product_id: str = None) -> int:
+    """
+    Write the shard totals of one flash-sale product (or, from beat, all
+    of them) back to ``stock_quantity``.
+    """
+    from .shards import reconcile_product_stock
+    if product_id:
+        return int(reconcile_product_stock(product_id))
+    product_ids = Product.objects.filter(stock_shards__gt=0).values_list('pk', flat=True)
+    return sum(reconcile_product_stock(pk) for pk in product_ids)
@@ -1,3 +1,1021 @@
+import base64
+import inspect
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, models, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from orders.models import Order, OrderItem
+from orders.services import cancel_orders
+from utils.cache_utils import (
+    LOCK_KEY_PREFIX, bump_versions, get_cache_stats, get_or_set_cache, reset_cache_stats,
+)
+
+from .bulk import bulk_update_products
+from .counters import refresh_category_counters
+from .facets import facet_counts, rebuild_facets
+from .feeds import feed_queryset
+from .importers import import_products
+from .inventory import InsufficientStock, return_stock, take_stock
+from .models import Category, Product, StockShard
+from .recommendations import _order_chunks, build_related_products, co_purchase_matrix, top_neighbours
+from .search import parse_query
+from .shards import disable_flash_sale, enable_flash_sale, reconcile_product_stock
+from .suggest import SuggestIndex, get_suggest_index, suggest_index
+from .tasks import generate_product_images
+from .trending import rebuild_counters, record_sales, top_products
+
+
+class ProductListQueryCountTests(TestCase):
+    """Listing products costs the same number of queries for any page size."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        categories = [Category.objects.create(name=f"Category {index}") for index in range(5)]
+        for index in range(30):
+            Product.objects.create(
+                name=f"Product {index}",
+                price=Decimal('10.00'),
+                stock_quantity=5,
+                category=categories[index % len(categories)],
+            )
+
+    def list_queries(self, page_size):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(queries)
+
+    def test_query_count_is_independent_of_page_size(self):
+        self.assertEqual(self.list_queries(5), self.list_queries(30))
+
+    def test_product_list_query_count(self):
+        # COUNT(*) for the paginator plus one page query joined to categories
+        self.assertEqual(self.list_queries(30), 2)
+
+
+class ProductSearchTests(TestCase):
+    """`?q=` ranks name matches above description matches and honours the query syntax."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name="Coffee")
+        for name, description in (
+            ("Espresso Machine", "Pump driven, steams milk"),
+            ("Milk Frother", "Foams milk for espresso drinks"),
+            ("Kids Espresso Set", "Toy espresso machine"),
+            ("Pour Over Kettle", "Gooseneck kettle"),
+        ):
+            Product.objects.create(
+                name=name, description=description, price=Decimal('20.00'),
+                stock_quantity=5, category=category)
+
+    def search(self, query):
+        response = self.client.get('/api/products/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data['results']]
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search('espresso'), ["Espresso Machine", "Kids Espresso Set", "Milk Frother"])
+
+    def test_query_syntax(self):
+        self.assertEqual(
+            parse_query('red "running shoe" -kids or sandal'),
+            [(['red', 'running shoe'], ['kids']), (['sandal'], [])])
+        self.assertEqual(self.search('espresso -kids'), ["Espresso Machine", "Milk Frother"])
+        self.assertEqual(self.search('"espresso machine"'), ["Espresso Machine", "Kids Espresso Set"])
+        self.assertEqual(self.search('frother or kettle'), ["Milk Frother", "Pour Over Kettle"])
+
+
+class ProductCursorPaginationTests(TestCase):
+    """Cursor pages walk forwards and backwards across equal sort keys without gaps."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        # Same name, rank and price in every category: only the primary key breaks the ties
+        for index in range(5):
+            Product.objects.create(
+                name="Burr Grinder", price=Decimal('45.00'), stock_quantity=5,
+                category=Category.objects.create(name=f"Aisle {index}"))
+        Product.objects.create(
+            name="Grinder Brush", price=Decimal('5.00'), stock_quantity=5,
+            category=Category.objects.create(name="Cleaning"))
+
+    def walk(self, **params):
+        """Follow `next` to the end, then `previous` back; return both sequences of ids."""
+        response = self.client.get('/api/products/', {'pagination': 'cursor', 'page_size': 2, **params})
+        pages = [response.data]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).data)
+        forwards = [product['product_id'] for page in pages for product in page['results']]
+        backwards = [product['product_id'] for product in pages[-1]['results']]
+        page = pages[-1]
+        while page['previous']:
+            page = self.client.get(page['previous']).data
+            backwards = [product['product_id'] for product in page['results']] + backwards
+        return forwards, backwards
+
+    def test_ties_on_the_search_rank(self):
+        forwards, backwards = self.walk(q='grinder')
+        self.assertEqual(len(forwards), 6)
+        self.assertEqual(len(set(forwards)), 6)
+        self.assertEqual(forwards, backwards)
+
+    def test_ties_on_an_ordering_column(self):
+        forwards, backwards = self.walk(ordering='-price')
+        self.assertEqual(len(set(forwards)), 6)
+        self.assertEqual(forwards, backwards)
+        self.assertEqual(Product.objects.get(pk=forwards[-1]).name, "Grinder Brush")
+
+    def test_invalid_cursors_are_rejected(self):
+        def token(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        for cursor in ('not-a-cursor', token({'p': ['Burr Grinder']}),
+                       token({'p': [[], 'x']}), token({'p': ['Burr Grinder', 'not-a-uuid']})):
+            response = self.client.get('/api/products/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertIn('cursor', response.data)
+
+
+class ProductSparseFieldsTests(TestCase):
+    """`?fields=` and `?expand=` trim both the payload and the query."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = Category.objects.create(name="Shoes")
+        Product.objects.create(
+            name="Sandal", description="Light", price=Decimal('10.00'),
+            stock_quantity=5, category=category,
+        )
+
+    def get_first(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'][0], queries.captured_queries[-1]['sql']
+
+    def test_full_representation_by_default(self):
+        product, _ = self.get_first()
+        self.assertEqual(product['category']['name'], "Shoes")
+        self.assertIn('description', product)
+
+    def test_fields_collapse_relations_and_skip_columns(self):
+        product, sql = self.get_first(fields='name,price,category')
+        self.assertEqual(set(product), {'name', 'price', 'category'})
+        self.assertEqual(product['category'], "Shoes")
+        self.assertNotIn('description', sql)
+
+    def test_expand_relation(self):
+        product, _ = self.get_first(fields='name,category', expand='category')
+        self.assertEqual(product['category']['name'], "Shoes")
+
+
+class FlashSaleShardTests(TestCase):
+    """Sharded stock sells exactly what it holds and folds back afterwards."""
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Console", price=Decimal('300.00'), stock_quantity=10,
+            category=Category.objects.create(name="Games"))
+        enable_flash_sale(self.product.pk, 4)
+
+    def test_orders_drain_shards_and_stock_is_reconciled(self):
+        self.assertEqual(
+            sorted(StockShard.objects.filter(product=self.product).values_list('quantity', flat=True)),
+            [2, 2, 3, 3])
+        take_stock({self.product.pk: 1})
+        take_stock({self.product.pk: 6})
+        with self.assertRaises(InsufficientStock):
+            take_stock({self.product.pk: 4})
+
+        self.assertTrue(reconcile_product_stock(self.product.pk))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 3)
+
+        self.assertEqual(disable_flash_sale(self.product.pk), 3)
+        self.assertFalse(StockShard.objects.filter(product=self.product).exists())
+
+
+class BulkStockGuardTests(TestCase):
+    """Bulk stock writes leave flash-sale products and cart holds alone."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Grinders')
+        self.sharded = Product.objects.create(
+            name='Burr Grinder', price=Decimal('80.00'), stock_quantity=10, category=category)
+        enable_flash_sale(self.sharded.pk, 2)
+        self.held = Product.objects.create(
+            name='Hand Grinder', price=Decimal('25.00'), stock_quantity=10, reserved_quantity=4,
+            category=category)
+
+    def test_refused_stock_changes_are_reported_per_row(self):
+        result = bulk_update_products([
+            {'product_id': str(self.sharded.pk), 'stock_quantity': 50},
+            {'product_id': str(self.held.pk), 'stock_quantity': 3},
+            {'product_id': str(self.held.pk), 'price': '20.00'},
+        ])
+        self.assertEqual(result['updated'], 1)
+        self.assertEqual([error['index'] for error in result['errors']], [0])
+        self.held.refresh_from_db()
+        self.assertEqual((self.held.price, self.held.stock_quantity), (Decimal('20.00'), 10))
+
+        result = bulk_update_products([{'product_id': str(self.held.pk), 'stock_quantity': 3}])
+        self.assertIn('4 units held in carts', result['errors'][0]['errors']['stock_quantity'])
+        self.sharded.refresh_from_db()
+        self.assertEqual(self.sharded.stock_quantity, 10)
+
+    def test_admin_action_warns_about_refused_rows(self):
+        admin = get_user_model().objects.create_superuser(
+            username='admin', email='admin@example.com', password='secret', is_active=True)
+        self.client.force_login(admin)
+
+        response = self.client.post('/admin/products/product/', {
+            'action': 'bulk_update_price_and_stock',
+            '_selected_action': [str(self.sharded.pk), str(self.held.pk)],
+            'apply': '1',
+            'stock_quantity': '8',
+        })
+
+        self.assertEqual(response.status_code, 302)
+        messages = {str(message): message.level_tag for message in get_messages(response.wsgi_request)}
+        self.assertEqual(messages["Updated 1 products."], 'success')
+        self.assertEqual(
+            messages["Burr Grinder was not updated: "
+                     "The product is in a flash sale; end it before changing its stock."],
+            'warning')
+        self.held.refresh_from_db()
+        self.assertEqual(self.held.stock_quantity, 8)
+
+
+class ProductSaveTests(TestCase):
+    """A plain save() writes what was edited and nothing the engines maintain."""
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Moka Pot', price=Decimal('35.00'), stock_quantity=6,
+            category=Category.objects.create(name='Brewing'))
+
+    def test_stale_copy_keeps_stock_and_ratings(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        take_stock({self.product.pk: 2})
+        Product.objects.filter(pk=self.product.pk).update(rating_count=1, rating_sum=5)
+        stale.price = Decimal('30.00')
+        stale.save()
+        saved = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((saved.price, saved.stock_quantity, saved.rating_count), (Decimal('30.00'), 4, 1))
+
+        saved.stock_quantity = 9
+        saved.save()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 9)
+
+    def test_deleted_row_is_inserted_again(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        Product.objects.filter(pk=self.product.pk).delete()
+        stale.save()
+        self.assertTrue(Product.objects.filter(pk=self.product.pk).exists())
+
+    def test_plain_save_leaves_derived_columns_out_of_the_update(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.name = 'Moka Express'
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        update = next(query['sql'] for query in queries if query['sql'].startswith('UPDATE'))
+        for column in ('name', 'price'):
+            self.assertIn(f'"{column}"', update)
+        for column in ('rating_count', 'reserved_quantity', 'stock_shards', 'stock_quantity'):
+            self.assertNotIn(f'"{column}"', update)
+
+    def test_update_hook_signature(self):
+        # Product._do_update overrides this private hook of Model.save()
+        self.assertEqual(
+            list(inspect.signature(models.Model._do_update).parameters),
+            ['self', 'base_qs', 'using', 'pk_val', 'values', 'update_fields', 'forced_update'])
+
+
+class CatalogFeedTests(TestCase):
+    """Incremental feeds re-read an overlap before the watermark."""
+
+    def test_late_committed_rows_are_picked_up(self):
+        since = timezone.now()
+        late = Product.objects.create(
+            name='Cold Brew Jar', price=Decimal('18.00'), stock_quantity=3,
+            category=Category.objects.create(name='Cold Brew'))
+        # Committed after the last export, but stamped just before its watermark
+        Product.objects.filter(pk=late.pk).update(updated_at=since - timezone.timedelta(seconds=30))
+        rows, watermark = feed_queryset(since=since)
+        self.assertEqual([row['product_id'] for row in rows], [late.pk])
+        self.assertEqual(watermark, since)
+
+
+class FacetCountTests(TestCase):
+    """Facet counts cover the active products only, like the listing."""
+
+    def test_inactive_products_are_not_counted(self):
+        category = Category.objects.create(name='Filters')
+        listed = Product.objects.create(
+            name='Paper Filters', price=Decimal('4.00'), stock_quantity=50, category=category)
+        hidden = Product.objects.create(
+            name='Cloth Filter', price=Decimal('9.00'), stock_quantity=5, category=category, is_active=False)
+        expected = {'category': [{'value': 'Filters', 'count': 1}]}
+        self.assertEqual(facet_counts(['category']), expected)
+
+        hidden.is_active = True
+        hidden.save()
+        take_stock({listed.pk: 50})
+        self.assertEqual(facet_counts(['category']), expected)
+        rebuild_facets()
+        self.assertEqual(facet_counts(['category']), expected)
+
+    def test_buckets_match_the_listing(self):
+        cache.clear()
+        client = APIClient()
+        category = Category.objects.create(name='Scales')
+        sold_out = Product.objects.create(
+            name='Drip Scale', price=Decimal('30.00'), stock_quantity=1, category=category)
+        Product.objects.create(name='Pocket Scale', price=Decimal('15.00'), stock_quantity=0, category=category)
+        Product.objects.create(name='Bench Scale', price=Decimal('60.00'), stock_quantity=3, category=category)
+        take_stock({sold_out.pk: 1})
+
+        for params in ({}, {'in_stock': 'false'}, {'in_stock': 'true'}, {'q': 'scale', 'in_stock': 'false'}):
+            cache.clear()
+            response = client.get('/api/products/', {**params, 'facets': 'in_stock,category'})
+            self.assertEqual(response.status_code, 200)
+            facets = response.data['facets']
+            stock_counts = {bucket['value']: bucket['count'] for bucket in facets['in_stock']}
+            selected = {'true': [True], 'false': [False]}.get(params.get('in_stock'), [True, False])
+            self.assertEqual(sum(stock_counts.get(value, 0) for value in selected), response.data['count'], params)
+            self.assertEqual(facets['category'], [{'value': 'Scales', 'count': response.data['count']}], params)
+
+
+class SuggestIndexRebuildTests(TestCase):
+    """A rebuild runs off the request path; lookups keep the old entries meanwhile."""
+
+    def test_old_entries_are_served_until_the_swap(self):
+        index = SuggestIndex()
+        index.build([('product', 1, 'Coffee Grinder')])
+        loading = threading.Event()
+
+        def load_entries():
+            loading.wait(5)
+            return [('product', 2, 'Coffee Mug')]
+
+        self.assertTrue(index.rebuild_async(load_entries))
+        self.assertFalse(index.rebuild_async(load_entries))
+        self.assertEqual([hit['text'] for hit in index.suggest('coff')], ['Coffee Grinder'])
+        # Changes made during the rebuild are carried over to the new entries
+        index.add('category', 3, 'Coffee')
+        loading.set()
+        deadline = time.monotonic() + 5
+        while index._changes is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([hit['text'] for hit in index.suggest('coff')], ['Coffee', 'Coffee Mug'])
+
+    def test_restocked_product_is_added_back_without_a_rebuild(self):
+        product = Product.objects.create(
+            name='Coffee Roaster', price=Decimal('90.00'), stock_quantity=1,
+            category=Category.objects.create(name='Roasting'))
+        suggest_index.clear()
+        self.addCleanup(suggest_index.clear)
+        get_suggest_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            take_stock({product.pk: 1})
+        self.assertEqual(suggest_index.suggest('coffee r'), [])
+        built_at = suggest_index.built_at
+        with self.captureOnCommitCallbacks(execute=True):
+            return_stock({product.pk: 1})
+        self.assertEqual([hit['text'] for hit in suggest_index.suggest('coffee r')], ['Coffee Roaster'])
+        self.assertEqual(suggest_index.built_at, built_at)
+
+    def test_rolled_back_changes_never_reach_the_index(self):
+        category = Category.objects.create(name='Roasting')
+        suggest_index.clear()
+        self.addCleanup(suggest_index.clear)
+        get_suggest_index()
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Product.objects.create(
+                name='Coffee Cooler', price=Decimal('40.00'), stock_quantity=1, category=category)
+            raise RuntimeError("checkout failed")
+        self.assertEqual(suggest_index.suggest('coffee c'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                name='Coffee Cooler', price=Decimal('40.00'), stock_quantity=1, category=category)
+        self.assertEqual([hit['text'] for hit in suggest_index.suggest('coffee c')], ['Coffee Cooler'])
+
+
+class GetOrSetCacheTests(TestCase):
+    """get_or_set_cache caches any value, honours tags and recomputes once."""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value):
+        def callback():
+            self.calls += 1
+            return value
+        return callback
+
+    def test_falsy_values_are_cached(self):
+        for key, value in (('empty-list', []), ('zero', 0), ('empty-string', '')):
+            self.assertEqual(get_or_set_cache(key, self.compute(value)), value)
+            self.assertEqual(get_or_set_cache(key, self.compute('recomputed')), value)
+        self.assertEqual(self.calls, 3)
+
+    def test_bumping_a_tag_invalidates_the_entry(self):
+        get_or_set_cache('tagged', self.compute(1), tags=['product'])
+        self.assertEqual(get_or_set_cache('tagged', self.compute(2), tags=['product']), 1)
+
+        bump_versions('category')
+        self.assertEqual(get_or_set_cache('tagged', self.compute(2), tags=['product']), 1)
+
+        bump_versions('product')
+        self.assertEqual(get_or_set_cache('tagged', self.compute(3), tags=['product']), 3)
+        self.assertEqual(self.calls, 2)
+
+    def test_callable_tags_are_resolved_from_the_value(self):
+        get_or_set_cache('dynamic', self.compute(['a']), tags=lambda value: [f"item-{v}" for v in value])
+        bump_versions('item-a')
+        self.assertEqual(get_or_set_cache('dynamic', self.compute(['b'])), ['b'])
+
+    def test_stale_value_is_served_while_another_caller_recomputes(self):
+        get_or_set_cache('busy', self.compute('old'), timeout=60)
+        bump_versions('unrelated')
+        entry = cache.get('busy')
+        entry['expires'] = 0
+        cache.set('busy', entry)
+        cache.add(f"{LOCK_KEY_PREFIX}busy", 1, 10)
+
+        self.assertEqual(get_or_set_cache('busy', self.compute('new')), 'old')
+        self.assertEqual(self.calls, 1)
+
+    def test_waiters_compute_directly_after_the_wait_timeout(self):
+        cache.add(f"{LOCK_KEY_PREFIX}cold", 1, 10)
+        self.assertEqual(get_or_set_cache('cold', self.compute('value'), wait_timeout=0.1), 'value')
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_misses_compute_once(self):
+        def slow():
+            self.calls += 1
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_set_cache('flight', slow)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 4)
+        self.assertEqual(self.calls, 1)
+
+    def test_stats_count_each_outcome(self):
+        reset_cache_stats()
+        get_or_set_cache('stats', self.compute(1))
+        get_or_set_cache('stats', self.compute(1))
+        get_or_set_cache('stats', self.compute(1))
+
+        stats = get_cache_stats()
+        self.assertEqual(stats['miss']['count'], 1)
+        self.assertEqual(stats['hit']['count'], 2)
+        self.assertEqual(stats['hit_ratio'], round(2 / 3, 4))
+        self.assertIsNotNone(stats['hit']['avg_ms'])
+
+        reset_cache_stats()
+        self.assertIsNone(get_cache_stats()['hit_ratio'])
+
+
+class CategoryTreeTests(TestCase):
+    """The category tree follows moves and ignores product changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            username='admin', email='admin@example.com', password='secret')
+        self.clothing = Category.objects.create(name='Clothing')
+        self.shoes = Category.objects.create(name='Shoes', parent_category=self.clothing)
+        self.boots = Category.objects.create(name='Boots', parent_category=self.shoes)
+        self.garden = Category.objects.create(name='Garden')
+
+    def test_tree_nests_children_by_name(self):
+        response = self.client.get('/api/categories/tree/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([node['name'] for node in response.data], ['Clothing', 'Garden'])
+        shoes = response.data[0]['children'][0]
+        self.assertEqual((shoes['name'], shoes['depth']), ('Shoes', 1))
+        self.assertEqual(shoes['children'][0]['name'], 'Boots')
+
+    def test_moving_a_category_rewrites_descendant_paths(self):
+        self.shoes.parent_category = self.garden
+        self.shoes.save()
+
+        self.boots.refresh_from_db()
+        self.assertEqual(
+            self.boots.path, f"{self.garden.pk.hex}/{self.shoes.pk.hex}/{self.boots.pk.hex}/")
+        self.assertEqual(self.boots.depth, 2)
+        self.assertTrue(self.boots.is_descendant_of(self.garden))
+        self.assertFalse(self.boots.is_descendant_of(self.clothing))
+
+        tree = self.client.get('/api/categories/tree/').data
+        self.assertEqual(tree[0]['children'], [])
+        self.assertEqual(tree[1]['children'][0]['children'][0]['name'], 'Boots')
+
+    def test_category_cannot_move_under_its_descendant(self):
+        self.client.force_authenticate(self.admin)
+        for parent in (self.clothing, self.boots):
+            response = self.client.put(
+                f'/api/categories/{self.clothing.pk}/',
+                {'name': 'Clothing', 'parent_category': str(parent.pk)},
+                format='json',
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('parent_category', response.data)
+
+    def test_product_changes_keep_the_tree_etag(self):
+        etag = self.client.get('/api/categories/tree/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                name='Boot', price=Decimal('50.00'), stock_quantity=1, category=self.boots)
+
+        response = self.client.get('/api/categories/tree/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Toys')
+        response = self.client.get('/api/categories/tree/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Toys', [node['name'] for node in response.data])
+
+    def test_serializer_hides_the_materialized_path(self):
+        response = self.client.get(f'/api/categories/{self.shoes.pk}/')
+
+        self.assertNotIn('path', response.data)
+        self.assertEqual(response.data['depth'], 1)
+
+
+class RelatedProductsTests(TestCase):
+    """Co-purchase scores come from active orders, whatever the chunk size."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        user = get_user_model().objects.create_user(
+            username='basket', email='basket@example.com', password='secret', is_active=True)
+        category = Category.objects.create(name='Pantry')
+        self.tea, self.sugar, self.milk = [
+            Product.objects.create(name=name, price=Decimal('2.00'), stock_quantity=10, category=category)
+            for name in ('Tea', 'Sugar', 'Milk')
+        ]
+        baskets = [
+            ('delivered', [self.tea, self.sugar]),
+            ('delivered', [self.tea, self.sugar, self.milk]),
+            ('pending', [self.tea, self.milk]),
+            ('cancelled', [self.sugar, self.milk]),
+        ]
+        for status, products in baskets:
+            order = Order.objects.create(
+                user=user, total_amount=Decimal('4.00'), shipping_address='Merkato', status=status)
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=3)
+
+    def test_scores_are_cosine_similarity_without_self_pairs(self):
+        product_ids, matrix = co_purchase_matrix(chunk_size=1000)
+        index = {pk: position for position, pk in enumerate(product_ids)}
+        tea, sugar, milk = (index[product.pk] for product in (self.tea, self.sugar, self.milk))
+        # Quantities and the cancelled order do not count
+        self.assertEqual(matrix[tea, tea], 3)
+        self.assertEqual(matrix[sugar, milk], 1)
+
+        neighbours = {row: (list(columns), list(scores), list(counts))
+                      for row, columns, scores, counts in top_neighbours(matrix, top_k=5)}
+        columns, scores, counts = neighbours[sugar]
+        self.assertEqual(columns, [tea, milk])
+        self.assertAlmostEqual(scores[0], 2 / (3 * 2) ** 0.5)
+        self.assertAlmostEqual(scores[1], 1 / (2 * 2) ** 0.5)
+        self.assertEqual(counts, [2, 1])
+        for row, (columns, _, _) in neighbours.items():
+            self.assertNotIn(row, columns)
+
+        self.assertEqual(len(next(iter(top_neighbours(matrix, top_k=1)))[1]), 1)
+
+    def test_chunks_never_split_an_order(self):
+        chunks = list(_order_chunks(chunk_size=2))
+        self.assertEqual(sorted(len(products) for _, products in chunks), [2, 2, 3])
+        for order_codes, _ in chunks:
+            self.assertEqual(order_codes[0], 0)
+
+        _, whole = co_purchase_matrix(chunk_size=1000)
+        for chunk_size in (1, 2, 3):
+            _, chunked = co_purchase_matrix(chunk_size=chunk_size)
+            self.assertEqual((whole != chunked).nnz, 0)
+
+    def test_related_endpoint(self):
+        build_related_products(top_k=5, chunk_size=2)
+
+        response = self.client.get(f'/api/products/{self.sugar.pk}/related/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['name'] for item in response.data['results']], ['Tea', 'Milk'])
+        self.assertEqual(response.data['results'][0]['co_purchases'], 2)
+
+        response = self.client.get(f'/api/products/{uuid4()}/related/')
+        self.assertEqual(response.status_code, 404)
+
+
+class TrendingTests(TestCase):
+    """Leaderboards decay with age, follow cancellations and survive a rebuild."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='trend', email='trend@example.com', password='secret', is_active=True)
+        self.coffee = Category.objects.create(name='Coffee')
+        self.tea = Category.objects.create(name='Tea')
+        self.espresso, self.filter = [
+            Product.objects.create(name=name, price=Decimal('5.00'), stock_quantity=50, category=self.coffee)
+            for name in ('Espresso', 'Filter')
+        ]
+        self.green = Product.objects.create(
+            name='Green', price=Decimal('5.00'), stock_quantity=50, category=self.tea)
+
+    def leaderboard(self, **kwargs):
+        cache.clear()
+        return [(product_id, round(score, 3)) for product_id, score in top_products(**kwargs)]
+
+    def order(self, lines, ordered_at, status='pending'):
+        order = Order.objects.create(
+            user=self.user, total_amount=Decimal('5.00'), shipping_address='Sarbet', status=status)
+        Order.objects.filter(pk=order.pk).update(ordered_at=ordered_at)
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity)
+        return order
+
+    def test_recent_sales_outrank_older_ones(self):
+        now = timezone.now()
+        record_sales([(self.espresso.pk, self.coffee.pk, 5)], when=now - timezone.timedelta(hours=12))
+        record_sales([(self.filter.pk, self.coffee.pk, 3), (self.green.pk, self.tea.pk, 1)], when=now)
+
+        self.assertEqual(self.leaderboard(window='hour'), [
+            (str(self.filter.pk), 3.0), (str(self.espresso.pk), 1.25), (str(self.green.pk), 1.0)])
+        self.assertEqual(self.leaderboard(window='hour', category_id=self.tea.pk), [(str(self.green.pk), 1.0)])
+        self.assertEqual(len(self.leaderboard(window='hour', limit=1)), 1)
+        # Half a day barely moves the best sellers
+        self.assertEqual(self.leaderboard(window='day')[0], (str(self.espresso.pk), 5.0))
+
+    def test_cancelled_orders_leave_the_leaderboard(self):
+        now = timezone.now()
+        kept = self.order([(self.filter, 1)], now)
+        dropped = self.order([(self.espresso, 4), (self.filter, 1)], now)
+        for order in (kept, dropped):
+            record_sales([
+                (item.product_id, self.coffee.pk, item.quantity) for item in order.items.all()
+            ], when=now)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_orders([dropped.pk])
+
+        self.assertEqual(self.leaderboard(window='hour'), [(str(self.filter.pk), 1.0)])
+        self.assertEqual(self.leaderboard(window='day'), [(str(self.filter.pk), 1.0)])
+
+    def test_rebuild_recounts_order_history(self):
+        now = timezone.now()
+        self.order([(self.espresso, 4), (self.green, 1)], now - timezone.timedelta(hours=6))
+        self.order([(self.filter, 1)], now)
+        self.order([(self.filter, 9)], now, status='cancelled')
+        # Older than both windows
+        self.order([(self.green, 7)], now - timezone.timedelta(days=40))
+        record_sales([(self.green.pk, self.tea.pk, 100)])
+
+        self.assertEqual(rebuild_counters(now=now), 6)
+        self.assertEqual(self.leaderboard(window='hour'), [
+            (str(self.espresso.pk), 2.0), (str(self.filter.pk), 1.0), (str(self.green.pk), 0.5)])
+
+    def test_redis_view_is_stored_and_expired_together(self):
+        client = mock.MagicMock()
+        client.exists.return_value = False
+        client.zrevrange.return_value = [(str(self.espresso.pk).encode(), 2.0)]
+        with mock.patch('products.trending.get_redis', return_value=client):
+            self.assertEqual(top_products(window='hour'), [(str(self.espresso.pk), 2.0)])
+
+        client.pipeline.assert_called_once_with(transaction=True)
+        pipeline = client.pipeline.return_value
+        pipeline.zunionstore.assert_called_once()
+        pipeline.expire.assert_called_once()
+        pipeline.execute.assert_called_once()
+        client.zunionstore.assert_not_called()
+
+
+class ProductImageTaskTests(TestCase):
+    """Image variants are generated once per distinct upload and only for the current image."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.category = Category.objects.create(name='Baskets')
+
+    def upload(self, name, color='red', size=(800, 400)):
+        buffer = BytesIO()
+        Image.new('RGB', size, color).save(buffer, format='PNG')
+        return Product.objects.create(
+            name=name, price=Decimal('15.00'), stock_quantity=3, category=self.category,
+            image=SimpleUploadedFile(f"{name}.png", buffer.getvalue(), content_type='image/png'))
+
+    def test_variants_are_generated_within_their_bounds(self):
+        product = self.upload('Mesob')
+        generate_product_images(str(product.pk))
+
+        product.refresh_from_db()
+        self.assertEqual(len(product.image_hash), 64)
+        self.assertEqual(set(product.image_variants), {'small', 'medium', 'large'})
+        for name, path in product.image_variants.items():
+            with default_storage.open(path) as variant, Image.open(variant) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertLessEqual(max(image.size), settings.PRODUCT_IMAGE_VARIANTS[name])
+
+    def test_identical_uploads_share_their_variants(self):
+        first, second = self.upload('Sefed'), self.upload('Sefed copy')
+        generate_product_images(str(first.pk))
+
+        with mock.patch('products.images.render_variant') as render:
+            generate_product_images(str(second.pk))
+            # A rerun for the same bytes is skipped altogether
+            generate_product_images(str(second.pk))
+        render.assert_not_called()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image_variants, second.image_variants)
+
+    def test_result_for_a_replaced_image_is_dropped(self):
+        product = self.upload('Agelgil')
+
+        def replace_meanwhile(field_file, digest):
+            Product.objects.filter(pk=product.pk).update(image='products/pictures/newer.png')
+            return {'small': 'stale.webp'}
+
+        with mock.patch('products.tasks.generate_variants', side_effect=replace_meanwhile):
+            generate_product_images(str(product.pk))
+
+        product.refresh_from_db()
+        self.assertEqual((product.image_hash, product.image_variants), ('', {}))
+
+    def test_decompression_bomb_fails_cleanly(self):
+        product = self.upload('Bomb', size=(200, 200))
+
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100), \
+                self.assertLogs('products.tasks', level='ERROR'):
+            generate_product_images(str(product.pk))
+
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+
+
+class ConditionalGetTests(TestCase):
+    """Product and category responses carry validators and answer 304 until something changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Textiles')
+        self.product = Product.objects.create(
+            name='Gabi', price=Decimal('40.00'), stock_quantity=4, category=self.category)
+
+    def test_responses_carry_validators(self):
+        for url in ('/api/products/', f'/api/products/{self.product.pk}/', '/api/categories/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['ETag'].startswith('"'))
+            self.assertIn('GMT', response['Last-Modified'])
+        # Each representation has its own ETag
+        self.assertNotEqual(
+            self.client.get('/api/products/')['ETag'],
+            self.client.get('/api/products/', {'ordering': 'price'})['ETag'])
+
+    def test_unchanged_resource_is_not_modified(self):
+        url = f'/api/products/{self.product.pk}/'
+        first = self.client.get(url)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_product_change_invalidates_the_etag(self):
+        url = f'/api/products/{self.product.pk}/'
+        etag = self.client.get(url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal('35.00')
+            self.product.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['price'], '35.00')
+
+    def test_category_change_invalidates_embedding_products(self):
+        list_etag = self.client.get('/api/products/')['ETag']
+        category_etag = self.client.get('/api/categories/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Woven'
+            self.category.save()
+
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+        self.assertEqual(
+            self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=category_etag).status_code, 200)
+
+
+class ProductImportTests(TestCase):
+    """Imports upsert on (name, category), chunk after chunk, and report bad rows by line."""
+
+    def setUp(self):
+        cache.clear()
+        self.shoes = Category.objects.create(name='Shoes')
+        self.bags = Category.objects.create(name='Bags')
+        self.existing = Product.objects.create(
+            name='Sandal', price=Decimal('20.00'), stock_quantity=5, category=self.shoes)
+
+    def run_import(self, text, file_format='csv', **kwargs):
+        return import_products(io.StringIO(text), file_format, **kwargs).as_dict()
+
+    def test_bad_rows_are_reported_by_line_and_skipped(self):
+        result = self.run_import(
+            "name,category,price,stock_quantity,is_active\n"
+            "Boot,Shoes,60.00,3,yes\n"
+            ",Shoes,10.00,1,yes\n"
+            "Clog,Hats,10.00,1,yes\n"
+            "Loafer,Shoes,cheap,-1,maybe\n"
+            "Tote,Bags,25.50,7,no\n"
+        )
+
+        self.assertEqual((result['processed'], result['imported'], result['failed']), (5, 2, 3))
+        self.assertEqual([error['line'] for error in result['errors']], [3, 4, 5])
+        self.assertEqual(set(result['errors'][0]['errors']), {'name'})
+        self.assertEqual(set(result['errors'][1]['errors']), {'category'})
+        self.assertEqual(set(result['errors'][2]['errors']), {'price', 'stock_quantity', 'is_active'})
+        self.assertFalse(Product.objects.get(name='Tote').is_active)
+
+    def test_invalid_ndjson_lines_are_reported(self):
+        result = self.run_import(
+            '{"name": "Boot", "category": "Shoes", "price": 60}\n'
+            '\n'
+            'not json\n'
+            '["a", "list"]\n',
+            file_format='ndjson',
+        )
+        self.assertEqual(result['imported'], 1)
+        self.assertEqual([error['line'] for error in result['errors']], [3, 4])
+
+    def test_rows_upsert_on_name_and_category(self):
+        result = self.run_import(
+            "name,category,price,stock_quantity\n"
+            "Sandal,Shoes,18.00,9\n"
+            "Sandal,Bags,30.00,2\n"
+        )
+
+        self.assertEqual(result['imported'], 2)
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.price, self.existing.stock_quantity), (Decimal('18.00'), 9))
+        self.assertEqual(Product.objects.filter(name='Sandal').count(), 2)
+
+    def test_chunk_boundaries(self):
+        rows = [f"Shoe {index},Shoes,{index}.00,1" for index in range(5)]
+        # Repeated within a chunk (the last one wins) and across chunks
+        rows += ["Shoe 4,Shoes,40.00,1", "Shoe 0,Shoes,99.00,1"]
+        result = self.run_import("name,category,price,stock_quantity\n" + "\n".join(rows) + "\n", chunk_size=2)
+
+        self.assertEqual(result['failed'], 0)
+        self.assertEqual(Product.objects.filter(name__startswith='Shoe ').count(), 5)
+        self.assertEqual(Product.objects.get(name='Shoe 0').price, Decimal('99.00'))
+        self.assertEqual(Product.objects.get(name='Shoe 4').price, Decimal('40.00'))
+
+    def test_stock_conflicts_are_reported_per_row(self):
+        enable_flash_sale(self.existing.pk, 2)
+        result = self.run_import(
+            "name,category,price,stock_quantity\n"
+            "Sandal,Shoes,18.00,50\n"
+            "Boot,Shoes,60.00,3\n"
+        )
+        self.assertEqual(result['imported'], 1)
+        self.assertEqual(result['errors'], [{'line': 2, 'errors': {'stock_quantity': mock.ANY}}])
+        self.assertEqual(Product.objects.get(pk=self.existing.pk).stock_quantity, 5)
+
+    def test_catalog_is_refreshed_once_for_touched_categories(self):
+        with mock.patch('products.importers.refresh_catalog') as refresh:
+            self.run_import(
+                "name,category,price,stock_quantity\n"
+                "Boot,Shoes,60.00,3\n"
+                "Clutch,Bags,15.00,3\n",
+                chunk_size=1,
+            )
+            refresh.assert_called_once()
+            self.assertEqual(refresh.call_args.kwargs['category_ids'], {self.shoes.pk, self.bags.pk})
+            self.assertEqual(
+                set(refresh.call_args.kwargs['products'].values_list('name', flat=True)), {'Boot', 'Clutch'})
+
+            refresh.reset_mock()
+            self.run_import("name,category,price\nBoot,Nowhere,1.00\n")
+            refresh.assert_not_called()
+
+        # Unmocked, the refresh brings the bulk-written rows into the facets
+        self.run_import("name,category,price,stock_quantity\nBoot,Shoes,60.00,3\n")
+        self.assertEqual(facet_counts(['category'])['category'], [{'value': 'Shoes', 'count': 2}])
+
+
+class CategoryCounterTests(TestCase):
+    """Category product counts and price ranges follow every product change."""
+
+    def setUp(self):
+        cache.clear()
+        self.lamps = Category.objects.create(name='Lamps')
+        self.rugs = Category.objects.create(name='Rugs')
+        self.cheap, self.mid, self.dear = [
+            Product.objects.create(name=name, price=Decimal(price), stock_quantity=2, category=self.lamps)
+            for name, price in (('Cheap', '10.00'), ('Mid', '20.00'), ('Dear', '30.00'))
+        ]
+
+    def counters(self, category):
+        category = Category.objects.get(pk=category.pk)
+        return category.active_product_count, category.min_price, category.max_price
+
+    def test_deactivation_and_reactivation(self):
+        self.dear.is_active = False
+        self.dear.save()
+        self.assertEqual(self.counters(self.lamps), (2, Decimal('10.00'), Decimal('20.00')))
+
+        self.dear.is_active = True
+        self.dear.save()
+        self.assertEqual(self.counters(self.lamps), (3, Decimal('10.00'), Decimal('30.00')))
+
+        # Changing an inactive product moves nothing
+        self.cheap.is_active = False
+        self.cheap.save()
+        self.cheap.price = Decimal('1.00')
+        self.cheap.save()
+        self.assertEqual(self.counters(self.lamps), (2, Decimal('20.00'), Decimal('30.00')))
+
+    def test_repricing_the_current_extremes(self):
+        self.cheap.price = Decimal('25.00')
+        self.cheap.save()
+        self.assertEqual(self.counters(self.lamps), (3, Decimal('20.00'), Decimal('30.00')))
+
+        self.dear.price = Decimal('5.00')
+        self.dear.save()
+        self.assertEqual(self.counters(self.lamps), (3, Decimal('5.00'), Decimal('25.00')))
+
+    def test_moving_between_categories_and_deleting(self):
+        self.dear.category = self.rugs
+        self.dear.save()
+        self.assertEqual(self.counters(self.lamps), (2, Decimal('10.00'), Decimal('20.00')))
+        self.assertEqual(self.counters(self.rugs), (1, Decimal('30.00'), Decimal('30.00')))
+
+        self.dear.delete()
+        self.assertEqual(self.counters(self.rugs), (0, None, None))
+
+    def test_repair_command_fixes_drifted_counters(self):
+        Category.objects.filter(pk=self.lamps.pk).update(active_product_count=7, min_price=None)
+        Product.objects.filter(pk=self.mid.pk).update(is_active=False)
+
+        out = io.StringIO()
+        call_command('repair_category_counters', stdout=out)
 
-# Create your tests here.
+        self.assertIn('Repaired counters of 1 categories.', out.getvalue())
+        self.assertEqual(self.counters(self.lamps), (2, Decimal('10.00'), Decimal('30.00')))
+        self.assertEqual(self.counters(self.rugs), (0, None, None))
+        self.assertEqual(refresh_category_counters(), 0)
@@ -0,0 +1,48 @@
+"""
+Snapshot of the whole category tree.
+
+The tree is built from one query ordered by materialized path and cached
+against its own ``category-tree`` change token. Only category saves and
+deletes bump it (see `products.signals`), so product changes, which move
+the ``category`` token through the counters, leave the snapshot alone.
+"""
+from utils.cache_utils import get_or_set_cache
+
+from .models import Category
+
+TREE_CACHE_KEY = 'category-tree'
+TREE_VERSION = 'category-tree'
+TREE_CACHE_TIMEOUT = 60 * 60
+
+
+def build_category_tree() -> list:
+    """Return the top-level categories with their `children` nested."""
+    rows = Category.objects.order_by('path').values(
+        'category_id', 'name', 'description', 'parent_category_id', 'depth')
+    nodes = {}
+    roots = []
+    # Ordering by path guarantees every parent is seen before its children
+    for row in rows:
+        node = {
+            'category_id': str(row['category_id']),
+            'name': row['name'],
+            'description': row['description'],
+            'depth': row['depth'],
+            'children': [],
+        }
+        nodes[row['category_id']] = node
+        parent = nodes.get(row['parent_category_id'])
+        (parent['children'] if parent else roots).append(node)
+
+    def sort(children):
+        children.sort(key=lambda node: node['name'])
+        for child in children:
+            sort(child['children'])
+    sort(roots)
+    return roots
+
+
+def get_category_tree() -> list:
+    """Return the cached tree, rebuilding it once categories changed."""
+    return get_or_set_cache(
+        TREE_CACHE_KEY, build_category_tree, timeout=TREE_CACHE_TIMEOUT, tags=(TREE_VERSION,))
@@ -0,0 +1,287 @@
+"""
+Trending and best-seller leaderboards from time-decayed sales counters.
+
+Every committed checkout adds the units sold to an hourly and a daily
+bucket, once catalog-wide and once for the product's category, and
+cancelling an order takes its units back out of the buckets it was
+counted in. Two windows are served:
+
+- ``hour`` ("trending now"): the last 24 hourly buckets, halving every 6 hours;
+- ``day`` ("best sellers"): the last 30 daily buckets, halving every 7 days.
+
+With Redis (``TRENDING_REDIS_URL``) buckets are sorted sets. A
+leaderboard is the weighted ``ZUNIONSTORE`` of its buckets, kept for a
+short while, so serving it is a ``ZREVRANGE``: O(log n + limit).
+Without Redis the buckets are rows of ``SalesCounter`` and leaderboards
+are a weighted SUM over that table, cached the same way.
+"""
+import logging
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest, TruncDay, TruncHour
+from django.utils import timezone
+
+from utils.cache_utils import get_or_set_cache
+
+from .models import SalesCounter
+
+logger = logging.getLogger(__name__)
+
+WINDOWS = {
+    'hour': {'step': timedelta(hours=1), 'buckets': 24, 'half_life': 6, 'ttl': 60},
+    'day': {'step': timedelta(days=1), 'buckets': 30, 'half_life': 7, 'ttl': 600},
+}
+KEY_PREFIX = 'trending'
+
+
+def bucket_start(moment, window: str):
+    """Truncate ``moment`` to the start of its hour or (UTC) day."""
+    moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if window == 'day' else moment
+
+
+def bucket_weights(window: str, now=None) -> list:
+    """Return ``[(bucket start, decay weight), ...]``, newest first."""
+    spec = WINDOWS[window]
+    newest = bucket_start(now or timezone.now(), window)
+    return [
+        (newest - age * spec['step'], 0.5 ** (age / spec['half_life']))
+        for age in range(spec['buckets'])
+    ]
+
+
+def scope_name(category_id=None) -> str:
+    return f"category:{category_id}" if category_id else 'all'
+
+
+_redis_client = None
+
+
+def get_redis():
+    """Return a Redis client, or None when the database fallback is in use."""
+    global _redis_client
+    url = getattr(settings, 'TRENDING_REDIS_URL', '')
+    if not url:
+        return None
+    if _redis_client is None:
+        import redis
+        _redis_client = redis.Redis.from_url(url)
+    return _redis_client
+
+
+def _bucket_key(window: str, bucket, scope: str) -> str:
+    return f"{KEY_PREFIX}:{window}:{bucket:%Y%m%d%H}:{scope}"
+
+
+def record_sales(lines, when=None) -> None:
+    """
+    Count ``[(product_id, category_id, quantity), ...]`` sold at ``when``
+    (default now) into every window.
+    """
+    when = when or timezone.now()
+    add_sales([(when, *line) for line in lines])
+
+
+def add_sales(entries) -> None:
+    """
+    Add ``[(sold_at, product_id, category_id, quantity), ...]`` to the
+    buckets of their sale time. Negative quantities take units back out;
+    counters never drop below zero.
+    """
+    entries = [entry for entry in entries if entry[3]]
+    if not entries:
+        return
+    client = get_redis()
+    for window in WINDOWS:
+        dated = [(bucket_start(sold_at, window), *line) for sold_at, *line in entries]
+        if client is not None:
+            _add_redis(client, window, dated)
+            continue
+        buckets = {}
+        for bucket, *line in dated:
+            buckets.setdefault(bucket, []).append(line)
+        for bucket, lines in buckets.items():
+            _add_database(window, bucket, lines)
+
+
+def record_sales_on_commit(lines, when=None) -> None:
+    """
+    Record a checkout's lines once its transaction commits. Counting is
+    best effort: a failure is logged and never affects the order.
+    """
+    when = when or timezone.now()
+    _add_sales_on_commit([(when, *line) for line in lines])
+
+
+def retract_sales_on_commit(entries) -> None:
+    """
+    Take ``[(sold_at, product_id, category_id, quantity), ...]`` of
+    cancelled orders back out of the buckets they were counted in, once
+    the cancellation commits. Best effort, like recording.
+    """
+    _add_sales_on_commit([
+        (sold_at, product_id, category_id, -quantity)
+        for sold_at, product_id, category_id, quantity in entries
+    ])
+
+
+def _add_sales_on_commit(entries) -> None:
+    def add():
+        try:
+            add_sales(entries)
+        except Exception as exc:
+            logger.error(f"Could not record sales for trending: {exc}")
+
+    transaction.on_commit(add)
+
+
+def _add_redis(client, window, entries) -> None:
+    """ZINCRBY ``[(bucket, product_id, category_id, quantity), ...]`` in one round trip."""
+    spec = WINDOWS[window]
+    # Keep buckets one window longer than they are read
+    expires = int(spec['step'].total_seconds() * spec['buckets'] * 2)
+    pipeline = client.pipeline(transaction=False)
+    for bucket, product_id, category_id, quantity in entries:
+        for scope in ('all', scope_name(category_id)):
+            key = _bucket_key(window, bucket, scope)
+            pipeline.zincrby(key, quantity, str(product_id))
+            if quantity < 0:
+                # Drop members a retraction brought down to zero
+                pipeline.zremrangebyscore(key, '-inf', 0)
+            pipeline.expire(key, expires)
+    pipeline.execute()
+
+
+def _add_database(window, bucket, lines) -> None:
+    """Add the lines to one bucket with two statements, however many there are."""
+    quantities = {}
+    for product_id, category_id, quantity in lines:
+        previous = quantities.get(product_id, (category_id, 0))[1]
+        quantities[product_id] = (category_id, previous + quantity)
+    with transaction.atomic():
+        # Missing counters start at zero; ones created concurrently are kept
+        SalesCounter.objects.bulk_create([
+            SalesCounter(product_id=product_id, category_id=category_id, window=window, bucket=bucket)
+            for product_id, (category_id, _) in quantities.items()
+        ], ignore_conflicts=True)
+        SalesCounter.objects.filter(
+            window=window, bucket=bucket, product_id__in=list(quantities)
+        ).update(quantity=Greatest(F('quantity') + Case(
+            *[When(product_id=product_id, then=Value(quantity))
+              for product_id, (_, quantity) in quantities.items()],
+            default=Value(0), output_field=IntegerField(),
+        ), Value(0)))
+
+
+def top_products(window='hour', category_id=None, limit=10) -> list:
+    """Return ``[(product_id, score), ...]`` for a leaderboard, best first."""
+    client = get_redis()
+    if client is not None:
+        return _top_redis(client, window, category_id, limit)
+    return _top_database(window, category_id, limit)
+
+
+def _top_redis(client, window, category_id, limit) -> list:
+    scope = scope_name(category_id)
+    weights = bucket_weights(window)
+    view = f"{KEY_PREFIX}:view:{window}:{weights[0][0]:%Y%m%d%H}:{scope}"
+    if not client.exists(view):
+        # Store and expire together so a crash never leaves a view that lives forever
+        pipeline = client.pipeline(transaction=True)
+        pipeline.zunionstore(view, {
+            _bucket_key(window, bucket, scope): weight for bucket, weight in weights
+        })
+        pipeline.expire(view, WINDOWS[window]['ttl'])
+        pipeline.execute()
+    return [
+        (member.decode(), score)
+        for member, score in client.zrevrange(view, 0, limit - 1, withscores=True)
+    ]
+
+
+def _top_database(window, category_id, limit) -> list:
+    weights = bucket_weights(window)
+
+    def compute():
+        counters = SalesCounter.objects.filter(window=window, bucket__gte=weights[-1][0])
+        if category_id:
+            counters = counters.filter(category_id=category_id)
+        decay = Case(
+            *[When(bucket=bucket, then=Value(weight)) for bucket, weight in weights],
+            default=Value(0.0), output_field=FloatField(),
+        )
+        rows = counters.values('product_id').annotate(
+            score=Sum(F('quantity') * decay, output_field=FloatField())
+        ).filter(score__gt=0).order_by('-score')[:limit]
+        return [(str(row['product_id']), row['score']) for row in rows]
+
+    key = f"{KEY_PREFIX}:view:{window}:{weights[0][0]:%Y%m%d%H}:{scope_name(category_id)}:{limit}"
+    return get_or_set_cache(key, compute, timeout=WINDOWS[window]['ttl'])
+
+
+def clear_counters() -> None:
+    """Drop every bucket and cached leaderboard."""
+    client = get_redis()
+    if client is not None:
+        keys = list(client.scan_iter(match=f"{KEY_PREFIX}:*", count=1000))
+        for start in range(0, len(keys), 1000):
+            client.delete(*keys[start:start + 1000])
+    SalesCounter.objects.all().delete()
+
+
+def prune_counters(now=None) -> int:
+    """Delete database buckets that no window reads any more."""
+    deleted = 0
+    for window in WINDOWS:
+        oldest = bucket_weights(window, now)[-1][0]
+        deleted += SalesCounter.objects.filter(window=window, bucket__lt=oldest).delete()[0]
+    return deleted
+
+
+def rebuild_counters(now=None, batch_size=5000) -> int:
+    """
+    Replace all counters with totals recomputed from historical order
+    lines (cancelled orders excluded). Returns the bucket rows written.
+    """
+    from orders.models import OrderItem  # Import here to avoid circular import
+    now = now or timezone.now()
+    clear_counters()
+    client = get_redis()
+    written = 0
+    for window, truncate in (('hour', TruncHour), ('day', TruncDay)):
+        oldest = bucket_weights(window, now)[-1][0]
+        rows = OrderItem.objects.filter(
+            order__ordered_at__gte=oldest
+        ).exclude(order__status='cancelled').annotate(
+            sold_in=truncate('order__ordered_at', tzinfo=dt_timezone.utc)
+        ).values('sold_in', 'product_id', 'product__category_id').annotate(
+            units=Sum('quantity')
+        ).order_by()
+
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append((row['sold_in'], row['product_id'], row['product__category_id'], row['units']))
+            if len(batch) >= batch_size:
+                _write_backfill(client, window, batch)
+                written += len(batch)
+                batch = []
+        _write_backfill(client, window, batch)
+        written += len(batch)
+    return written
+
+
+def _write_backfill(client, window, entries) -> None:
+    """Write aggregated buckets into freshly cleared storage."""
+    if not entries:
+        return
+    if client is not None:
+        _add_redis(client, window, entries)
+        return
+    SalesCounter.objects.bulk_create([
+        SalesCounter(product_id=product_id, category_id=category_id,
+                     window=window, bucket=bucket, quantity=quantity)
+        for bucket, product_id, category_id, quantity in entries
+    ])
@@ -8,6 +8,11 @@ urlpatterns = [
         CategoryViewSet.as_view({'get': 'list', 'post': 'create'}),
         name='category-list'
     ),
+    path(
+        'categories/tree/',
+        CategoryViewSet.as_view({'get': 'tree'}),
+        name='category-tree'
+    ),
     path(
         'categories/<uuid:pk>/',
         CategoryViewSet.as_view({'get': 'retrieve',
@@ -20,6 +25,31 @@ urlpatterns = [
         ProductViewSet.as_view({'get': 'list', 'post': 'create'}),
         name='product-list'
     ),
+    path(
+        'products/suggest/',
+        ProductViewSet.as_view({'get': 'suggest'}),
+        name='product-suggest'
+    ),
+    path(
+        'products/bulk/',
+        ProductViewSet.as_view({'patch': 'bulk_update'}),
+        name='product-bulk-update'
+    ),
+    path(
+        'products/feed/',
+        ProductViewSet.as_view({'get': 'feed'}),
+        name='product-feed'
+    ),
+    path(
+        'products/trending/',
+        ProductViewSet.as_view({'get': 'trending'}),
+        name='product-trending'
+    ),
+    path(
+        'products/import/',
+        ProductViewSet.as_view({'post': 'import_products'}),
+        name='product-import'
+    ),
     path(
         'products/<uuid:pk>/',
         ProductViewSet.as_view({
@@ -29,4 +59,9 @@ urlpatterns = [
             }),
         name='product-detail'
         ),
+    path(
+        'products/<uuid:pk>/related/',
+        ProductViewSet.as_view({'get': 'related'}),
+        name='product-related'
+    ),
 ]
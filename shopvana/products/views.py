@@ -1,15 +1,49 @@
-from .models import Category, Product
+from .models import Category, Product, RelatedProduct
 from .serializers import CategorySerializer, ProductSerializer
-from rest_framework import viewsets, filters
+from .bulk import bulk_update_products
+from .feeds import CONTENT_TYPES, FEED_FORMATS, FILE_EXTENSIONS, feed_queryset, feed_records, render_feed
+from .facets import FACET_NAMES, facet_counts, facet_counts_for_queryset
+from .filters import ProductFacetFilter, ProductOrderingFilter, ProductSearchFilter
+from .importers import FILE_FORMATS, detect_format, import_products
+from .suggest import get_suggest_index
+from .tree import TREE_VERSION, get_category_tree
+from .trending import WINDOWS, top_products
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from utils.mixins import CachedResponseMixin, ConditionalGetMixin, QueryPlanMixin
 from utils.permissions import EcommercePermission
 from drf_yasg.utils import swagger_auto_schema
+from uuid import UUID
 
 @swagger_auto_schema(tags=["Product Cartegory"])
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """ViewSet for managing product categories."""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [EcommercePermission]
+    keyset_ordering = ('name', 'category_id')
+    conditional_versions = ('category',)
+    cache_object_tag = 'category'
+
+    def get_queryset(self):
+        """Limit the listing to categories with active products on `?active=true`."""
+        if self.action == 'list' and self.request.query_params.get('active') == 'true':
+            return Category.objects.active_categories()
+        return super().get_queryset()
+
+    @action(detail=False, methods=['get'], url_path='tree')
+    def tree(self, request):
+        """Return the whole category hierarchy from a cached snapshot."""
+        # Validate against the tree's own token, which product changes leave alone
+        self.conditional_versions = (TREE_VERSION,)
+        return self.conditional_response(
+            request, lambda request: Response(get_category_tree()))
 
     def perform_create(self, serializer: CategorySerializer) -> None:
         """Override to add custom behavior on create."""
@@ -21,18 +55,206 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
     def perform_destroy(self, instance: Category) -> None:
         """Override to add custom behavior on delete."""
+        if instance.subcategories.exists():
+            raise ValidationError("Move or delete the subcategories of this category first.")
         instance.delete()
 
 
 @swagger_auto_schema(tags=["Products"])
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, CachedResponseMixin, QueryPlanMixin, viewsets.ModelViewSet):
     """ViewSet for managing products."""
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [EcommercePermission]
-    search_fields = ['name', 'price', 'created_at', 'category']
-    ordering_fields = ['name', 'price', 'created_at']
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    keyset_ordering = ('name', 'product_id')
+    select_related_fields = ('category',)
+    # Product representations embed their category
+    conditional_versions = ('product', 'category')
+    cache_object_tag = 'product'
+    ordering_fields = ['name', 'price', 'created_at', 'rating_average', 'rating_count']
+    filter_backends = [ProductSearchFilter, ProductFacetFilter, ProductOrderingFilter]
+    suggest_default_limit = 10
+    suggest_max_limit = 25
+    bulk_max_changes = 10000
+    related_default_limit = 10
+    trending_default_limit = 10
+    trending_max_limit = 50
+
+    def get_queryset(self):
+        """
+        List active products only, the scope the facet counts cover;
+        inactive ones stay reachable by id.
+        """
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = queryset.filter(is_active=True)
+        return queryset
+
+    def get_derived_cache_tags(self, data):
+        """Tag cached product details with the category they embed."""
+        category = data.get('category') if isinstance(data, dict) else None
+        if self.action == 'retrieve' and isinstance(category, dict):
+            return [f"category:{category['category_id']}"]
+        return []
+
+    def get_paginated_response(self, data):
+        """Add bucket counts to the page when `?facets=` is given."""
+        response = super().get_paginated_response(data)
+        facets = [
+            name for name in self.request.query_params.get('facets', '').split(',')
+            if name in FACET_NAMES
+        ]
+        if facets:
+            response.data['facets'] = self.get_facets(self.request, facets)
+        return response
+
+    def get_facets(self, request, facets: list) -> dict:
+        """
+        Serve facet counts from the precomputed table, or from the
+        filtered queryset when a text search narrows the listing.
+        """
+        if ProductSearchFilter().get_search_query(request):
+            queryset = self.filter_queryset(self.get_queryset())
+            return facet_counts_for_queryset(queryset, facets)
+        selection = ProductFacetFilter().get_selection(request)
+        return facet_counts(facets, **selection)
+
+    @action(detail=False, methods=['get'], url_path='suggest')
+    def suggest(self, request):
+        """Return name completions for the search box without serializing products."""
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', self.suggest_default_limit))
+        except ValueError:
+            limit = self.suggest_default_limit
+        limit = max(1, min(limit, self.suggest_max_limit))
+        return Response({
+            'query': query,
+            'suggestions': get_suggest_index().suggest(query, limit=limit),
+        })
+
+    @action(detail=True, methods=['get'], url_path='related')
+    def related(self, request, pk=None):
+        """Return products frequently bought together with this one, best first."""
+        try:
+            limit = int(request.query_params.get('limit', self.related_default_limit))
+        except ValueError:
+            limit = self.related_default_limit
+        product = self.get_object()
+        neighbours = RelatedProduct.objects.filter(
+            product=product, related__is_active=True
+        ).select_related('related__category').order_by('rank')[:max(1, min(limit, 50))]
+
+        context = self.get_serializer_context()
+        results = []
+        for neighbour in neighbours:
+            data = ProductSerializer(neighbour.related, context=context).data
+            data['score'] = round(neighbour.score, 4)
+            data['co_purchases'] = neighbour.co_purchases
+            results.append(data)
+        return Response({'product_id': product.pk, 'results': results})
+
+    @action(detail=False, methods=['get'], url_path='trending')
+    def trending(self, request):
+        """
+        Return the trending (`?window=hour`) or best-selling (`?window=day`)
+        products, optionally within one `?category=`, by decayed units sold.
+        """
+        window = request.query_params.get('window', 'hour')
+        if window not in WINDOWS:
+            raise ValidationError({'window': f"Use one of: {', '.join(WINDOWS)}."})
+        category_id = request.query_params.get('category') or None
+        if category_id:
+            try:
+                category_id = UUID(category_id)
+            except ValueError:
+                raise ValidationError({'category': "A valid UUID is required."})
+        try:
+            limit = int(request.query_params.get('limit', self.trending_default_limit))
+        except ValueError:
+            limit = self.trending_default_limit
+        limit = max(1, min(limit, self.trending_max_limit))
+
+        # Over-fetch a little so inactive products can be dropped
+        ranking = top_products(window, category_id=category_id, limit=limit + 10)
+        products = Product.objects.select_related('category').in_bulk(
+            [product_id for product_id, _ in ranking])
+        context = self.get_serializer_context()
+        results = []
+        for product_id, score in ranking:
+            product = products.get(UUID(product_id))
+            if product is None or not product.is_active:
+                continue
+            data = ProductSerializer(product, context=context).data
+            data['score'] = round(score, 4)
+            results.append(data)
+            if len(results) == limit:
+                break
+        return Response({'window': window, 'category': category_id and str(category_id), 'results': results})
+
+    @action(detail=False, methods=['post'], url_path='import',
+            permission_classes=[IsAdminUser], parser_classes=[MultiPartParser])
+    def import_products(self, request):
+        """
+        Bulk upsert products from an uploaded CSV or NDJSON `file`.
+        Invalid rows are reported by line number and skipped.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'Upload the catalog as `file`.'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or detect_format(upload.name)
+        if file_format not in FILE_FORMATS:
+            return Response(
+                {'detail': f"Unsupported file_format. Use one of: {', '.join(FILE_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST)
+        result = import_products(upload.file, file_format)
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['patch'], url_path='bulk', permission_classes=[IsAdminUser])
+    def bulk_update(self, request):
+        """
+        Apply `[{product_id, price?, stock_quantity?}, ...]` with set-based
+        UPDATEs. Invalid entries are reported by index and skipped.
+        """
+        changes = request.data
+        if not isinstance(changes, list):
+            return Response({'detail': 'Expected a list of changes.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(changes) > self.bulk_max_changes:
+            return Response(
+                {'detail': f"At most {self.bulk_max_changes} changes per request."},
+                status=status.HTTP_400_BAD_REQUEST)
+        return Response(bulk_update_products(changes), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='feed', permission_classes=[IsAdminUser])
+    def feed(self, request):
+        """
+        Stream the catalog as CSV, NDJSON or gzipped XML (`?output=`).
+        `?since=<ISO datetime>` exports only products updated after it;
+        the `X-Feed-Watermark` header is the value to pass next time.
+        """
+        feed_format = request.query_params.get('output', 'csv')
+        if feed_format not in FEED_FORMATS:
+            return Response(
+                {'detail': f"Unsupported output. Use one of: {', '.join(FEED_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST)
+        since = request.query_params.get('since')
+        if since:
+            since = parse_datetime(since.replace(' ', '+'))
+            if since is None:
+                return Response(
+                    {'detail': 'since must be an ISO 8601 datetime.'},
+                    status=status.HTTP_400_BAD_REQUEST)
+
+        rows, watermark = feed_queryset(since=since or None)
+        records = feed_records(rows, base_url=request.build_absolute_uri('/').rstrip('/'))
+        response = StreamingHttpResponse(
+            render_feed(records, feed_format), content_type=CONTENT_TYPES[feed_format])
+        response['Content-Disposition'] = f'attachment; filename="catalog.{FILE_EXTENSIONS[feed_format]}"'
+        # Nothing new: the caller keeps its watermark
+        next_watermark = watermark or since
+        if next_watermark:
+            response['X-Feed-Watermark'] = next_watermark.isoformat()
+        return response
 
     def perform_create(self, serializer: ProductSerializer) -> None:
         """Override to add custom behavior on create."""
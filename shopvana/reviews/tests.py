@@ -1,3 +1,81 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+from products.ratings import refresh_product_ratings
+from .models import Review
+
+
+class ReviewRatingSignalTests(TestCase):
+    """Creating, editing and deleting reviews keeps the product rating aggregates exact."""
+
+    def setUp(self):
+        cache.clear()
+        users = get_user_model().objects
+        self.alice = users.create_user(
+            username='alice', email='alice@example.com', password='secret', is_active=True)
+        self.bob = users.create_user(
+            username='bob', email='bob@example.com', password='secret', is_active=True)
+        category = Category.objects.create(name='Spices')
+        self.berbere, self.mitmita = [
+            Product.objects.create(name=name, price=Decimal('6.00'), stock_quantity=20, category=category)
+            for name in ('Berbere', 'Mitmita')
+        ]
+        self.items = {}
+        for user in (self.alice, self.bob):
+            order = Order.objects.create(
+                user=user, total_amount=Decimal('12.00'), shipping_address='Mexico Square', status='delivered')
+            for product in (self.berbere, self.mitmita):
+                self.items[user, product] = OrderItem.objects.create(order=order, product=product, quantity=1)
+
+    def review(self, user, product, rating):
+        return Review.objects.create(order_id=self.items[user, product], user_id=user, rating=rating)
+
+    def aggregates(self, product):
+        product = Product.objects.get(pk=product.pk)
+        return (
+            product.rating_count, product.rating_sum, round(product.rating_average, 3),
+            [getattr(product, f"rating_{star}") for star in range(1, 6)],
+        )
+
+    def test_create_edit_and_delete(self):
+        alice = self.review(self.alice, self.berbere, 5)
+        bob = self.review(self.bob, self.berbere, 2)
+        self.assertEqual(self.aggregates(self.berbere), (2, 7, 3.5, [0, 1, 0, 0, 1]))
+
+        alice.rating = 4
+        alice.save()
+        self.assertEqual(self.aggregates(self.berbere), (2, 6, 3.0, [0, 1, 0, 1, 0]))
+
+        # Saving without a change moves nothing
+        alice.comment = 'Hot'
+        alice.save()
+        self.assertEqual(self.aggregates(self.berbere), (2, 6, 3.0, [0, 1, 0, 1, 0]))
+
+        bob.delete()
+        self.assertEqual(self.aggregates(self.berbere), (1, 4, 4.0, [0, 0, 0, 1, 0]))
+        alice.delete()
+        self.assertEqual(self.aggregates(self.berbere), (0, 0, 0.0, [0, 0, 0, 0, 0]))
+        self.assertEqual(self.aggregates(self.mitmita), (0, 0, 0.0, [0, 0, 0, 0, 0]))
+
+    def test_moving_a_review_to_another_item(self):
+        review = self.review(self.alice, self.berbere, 3)
+        review.order_id = self.items[self.alice, self.mitmita]
+        review.save()
+
+        self.assertEqual(self.aggregates(self.berbere), (0, 0, 0.0, [0, 0, 0, 0, 0]))
+        self.assertEqual(self.aggregates(self.mitmita), (1, 3, 3.0, [0, 0, 1, 0, 0]))
+
+    def test_signals_agree_with_a_full_recount(self):
+        self.review(self.alice, self.berbere, 1)
+        self.review(self.bob, self.berbere, 4)
+        self.review(self.alice, self.mitmita, 5)
+
+        self.assertEqual(refresh_product_ratings(), 0)
+        Product.objects.filter(pk=self.berbere.pk).update(rating_count=9)
+        self.assertEqual(refresh_product_ratings(), 1)
+        self.assertEqual(self.aggregates(self.berbere), (2, 5, 2.5, [1, 0, 0, 1, 0]))
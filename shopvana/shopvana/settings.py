@@ -14,6 +14,7 @@ from pathlib import Path
 import environ
 import os
 from datetime import timedelta
+from celery.schedules import crontab
 import dj_database_url
 
 # Initialize environment variables
@@ -215,13 +216,94 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND')
 CELERY_TIMEZONE = 'UTC'
+# Asynchronous checkouts get their own workers: celery -A shopvana worker -Q checkout
+CELERY_TASK_ROUTES = {
+    'orders.tasks.run_checkout_job': {'queue': 'checkout'},
+}
 CELERY_BEAT_SCHEDULE = {
     'check-pending-payments-every-3-minutes': {
         'task': 'utils.tasks.check_pending_payments',
         'schedule': timedelta(minutes=3),
     },
+    'build-related-products-nightly': {
+        'task': 'products.tasks.build_related_products',
+        'schedule': crontab(hour=2, minute=30),
+    },
+    'prune-sales-counters-daily': {
+        'task': 'products.tasks.prune_sales_counters',
+        'schedule': crontab(hour=3, minute=15),
+    },
+    'reconcile-stock-shards-every-minute': {
+        'task': 'products.tasks.reconcile_stock_shards',
+        'schedule': timedelta(minutes=1),
+    },
+    'purge-idempotency-keys-daily': {
+        'task': 'utils.tasks.purge_idempotency_keys',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'relay-outbox-every-minute': {
+        'task': 'utils.tasks.relay_outbox',
+        'schedule': timedelta(minutes=1),
+    },
+    'release-expired-cart-reservations-every-minute': {
+        'task': 'cart.tasks.release_expired_reservations',
+        'schedule': timedelta(minutes=1),
+    },
+    'cancel-expired-orders-every-5-minutes': {
+        'task': 'orders.tasks.cancel_expired_orders',
+        'schedule': timedelta(minutes=5),
+    },
 }
 
+# Cache shared by all workers: response cache, ETag versions, stats. The default
+# in-process cache suits dev and tests only; production sets CACHE_URL to Redis
+# (e.g. rediscache://127.0.0.1:6379/1) so every worker sees the same entries.
+CACHES = {
+    'default': {
+        **env.cache_url('CACHE_URL', default='locmemcache://'),
+        'KEY_PREFIX': 'shopvana',
+        'TIMEOUT': 300,
+    }
+}
+
+# Product autocomplete: each worker rebuilds its in-process index after this many seconds
+SUGGEST_INDEX_MAX_AGE = env.int('SUGGEST_INDEX_MAX_AGE', default=300)
+
+# Incremental catalog feeds re-read this many seconds before the `since` watermark
+CATALOG_FEED_OVERLAP_SECONDS = env.int('CATALOG_FEED_OVERLAP_SECONDS', default=300)
+
+# Lower edges of the price facet buckets; run `manage.py rebuild_facets` after changing
+PRODUCT_PRICE_BUCKETS = [0, 25, 50, 100, 250, 500, 1000]
+
+# Bounding boxes (px) of the WebP derivatives generated for product images
+PRODUCT_IMAGE_VARIANTS = {'small': 160, 'medium': 480, 'large': 1200}
+
+# "Frequently bought together": neighbours kept per product, and order lines read per batch
+RELATED_PRODUCTS_TOP_K = env.int('RELATED_PRODUCTS_TOP_K', default=20)
+RELATED_PRODUCTS_CHUNK_SIZE = env.int('RELATED_PRODUCTS_CHUNK_SIZE', default=100000)
+
+# Trending / best-seller leaderboards live in Redis sorted sets (the cache's Redis by
+# default); with an empty URL they fall back to the shopvana_sales_counter table
+TRENDING_REDIS_URL = env(
+    'TRENDING_REDIS_URL',
+    default=CACHES['default']['LOCATION'] if CACHES['default']['BACKEND'].endswith('RedisCache') else ''
+)
+
+# Add-to-cart holds stock for this long (refreshed on every cart change)
+CART_RESERVATION_MINUTES = env.int('CART_RESERVATION_MINUTES', default=15)
+
+# Outbox relay: attempts (with exponential backoff) before an event is marked failed
+OUTBOX_MAX_ATTEMPTS = env.int('OUTBOX_MAX_ATTEMPTS', default=8)
+
+# Longest `?wait=` (seconds) of the checkout URL long-poll, GET /api/orders/<id>/payment/
+PAYMENT_POLL_MAX_WAIT = 10
+
+# Idempotency-Key on checkout and payment creation: how long responses are replayed, how
+# long a duplicate waits for the first request, and when an unfinished claim is abandoned
+IDEMPOTENCY_KEY_TTL_HOURS = env.int('IDEMPOTENCY_KEY_TTL_HOURS', default=24)
+IDEMPOTENCY_WAIT_SECONDS = 10
+IDEMPOTENCY_LOCK_SECONDS = 120
+
 # Chapa Settings
 CHAPA_SECRET_KEY = env('CHAPA_SECRET_KEY')
 CHAPA_PUBLIC_KEY = env('CHAPA_PUBLIC_KEY')
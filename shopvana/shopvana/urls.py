@@ -58,4 +58,5 @@ urlpatterns = [
     path('api/', include('orders.urls')),
     path('api/', include('cart.urls')),
     path('api/', include('payments.urls')),
+    path('api/', include('utils.urls')),
 ]
@@ -1,9 +1,174 @@
 from django.core.cache import cache
+from django.utils import timezone
+from uuid import uuid4
+import logging
+import time
 
+logger = logging.getLogger(__name__)
 
-def get_or_set_cache(key, callback, timeout=60):
-    data = cache.get(key)
-    if not data:
-        data = callback()
-        cache.set(key, data, timeout)
-    return data
+VERSION_KEY_PREFIX = 'version:'
+LOCK_KEY_PREFIX = 'lock:'
+STATS_KEY_PREFIX = 'stats:cache:'
+STAT_OUTCOMES = ('hit', 'stale', 'miss', 'wait')
+
+
+def get_or_set_cache(key, callback, timeout=60, tags=(), should_cache=None,
+                     lock_timeout=10, wait_timeout=2.0):
+    """
+    Return the cached value for `key`, computing it with `callback` on a miss.
+
+    - Any value (including empty lists and 0) is cached; only an absent
+      key counts as a miss.
+    - `tags` name change tokens (see `bump_versions`) the value depends on;
+      bumping any of them invalidates the entry. It may also be a callable
+      receiving the computed value, for tags only known afterwards.
+    - Only one caller recomputes an expired key (single flight). Others
+      serve the previous value if there is one, or wait up to
+      `wait_timeout` seconds for the recomputed value.
+    - `should_cache(value)` can veto storing a computed value.
+    """
+    started = time.monotonic()
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(entry):
+        record_cache_stat('hit', started)
+        return entry['value']
+
+    lock_key = f"{LOCK_KEY_PREFIX}{key}"
+    if not cache.add(lock_key, 1, lock_timeout):
+        # Someone else is already recomputing this key
+        if entry is not None:
+            record_cache_stat('stale', started)
+            return entry['value']
+        deadline = started + wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None and _is_fresh(entry):
+                record_cache_stat('wait', started)
+                return entry['value']
+        logger.warning(f"Timed out waiting for cache key {key}; computing it directly.")
+
+    try:
+        static_tags = [] if callable(tags) else list(tags)
+        # Snapshot tokens before computing so a concurrent invalidation
+        # leaves the entry stale instead of caching outdated data
+        token_map = _tag_tokens(static_tags)
+        value = callback()
+        if should_cache is None or should_cache(value):
+            if callable(tags):
+                token_map.update(_tag_tokens(tags(value)))
+            # Keep the entry past its expiry so it can be served while
+            # another worker recomputes it
+            cache.set(key, {
+                'value': value,
+                'tags': token_map,
+                'expires': time.time() + timeout,
+            }, timeout * 2)
+    finally:
+        cache.delete(lock_key)
+    record_cache_stat('miss', started)
+    return value
+
+
+def _tag_tokens(tags):
+    if not tags:
+        return {}
+    return {name: version['token'] for name, version in get_versions(*tags).items()}
+
+
+def _is_fresh(entry):
+    """Return True if the entry has not expired and none of its tags moved on."""
+    if not isinstance(entry, dict) or entry.get('expires', 0) < time.time():
+        return False
+    tags = entry.get('tags') or {}
+    if not tags:
+        return True
+    current = get_versions(*tags)
+    return all(current[name]['token'] == token for name, token in tags.items())
+
+
+def invalidate_tags(*tags):
+    """Invalidate every cache entry carrying any of `tags`."""
+    bump_versions(*tags)
+
+
+def increment_counter(key, amount=1):
+    """Add ``amount`` to a shared, non-expiring counter in the cache."""
+    if not cache.add(key, amount, None):
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.set(key, amount, None)
+
+
+def record_cache_stat(outcome, started):
+    """Count a cache lookup and add its latency (in microseconds)."""
+    elapsed_us = int((time.monotonic() - started) * 1_000_000)
+    for name, amount in ((f"{outcome}:count", 1), (f"{outcome}:us", elapsed_us)):
+        increment_counter(f"{STATS_KEY_PREFIX}{name}", amount)
+
+
+def get_cache_stats():
+    """Return hit/miss counts, hit ratio and average latency per outcome."""
+    keys = [
+        f"{STATS_KEY_PREFIX}{outcome}:{suffix}"
+        for outcome in STAT_OUTCOMES for suffix in ('count', 'us')
+    ]
+    raw = cache.get_many(keys)
+    stats = {}
+    for outcome in STAT_OUTCOMES:
+        count = raw.get(f"{STATS_KEY_PREFIX}{outcome}:count", 0)
+        total_us = raw.get(f"{STATS_KEY_PREFIX}{outcome}:us", 0)
+        stats[outcome] = {
+            'count': count,
+            'avg_ms': round(total_us / count / 1000, 3) if count else None,
+        }
+    lookups = sum(stats[outcome]['count'] for outcome in STAT_OUTCOMES)
+    served_from_cache = lookups - stats['miss']['count']
+    stats['hit_ratio'] = round(served_from_cache / lookups, 4) if lookups else None
+    return stats
+
+
+def reset_cache_stats():
+    """Zero all cache statistics."""
+    cache.delete_many([
+        f"{STATS_KEY_PREFIX}{outcome}:{suffix}"
+        for outcome in STAT_OUTCOMES for suffix in ('count', 'us')
+    ])
+
+
+def get_version(name):
+    """
+    Return the change token of `name` (e.g. a table) as
+    `{'token': str, 'modified': datetime}`.
+
+    A missing entry (first use, eviction) is re-seeded with a fresh token
+    stamped now, so clients holding an older token never get a false match.
+    """
+    key = f"{VERSION_KEY_PREFIX}{name}"
+    version = cache.get(key)
+    if version is None:
+        fresh = {'token': uuid4().hex, 'modified': timezone.now()}
+        version = fresh if cache.add(key, fresh, None) else (cache.get(key) or fresh)
+    return version
+
+
+def get_versions(*names):
+    """Return the change tokens of several names with one cache round trip."""
+    keys = {f"{VERSION_KEY_PREFIX}{name}": name for name in names}
+    found = cache.get_many(list(keys))
+    versions = {keys[key]: value for key, value in found.items()}
+    for name in names:
+        if name not in versions:
+            versions[name] = get_version(name)
+    return versions
+
+
+def bump_versions(*names):
+    """Give each name a new change token, marking it modified now."""
+    now = timezone.now()
+    cache.set_many({
+        f"{VERSION_KEY_PREFIX}{name}": {'token': uuid4().hex, 'modified': now}
+        for name in names
+    }, None)
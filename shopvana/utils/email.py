@@ -6,3 +6,8 @@ def send_notification_email(to_email: str, subject: str, template_name: str, con
     # Offload the email sending task to Celery
     logging.info(f"Sending email to {to_email} with subject: {subject}")
     send_email_async.delay(subject, template_name, context, [to_email])
+
+
+def send_outbox_email(payload: dict) -> None:
+    """Outbox handler of `email.send` events: the arguments of send_notification_email."""
+    send_notification_email(**payload)
@@ -0,0 +1,112 @@
+"""
+``Idempotency-Key`` support for POST endpoints that must not run twice.
+
+The first request with a given key claims a ``IdempotencyKey`` row
+(committed on its own, so duplicates can see it), runs the view, and
+stores the response. A retry with the same key and body gets that
+response back, marked ``Idempotent-Replayed: true``, without running the
+view; one arriving while the first is still running waits up to
+``IDEMPOTENCY_WAIT_SECONDS`` for it. Server errors are not stored, so
+those requests can be retried for real. Keys expire after
+``IDEMPOTENCY_KEY_TTL_HOURS`` and are purged daily.
+"""
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+POLL_INTERVAL = 0.2  # seconds
+
+
+def request_fingerprint(request) -> str:
+    data = request.data.dict() if hasattr(request.data, 'dict') else request.data
+    body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def _reclaimable(now) -> Q:
+    """Keys past their TTL, and claims whose request died before finishing."""
+    return Q(expires_at__lte=now) | Q(
+        status_code__isnull=True, created_at__lte=now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS))
+
+
+def _claim(user, key, fingerprint):
+    """Insert the in-flight row; return it, or None if the key is taken."""
+    now = timezone.now()
+    IdempotencyKey.objects.filter(_reclaimable(now), user=user, key=key).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user=user, key=key, fingerprint=fingerprint, created_at=now,
+                expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS))
+    except IntegrityError:
+        return None
+
+
+def _replay(record) -> Response:
+    response = Response(record.response, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """Honour the ``Idempotency-Key`` header on a DRF view method."""
+    @functools.wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(view, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'detail': f"{HEADER} must be at most 255 characters."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            record = _claim(request.user, key, fingerprint)
+            if record is not None:
+                break
+            existing = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if existing is None:
+                continue
+            if existing.fingerprint != fingerprint:
+                return Response({'detail': f"{HEADER} was already used for a different request."},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if existing.status_code is not None:
+                return _replay(existing)
+            if time.monotonic() >= deadline:
+                return Response({'detail': f"A request with this {HEADER} is still in progress."},
+                                status=status.HTTP_409_CONFLICT)
+            time.sleep(POLL_INTERVAL)
+
+        try:
+            response = view_method(view, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500 or not hasattr(response, 'data'):
+            record.delete()
+            return response
+        record.status_code = response.status_code
+        record.response = response.data
+        record.save(update_fields=['status_code', 'response'])
+        return response
+
+    return wrapper
+
+
+def purge_expired() -> int:
+    """Delete keys past their TTL."""
+    return IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()[0]
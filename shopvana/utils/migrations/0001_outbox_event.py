@@ -0,0 +1,37 @@
+# Generated by Django 4.2.21 on 2026-10-18 19:27
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(help_text='Registered handler that carries the event out', max_length=50)),
+                ('reference', models.CharField(blank=True, db_index=True, help_text='What the event is about, e.g. order:<order_id>, for lookups', max_length=100)),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Arguments of the handler')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Earliest time of the next attempt')),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Outbox events',
+                'db_table': 'shopvana_outbox_event',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='shopvana_ou_status_d7433d_idx')],
+            },
+        ),
+    ]
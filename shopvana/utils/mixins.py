@@ -0,0 +1,156 @@
+from calendar import timegm
+from hashlib import md5
+
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from utils.cache_utils import get_or_set_cache, get_versions
+from utils.serializers import get_sparse_spec, plan_queryset, DynamicFieldsMixin
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin adding ETag / Last-Modified validators to `list` and
+    `retrieve`.
+
+    Validators come from the change tokens named in `conditional_versions`
+    (see `utils.cache_utils.bump_versions`), so an unchanged resource is
+    answered with 304 before any query runs or the serializer is touched.
+    """
+    conditional_versions = ()
+
+    def get_conditional_validators(self, request):
+        """Return `(etag, last_modified)` for the current request."""
+        versions = get_versions(*self.conditional_versions)
+        renderer = getattr(request, 'accepted_renderer', None)
+        fingerprint = ':'.join(
+            [versions[name]['token'] for name in self.conditional_versions]
+            + [request.get_full_path(), getattr(renderer, 'format', '')]
+        )
+        etag = quote_etag(md5(fingerprint.encode()).hexdigest())
+        last_modified = max(version['modified'] for version in versions.values())
+        return etag, last_modified
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        """Run `handler` only when the client's cached copy is out of date."""
+        if not self.conditional_versions:
+            return handler(request, *args, **kwargs)
+
+        etag, last_modified = self.get_conditional_validators(request)
+        timestamp = timegm(last_modified.utctimetuple())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault('Last-Modified', http_date(timestamp))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
+
+
+class CachedResponseMixin:
+    """
+    ViewSet mixin caching the serialized output of `list` and `retrieve`.
+
+    Keys include the path, query parameters, negotiated format and the
+    caller's role. Entries carry the tags returned by `get_cache_tags`
+    and are dropped when any of them is invalidated (see
+    `utils.cache_utils.invalidate_tags`).
+    """
+    cache_timeout = 300
+    cache_list_tags = ('catalog',)
+    cache_object_tag = None
+
+    def get_cache_role(self, request):
+        """Return the role segment of the cache key."""
+        user = request.user
+        if not user or not user.is_authenticated:
+            return 'anonymous'
+        if user.is_staff:
+            return 'staff'
+        return getattr(user, 'role', 'customer')
+
+    def get_cache_key(self, request):
+        renderer = getattr(request, 'accepted_renderer', None)
+        query = '&'.join(
+            f"{name}={value}"
+            for name in sorted(request.query_params)
+            for value in request.query_params.getlist(name)
+        )
+        fingerprint = md5(
+            f"{request.path}?{query}:{getattr(renderer, 'format', '')}".encode()
+        ).hexdigest()
+        return f"response:{type(self).__name__}:{self.action}:{self.get_cache_role(request)}:{fingerprint}"
+
+    def get_cache_tags(self, request, **kwargs):
+        """
+        Return the tags of the response for the current action.
+        Detail responses carry their object's tag plus `<tag>:*`, which
+        bulk writes bump instead of tagging every object they touched.
+        """
+        if self.action == 'retrieve' and self.cache_object_tag:
+            lookup = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+            return [f"{self.cache_object_tag}:{lookup}", f"{self.cache_object_tag}:*"]
+        return list(self.cache_list_tags)
+
+    def get_derived_cache_tags(self, data):
+        """Return extra tags that can only be read from the response data."""
+        return []
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        def render():
+            response = handler(request, *args, **kwargs)
+            return {'status': response.status_code, 'data': response.data}
+
+        static_tags = self.get_cache_tags(request, **kwargs)
+        cached = get_or_set_cache(
+            self.get_cache_key(request),
+            render,
+            timeout=self.cache_timeout,
+            tags=lambda value: static_tags + self.get_derived_cache_tags(value['data']),
+            should_cache=lambda value: value['status'] == 200,
+        )
+        return Response(cached['data'], status=cached['status'])
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+
+class QueryPlanMixin:
+    """
+    ViewSet mixin applying the view's declared `select_related_fields`
+    and `prefetch_related_fields`, so serializing a page costs a fixed
+    number of queries instead of one or more per row. Sparse reads of a
+    `DynamicFieldsMixin` serializer get a plan derived from the request.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Sparse (`?fields=` / `?expand=`) reads load only what they render
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, DynamicFieldsMixin):
+            spec = get_sparse_spec(self.request)
+            if spec is not None:
+                ordering = list(getattr(self, 'keyset_ordering', None) or ())
+                if isinstance(getattr(self, 'ordering_fields', None), (list, tuple)):
+                    ordering += self.ordering_fields
+                return plan_queryset(
+                    queryset, serializer_class, spec,
+                    extra_fields=[field.lstrip('-') for field in ordering])
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        return queryset
@@ -0,0 +1,87 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxEvent(models.Model):
+    """
+    A side effect (gateway call, email, ...) recorded in the same
+    transaction as the change that causes it, and carried out by the
+    Celery relay after commit (see `utils.outbox`).
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    topic = models.CharField(
+        max_length=50,
+        help_text="Registered handler that carries the event out"
+    )
+    reference = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+        help_text="What the event is about, e.g. order:<order_id>, for lookups"
+    )
+    payload = models.JSONField(
+        default=dict,
+        encoder=DjangoJSONEncoder,
+        help_text="Arguments of the handler"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Earliest time of the next attempt"
+    )
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.topic} {self.reference} ({self.status})"
+
+    class Meta:
+        verbose_name_plural = "Outbox events"
+        ordering = ['id']
+        db_table = 'shopvana_outbox_event'
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    The outcome of the first request sent with an ``Idempotency-Key``
+    header, replayed to its retries until ``expires_at`` (see
+    `utils.idempotency`). ``status_code`` is null while it is in flight.
+    """
+    user = models.ForeignKey(
+        'users.User',
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(
+        max_length=64,
+        help_text="SHA-256 of the method, path and body the key was first used with"
+    )
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} {self.key} ({self.status_code or 'in flight'})"
+
+    class Meta:
+        verbose_name_plural = "Idempotency keys"
+        db_table = 'shopvana_idempotency_key'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key')
+        ]
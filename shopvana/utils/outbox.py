@@ -0,0 +1,102 @@
+"""
+Transactional outbox.
+
+``enqueue`` records a side effect as an ``OutboxEvent`` row inside the
+caller's transaction, so the event exists if and only if the change that
+caused it commits. After the commit a Celery task relays it to the
+handler registered for its topic; a beat task sweeps up events whose
+relay never ran (broker down, worker lost) and retries failed ones with
+exponential backoff until ``OUTBOX_MAX_ATTEMPTS``.
+
+Handlers run inside a savepoint together with marking the event sent,
+so their database writes commit exactly once; calls to the outside world
+may repeat after a crash and must tolerate it.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Topic -> dotted path of the function carrying it out (called with the payload)
+HANDLERS = {
+    'email.send': 'utils.email.send_outbox_email',
+    'payments.initiate': 'payments.utils.initiate_order_payment',
+}
+
+
+def enqueue(topic: str, payload: dict, reference: str = '') -> OutboxEvent:
+    """Record an event in the current transaction and relay it after commit."""
+    from .tasks import relay_outbox_event  # Import here to avoid circular import
+    event = OutboxEvent.objects.create(topic=topic, payload=payload, reference=reference)
+    transaction.on_commit(lambda: _relay_later(relay_outbox_event, event.pk))
+    return event
+
+
+def _relay_later(task, event_id) -> None:
+    try:
+        task.delay(event_id)
+    except Exception as exc:
+        # The beat sweep relays it instead
+        logger.error(f"Could not queue outbox event {event_id}: {exc}")
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(10 * 2 ** (attempts - 1), 3600))
+
+
+def relay(event_id) -> bool:
+    """
+    Carry out one due event, unless another worker holds it. Returns
+    True if it was sent.
+    """
+    with transaction.atomic():
+        events = OutboxEvent.objects.filter(pk=event_id, status='pending', available_at__lte=timezone.now())
+        if connection.features.has_select_for_update_skip_locked:
+            events = events.select_for_update(skip_locked=True)
+        event = events.first()
+        if event is None:
+            return False
+
+        try:
+            if event.topic not in HANDLERS:
+                raise LookupError(f"No outbox handler for topic {event.topic!r}.")
+            with transaction.atomic():
+                import_string(HANDLERS[event.topic])(event.payload)
+        except Exception as exc:
+            event.attempts += 1
+            event.last_error = str(exc)
+            if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                event.status = 'failed'
+                logger.error(f"Outbox event {event.pk} ({event.topic}) failed for good: {exc}")
+            else:
+                event.available_at = timezone.now() + _backoff(event.attempts)
+                logger.warning(f"Outbox event {event.pk} ({event.topic}) failed, attempt {event.attempts}: {exc}")
+            event.save(update_fields=['attempts', 'last_error', 'status', 'available_at'])
+            return False
+
+        event.status = 'sent'
+        event.attempts += 1
+        event.sent_at = timezone.now()
+        event.save(update_fields=['status', 'attempts', 'sent_at'])
+    return True
+
+
+def relay_due(batch_size=100) -> int:
+    """Relay every due event, oldest first. Returns the number sent."""
+    sent = 0
+    due = OutboxEvent.objects.filter(status='pending', available_at__lte=timezone.now())
+    for event_id in list(due.values_list('pk', flat=True)[:batch_size]):
+        sent += relay(event_id)
+    return sent
+
+
+def purge_sent(older_than=timedelta(days=7)) -> int:
+    """Delete events sent before ``older_than`` ago."""
+    return OutboxEvent.objects.filter(status='sent', sent_at__lt=timezone.now() - older_than).delete()[0]
@@ -1,21 +1,273 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination that seeks on the ordering columns
+    instead of using OFFSET, so deep pages cost the same as the first.
+
+    The position is keyed on the queryset's ordering (or the view's
+    `keyset_ordering`) with the primary key appended as a tie-breaker,
+    and is handed to clients as an opaque `cursor` token.
+    The total count is opt-in via `?count=exact|estimate`.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+        position, reverse = self.decode_cursor(request)
+        if position is not None:
+            position = self.clean_position(queryset, position)
+        self.count = self.get_count(queryset, request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [(field, not descending) for field, descending in ordering]
+
+        queryset = queryset.order_by(*[
+            f"-{field}" if descending else field for field, descending in ordering
+        ])
+        if position is not None:
+            queryset = queryset.filter(self.build_seek_filter(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        return self.page
+
+    def get_page_size(self, request):
+        """Return the requested page size, capped at `max_page_size`."""
+        page_size = request.query_params.get(self.page_size_query_param, self.page_size)
+        try:
+            return max(1, min(int(page_size), self.max_page_size))
+        except ValueError:
+            return self.page_size
+
+    def get_ordering(self, queryset, view):
+        """
+        Return the keyset as `[(field, descending), ...]`.
+
+        Uses the queryset's explicit ordering (e.g. from OrderingFilter)
+        when every term is a plain column or annotation, otherwise the
+        view's `keyset_ordering`. The primary key is always appended.
+        """
+        model = queryset.model
+        ordering = self._parse_ordering(queryset, queryset.query.order_by)
+        if not ordering:
+            ordering = self._parse_ordering(
+                queryset, getattr(view, 'keyset_ordering', None) or model._meta.ordering)
+        if not ordering:
+            ordering = []
+
+        pk_name = model._meta.pk.attname
+        if pk_name not in [field for field, _ in ordering]:
+            descending = ordering[-1][1] if ordering else False
+            ordering.append((pk_name, descending))
+        return ordering
+
+    def _parse_ordering(self, queryset, terms):
+        ordering = []
+        for term in terms or ():
+            if not isinstance(term, str):
+                return None
+            descending = term.startswith('-')
+            name = term.lstrip('-')
+            if name in queryset.query.annotations:
+                ordering.append((name, descending))
+                continue
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            # Ordering by a relation sorts on the related model's ordering,
+            # which the cursor cannot capture; the `<fk>_id` column is fine.
+            if field.is_relation and name != field.attname:
+                return None
+            ordering.append((field.attname, descending))
+        return ordering
+
+    def build_seek_filter(self, ordering, position):
+        """
+        Build `(a, b, c) > (x, y, z)` as nested conditions, respecting
+        the direction of each column.
+        """
+        condition = Q()
+        for index, (field, descending) in enumerate(ordering):
+            clause = Q(**{
+                f"{field}__{'lt' if descending else 'gt'}": position[index]
+            })
+            for previous in range(index):
+                clause &= Q(**{ordering[previous][0]: position[previous]})
+            condition |= clause
+        return condition
+
+    def clean_position(self, queryset, position):
+        """
+        Convert a decoded position to the Python types of its columns,
+        rejecting values they cannot hold.
+        """
+        cleaned = []
+        for (name, _), value in zip(self.ordering, position):
+            if value is None or isinstance(value, (list, dict)):
+                raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+            if name in queryset.query.annotations:
+                field = queryset.query.annotations[name].output_field
+            else:
+                field = queryset.model._meta.get_field(name)
+            try:
+                cleaned.append(field.to_python(value))
+            except DjangoValidationError:
+                raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+        return cleaned
+
+    def get_count(self, queryset, request):
+        """Return the total as requested by `?count=` (None when skipped)."""
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        return None
+
+    def encode_cursor(self, item, reverse):
+        """Return the opaque token that seeks past `item`."""
+        position = [serialize_position(getattr(item, field)) for field, _ in self.ordering]
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        """Return `(position, reverse)` from the request's cursor token."""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(urlsafe_b64decode(padded.encode()).decode())
+            position = payload['p']
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            return position, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        token = self.encode_cursor(self.page[-1], reverse=False)
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        token = self.encode_cursor(self.page[0], reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+def serialize_position(value):
+    """Convert a column value into something JSON can carry in a cursor."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    return value
+
+
+def estimate_count(queryset):
+    """
+    Return a cheap row-count estimate.
+
+    On PostgreSQL this reads `pg_class.reltuples` for unfiltered querysets
+    and the planner's row estimate otherwise; other backends count exactly.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # reltuples is -1 until the table has been analyzed
+        if row and row[0] >= 0:
+            return row[0]
+
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
 
 
 class CustomPagination(PageNumberPagination):
     """
     Custom pagination class that extends PageNumberPagination.
     It sets the default page size to 10 and allows the page size to be adjusted via query parameters.
+    Views that declare `keyset_ordering` also accept `?pagination=cursor`
+    (or a `cursor` token) to switch to keyset pagination.
     """
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
     page_query_param = 'page'
     last_page_strings = ('last',)
+    pagination_mode_query_param = 'pagination'
+    keyset_pagination_class = KeysetPagination
+    keyset = None
+
+    def use_keyset(self, request, view=None):
+        """
+        Returns True when the request asks for cursor pagination
+        on a view that supports it.
+        """
+        if not getattr(view, 'keyset_ordering', None):
+            return False
+        return (
+            request.query_params.get(self.pagination_mode_query_param) == 'cursor'
+            or self.keyset_pagination_class.cursor_query_param in request.query_params
+        )
 
     def get_paginated_response(self, data):
         """
         Returns a paginated response with the given data.
         """
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
         return super().get_paginated_response(data)
 
     def paginate_queryset(self, queryset, request, view=None):
@@ -23,6 +275,9 @@ class CustomPagination(PageNumberPagination):
         Paginates the given queryset based on the request parameters.
         """
         self.request = request
+        if self.use_keyset(request, view):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
         return super().paginate_queryset(queryset, request, view)
 
     def get_page_size(self, request):
@@ -0,0 +1,236 @@
+"""
+Sparse fieldsets (`?fields=`) and opt-in expansion (`?expand=`) for
+model serializers.
+
+`?fields=name,price,category` keeps only those fields; dotted names
+select inside nested serializers (`?fields=order_id,items.quantity`).
+`?expand=category` replaces a relation's collapsed form (its id or
+slug) with the related object; dotted names expand deeper
+(`?expand=items.product.category`). Without either parameter every
+serializer keeps its full representation, including the relations it
+expands by default.
+
+`plan_queryset` derives the matching `only()`, `select_related()` and
+`prefetch_related()` calls, so unrequested columns are not read either.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+_UNSET = object()
+
+
+def parse_field_tree(value: str) -> dict:
+    """Turn `a,b.c,b.d` into `{'a': {}, 'b': {'c': {}, 'd': {}}}`."""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def get_sparse_spec(request):
+    """
+    Return the `(fields, expand)` trees of a read request, or None when
+    it asks for the full representation.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    params = request.query_params
+    if 'fields' not in params and 'expand' not in params:
+        return None
+    return parse_field_tree(params.get('fields', '')), parse_field_tree(params.get('expand', ''))
+
+
+class DynamicFieldsMixin:
+    """
+    ModelSerializer mixin honouring `?fields=` and `?expand=`.
+
+    `expandable_fields` maps a relation to the serializer (class or
+    dotted path) used when it is expanded; `default_expand` lists the
+    ones expanded in the full representation. `field_dependencies` names
+    the model paths read by computed fields, for the query plan.
+    """
+    expandable_fields = {}
+    default_expand = ()
+    field_dependencies = {}
+
+    def __init__(self, *args, sparse_spec=_UNSET, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse_spec = sparse_spec
+
+    def get_sparse_spec(self):
+        """
+        Return this serializer's `(fields, expand)` trees, or None for the
+        full representation. The outermost serializer reads the request;
+        nested ones are handed their subtrees by their parent.
+        """
+        if self.sparse_spec is _UNSET:
+            parent = self.parent
+            if isinstance(parent, serializers.ListSerializer):
+                parent = parent.parent
+            if parent is not None:
+                return None
+            self.sparse_spec = get_sparse_spec(self.context.get('request'))
+        return self.sparse_spec
+
+    def get_expanded_fields(self) -> set:
+        spec = self.get_sparse_spec()
+        if spec is None:
+            return set(self.default_expand)
+        return set(spec[1]) & set(self.expandable_fields)
+
+    def get_expand_serializer(self, name):
+        serializer_class = self.expandable_fields[name]
+        if isinstance(serializer_class, str):
+            serializer_class = import_string(serializer_class)
+        return serializer_class
+
+    def get_fields(self):
+        fields = super().get_fields()
+        spec = self.get_sparse_spec()
+        if spec is None:
+            return fields
+        requested, expand = spec
+        if requested:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        for name, field in fields.items():
+            nested = getattr(field, 'child', field)
+            if isinstance(nested, DynamicFieldsMixin):
+                nested.sparse_spec = (requested.get(name, {}), expand.get(name, {}))
+        return fields
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        for name in self.get_expanded_fields():
+            if name in representation:
+                representation[name] = self.expand_field(instance, name)
+        return representation
+
+    def expand_field(self, instance, name):
+        """
+        Serialize a related object once per request and spec. The memo
+        lives in the (shared) serializer context, so every row of a page
+        and every nesting serializer reuses it.
+        """
+        source = self.fields[name].source
+        related_id = getattr(instance, self.Meta.model._meta.get_field(source).attname)
+        if related_id is None:
+            return None
+        serializer_class = self.get_expand_serializer(name)
+        spec = self.get_sparse_spec()
+        child_spec = None if spec is None else (spec[0].get(name, {}), spec[1].get(name, {}))
+
+        memo = self.context.setdefault('expanded_representations', {})
+        key = (serializer_class, related_id, repr(child_spec))
+        if key not in memo:
+            kwargs = {'context': self.context}
+            if issubclass(serializer_class, DynamicFieldsMixin):
+                kwargs['sparse_spec'] = child_spec
+            memo[key] = serializer_class(getattr(instance, source), **kwargs).data
+        return memo[key]
+
+
+def _query_plan(serializer, prefix=''):
+    """
+    Return `(only, full, select_related, prefetch)` for a serializer whose
+    fields are already pruned. `only` is None when a field's needs are
+    unknown; `full` lists relations that must be loaded whole.
+    """
+    model = serializer.Meta.model
+    only = {prefix + model._meta.pk.name}
+    full, select, prefetch = set(), set(), []
+    expanded = serializer.get_expanded_fields()
+
+    def add_path(path):
+        parts = path.split('__')
+        if len(parts) > 1:
+            select.add(prefix + '__'.join(parts[:-1]))
+        if only is not None:
+            only.add(prefix + path)
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in expanded:
+            add_path(field.source)
+            select.add(prefix + field.source)
+            serializer_class = serializer.get_expand_serializer(name)
+            if not issubclass(serializer_class, DynamicFieldsMixin):
+                full.add(prefix + field.source)
+                continue
+            spec = serializer.get_sparse_spec()
+            child = serializer_class(
+                sparse_spec=None if spec is None else (spec[0].get(name, {}), spec[1].get(name, {})))
+            child_only, child_full, child_select, child_prefetch = _query_plan(
+                child, f"{prefix}{field.source}__")
+            only = None if child_only is None or only is None else only | child_only
+            full |= child_full
+            select |= child_select
+            prefetch += child_prefetch
+        elif name in serializer.field_dependencies:
+            for path in serializer.field_dependencies[name]:
+                add_path(path)
+        elif isinstance(field, serializers.ListSerializer):
+            relation = model._meta.get_field(field.source)
+            child_model = relation.related_model
+            child_only, child_full, child_select, child_prefetch = _query_plan(field.child)
+            queryset = _apply_plan(
+                child_model.objects.all(),
+                None if child_only is None else child_only | {relation.field.name},
+                child_full, child_select, child_prefetch)
+            prefetch.append(Prefetch(prefix + field.source, queryset=queryset))
+        elif field.source == '*' or only is None:
+            only = None
+        else:
+            parts = field.source.split('.')
+            try:
+                model_field = model._meta.get_field(parts[0])
+            except FieldDoesNotExist:
+                only = None
+                continue
+            if isinstance(field, serializers.SlugRelatedField):
+                add_path(f"{parts[0]}__{field.slug_field}")
+            elif len(parts) > 1 and model_field.is_relation:
+                add_path('__'.join(parts))
+            else:
+                only.add(prefix + parts[0])
+    return only, full, select, prefetch
+
+
+def _merge_only(only, full):
+    """Drop column restrictions inside relations that are loaded whole."""
+    return sorted(
+        path for path in only
+        if not any(path.startswith(relation + '__') for relation in full)
+    )
+
+
+def _apply_plan(queryset, only, full, select, prefetch):
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if only is not None:
+        queryset = queryset.only(*_merge_only(only, full))
+    return queryset
+
+
+def plan_queryset(queryset, serializer_class, spec, extra_fields=()):
+    """
+    Restrict `queryset` to what `serializer_class` renders for `spec`,
+    plus `extra_fields` (e.g. the columns a pagination cursor reads).
+    """
+    only, full, select, prefetch = _query_plan(serializer_class(sparse_spec=spec))
+    if only is not None:
+        for name in extra_fields:
+            try:
+                queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            only.add(name)
+    return _apply_plan(queryset, only, full, select, prefetch)
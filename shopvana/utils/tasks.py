@@ -42,4 +42,27 @@ def check_pending_payments() -> None:
     pending_payments = Payment.objects.filter(status="pending")
     for payment in pending_payments:
         verify_chapa_payment(payment)
-        logger.info(f"Checked payment {payment.chapa_tx_ref} status.")
\ No newline at end of file
+        logger.info(f"Checked payment {payment.chapa_tx_ref} status.")
+
+
+@shared_task
+def relay_outbox_event(event_id: int) -> bool:
+    """Carry out one outbox event right after its transaction committed."""
+    from .outbox import relay
+    return relay(event_id)
+
+
+@shared_task
+def relay_outbox() -> int:
+    """Sweep up outbox events that are due: never relayed, or waiting for a retry."""
+    from .outbox import purge_sent, relay_due
+    sent = relay_due()
+    purge_sent()
+    return sent
+
+
+@shared_task
+def purge_idempotency_keys() -> int:
+    """Daily removal of expired Idempotency-Key records."""
+    from .idempotency import purge_expired
+    return purge_expired()
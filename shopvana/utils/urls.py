@@ -0,0 +1,8 @@
+from .views import CacheStatsView, OrderExpiryStatsView
+from django.urls import path
+
+
+urlpatterns = [
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('orders/expiry/stats/', OrderExpiryStatsView.as_view(), name='order-expiry-stats'),
+]
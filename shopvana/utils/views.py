@@ -0,0 +1,29 @@
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_yasg.utils import swagger_auto_schema
+from utils.cache_utils import get_cache_stats, reset_cache_stats
+from orders.services import get_expiry_stats
+
+
+class CacheStatsView(APIView):
+    """Admin view of response cache hit/miss counts and latency."""
+    permission_classes = [permissions.IsAdminUser]
+
+    @swagger_auto_schema(tags=["Operations"])
+    def get(self, request):
+        return Response(get_cache_stats())
+
+    @swagger_auto_schema(tags=["Operations"])
+    def delete(self, request):
+        reset_cache_stats()
+        return Response(status=204)
+
+
+class OrderExpiryStatsView(APIView):
+    """Admin view of the unpaid-order expiry job: runs, orders cancelled, units reclaimed."""
+    permission_classes = [permissions.IsAdminUser]
+
+    @swagger_auto_schema(tags=["Operations"])
+    def get(self, request):
+        return Response(get_expiry_stats())
@@ -2,6 +2,7 @@ from .models import Wishlist, WishlistItem
 from products.models import Product
 from products.serializers import ProductSerializer
 from rest_framework import serializers
+from utils.serializers import DynamicFieldsMixin
 
 
 class WishlistSerializer(serializers.ModelSerializer):
@@ -33,9 +34,11 @@ class WishlistSerializer(serializers.ModelSerializer):
         return value
 
 
-class WishlistItemSerializer(serializers.ModelSerializer):
+class WishlistItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for WishlistItem model."""
 
+    expandable_fields = {'product': ProductSerializer}
+
     user_id = serializers.ReadOnlyField(source='user.id')
     user_name = serializers.ReadOnlyField(source='user.username')  # New
     wishlist_name = serializers.ReadOnlyField(source='wishlist.name')  # New
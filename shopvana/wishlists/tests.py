@@ -1,3 +1,39 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from products.models import Category, Product
+from .models import Wishlist, WishlistItem
+
+
+class WishlistItemListQueryCountTests(TestCase):
+    """Listing wishlist items costs the same number of queries for any page size."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='dreamer', email='dreamer@example.com', password='secret', is_active=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        category = Category.objects.create(name='Books')
+        wishlist = Wishlist.objects.create(user=self.user, name='Reading list')
+        for index in range(20):
+            product = Product.objects.create(
+                name=f"Book {index}", price=Decimal('12.00'), stock_quantity=4, category=category)
+            WishlistItem.objects.create(wishlist=wishlist, product=product, user=self.user)
+
+    def list_queries(self, page_size):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/wishlist-items/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(queries)
 
-# Create your tests here.
+    def test_query_count_is_independent_of_page_size(self):
+        self.assertEqual(self.list_queries(5), self.list_queries(20))
@@ -2,17 +2,19 @@ from .models import Wishlist, WishlistItem
 from .serializers import WishlistSerializer, WishlistItemSerializer
 from rest_framework import viewsets
 from drf_yasg.utils import swagger_auto_schema
+from utils.mixins import QueryPlanMixin
 
 @swagger_auto_schema(tags=["Customer's Preference"])
-class WishlistViewSet(viewsets.ModelViewSet):
+class WishlistViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     """ViewSet for managing user wishlists."""
     queryset = Wishlist.objects.all()
     serializer_class = WishlistSerializer
+    select_related_fields = ('user',)
 
     def get_queryset(self) -> dict:
         """Return wishlists for the authenticated user."""
         user = self.request.user
-        return Wishlist.objects.filter(user=user.id)
+        return super().get_queryset().filter(user=user.id)
 
     def perform_create(self, serializer: WishlistSerializer) -> None:
         """Set the user_id to the authenticated user when creating a wishlist."""
@@ -31,15 +33,16 @@ class WishlistViewSet(viewsets.ModelViewSet):
 
 
 @swagger_auto_schema(tags=["Customer's Preference"])
-class WishlistItemViewSet(viewsets.ModelViewSet):
+class WishlistItemViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     """ViewSet for managing items in user wishlists."""
     queryset = WishlistItem.objects.all()
     serializer_class = WishlistItemSerializer
+    select_related_fields = ('product', 'user', 'wishlist')
 
     def get_queryset(self) -> dict:
         """Return wishlist items for the authenticated user."""
         user = self.request.user
-        return WishlistItem.objects.filter(user=user.id)
+        return super().get_queryset().filter(user=user.id)
 
     def perform_create(self, serializer: WishlistItemSerializer) -> None:
         """Set the user_id to the authenticated user when creating a wishlist item."""